@@ -0,0 +1,132 @@
+import timingmodel
+import programcache
+import machinepool
+import engines
+import io
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+import argparse
+
+#run many (asm file, stdin file, register count) jobs on a pool of worker processes
+#
+#the manifest is JSON Lines, one job per line:
+#  {"asm": "prog.asm", "input": "in.txt", "nregs": 32, "id": "student1/test3"}
+#only asm is required; input defaults to empty stdin, nregs to 256 and id to the job's line number.
+#Relative paths are taken relative to the manifest. Each job runs with the basic timing model, as
+#driver.py would, on a machine in the state of a new one (reused from earlier jobs of the same worker,
+#see machinepool.py), and produces one line of the report:
+#  {"id", "asm", "input", "nregs", "status", "cycles", "reads", "writes", "output", "error", "seconds"}
+#status is ok, error (the program failed), limit (instruction limit), or timeout
+
+#not an Exception, so no except Exception in the code a job runs (the program cache's, say) can swallow
+#the alarm, which is the only thing bounding the job
+class JobTimeout(BaseException) :
+    pass
+
+def _timeout(signum, frame) :
+    raise JobTimeout()
+
+#machines reused from job to job in this process
+_machines = machinepool.MachinePool(timingModel = timingmodel.basicTimingModel)
+
+#run one job in the current process; settings is (engine, timeout in seconds, instruction limit,
+#program cache directory or None)
+def runJob(job, settings) :
+    engine, timeout, limit, cacheDirectory = settings
+    nregs = int(job.get('nregs') or 256)
+    result = {'id' : job['id'], 'asm' : job['asm'], 'input' : job.get('input'), 'nregs' : nregs,
+              'status' : 'ok', 'cycles' : None, 'reads' : None, 'writes' : None, 'output' : '', 'error' : None}
+    output = io.StringIO()
+    stdin = None
+    start = time.time()
+    try :
+        try :
+            if timeout :
+                signal.signal(signal.SIGALRM, _timeout)
+                signal.setitimer(signal.ITIMER_REAL, timeout)
+            stdin = open(job['input']) if job.get('input') else io.StringIO()
+            if nregs < 32 :
+                raise RuntimeError("Cannot initialize simulator with fewer than 32 registers")
+            with _machines.machine(nregs, nregs, stdin, output) as m :
+                m.instructionLimit = limit
+                p = programcache.loadProgram(job['asm'], cacheDirectory)
+                m.run(p, engine = engine)
+                result['cycles'] = m.timingModel.getTotalTime()
+                result['reads'], result['writes'], _ = m.memory.getAccessCounts()
+        finally :
+            #disarmed however the job ends, before any handler below runs, so the alarm cannot interrupt
+            #them; an alarm going off just before this is a JobTimeout like any other and is handled below
+            if timeout :
+                signal.setitimer(signal.ITIMER_REAL, 0)
+    except JobTimeout :
+        result['status'] = 'timeout'
+        result['error'] = "Timed out after " + str(timeout) + " seconds"
+    except engines.InstructionLimitExceeded as e :
+        result['status'] = 'limit'
+        result['error'] = str(e)
+    except Exception as e :
+        result['status'] = 'error'
+        result['error'] = type(e).__name__ + ": " + str(e)
+    finally :
+        if stdin is not None :
+            stdin.close()
+    result['output'] = output.getvalue()
+    result['seconds'] = round(time.time() - start, 4)
+    return result
+
+def _runJob(args) :
+    return runJob(*args)
+
+#jobs from a manifest file, with paths resolved and ids filled in
+def readManifest(path) :
+    root = os.path.dirname(os.path.abspath(path))
+    jobs = []
+    with open(path, 'r') as f :
+        for number, line in enumerate(f, 1) :
+            line = line.strip()
+            if line == "" :
+                continue
+            job = json.loads(line)
+            if 'asm' not in job :
+                raise KeyError("Manifest line " + str(number) + " has no asm file")
+            job.setdefault('id', number)
+            for key in ('asm', 'input') :
+                if job.get(key) :
+                    job[key] = os.path.join(root, job[key])
+            jobs.append(job)
+    return jobs
+
+if __name__ == '__main__' :
+
+    parser = argparse.ArgumentParser("Simulate a batch of RISC-V programs",add_help=True)
+    parser.add_argument("manifest", help="JSON Lines file of jobs: {\"asm\": ..., \"input\": ..., \"nregs\": ..., \"id\": ...}")
+    parser.add_argument("-o", dest="report", help="write the JSON Lines report here instead of stdout")
+    parser.add_argument("-j", dest="jobs", type=int, default=None,
+                        help="number of worker processes (default: one per CPU)")
+    parser.add_argument("-e", dest="engine", choices=sorted(engines.engineMap), default="interpreter",
+                        help="execution engine to simulate with (default: interpreter)")
+    parser.add_argument("--timeout", dest="timeout", type=float, default=None,
+                        help="seconds a job may run before it is stopped")
+    parser.add_argument("--max-instructions", dest="max_instructions", type=int, metavar="N",
+                        help="stop a job with status limit after N instructions")
+    parser.add_argument("--program-cache", dest="program_cache", metavar="DIR", default=programcache.defaultDirectory(),
+                        help="reuse assembled programs cached in DIR (default: $RISCSIM_PROGRAM_CACHE, or no cache)")
+
+    args = parser.parse_args()
+
+    jobs = readManifest(args.manifest)
+    settings = (args.engine, args.timeout, args.max_instructions, args.program_cache)
+
+    report = open(args.report, 'w') if args.report else sys.stdout
+    #maxtasksperchild keeps state left behind by one job (e.g. a huge memory image) from weighing on the next
+    with multiprocessing.Pool(args.jobs, maxtasksperchild = 64) as pool :
+        #results are written as soon as each job finishes, so they are not in manifest order
+        for result in pool.imap_unordered(_runJob, [(job, settings) for job in jobs]) :
+            report.write(json.dumps(result) + "\n")
+            report.flush()
+    if report is not sys.stdout :
+        report.close()
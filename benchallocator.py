@@ -0,0 +1,101 @@
+import memorymanager
+import memory
+import argparse
+import random
+import time
+
+#benchmark the MALLOC/FREE allocator on malloc-heavy workloads: operations per second for each allocation
+#policy, and the heap extent (highest address ever handed out, relative to the start of the heap) as a
+#measure of how well each policy packs blocks. 'first' must return the same addresses as 'linear'
+
+#each workload is a list of operations: ('m', size) allocates a block, ('f', i) frees the block that the
+#i-th allocation returned
+
+#blocks freed in the reverse order they were allocated
+def lifo(rng, ops) :
+    work = []
+    live = []
+    count = 0
+    while len(work) < ops :
+        if live and rng.random() < 0.5 :
+            work.append(('f', live.pop()))
+        else :
+            work.append(('m', rng.randrange(1, 256)))
+            live.append(count)
+            count += 1
+    return work
+
+#blocks freed in the order they were allocated
+def fifo(rng, ops) :
+    work = []
+    live = []
+    count = 0
+    while len(work) < ops :
+        if len(live) > 500 or (live and rng.random() < 0.4) :
+            work.append(('f', live.pop(0)))
+        else :
+            work.append(('m', rng.randrange(1, 256)))
+            live.append(count)
+            count += 1
+    return work
+
+#a large, growing set of live blocks of mixed sizes freed at random, which fragments the heap
+def fragment(rng, ops) :
+    work = []
+    live = []
+    count = 0
+    while len(work) < ops :
+        if live and rng.random() < 0.45 :
+            work.append(('f', live.pop(rng.randrange(len(live)))))
+        else :
+            work.append(('m', rng.choice((4, 8, 16, 24, 64, rng.randrange(1, 4096)))))
+            live.append(count)
+            count += 1
+    return work
+
+workloads = {
+    'lifo' : lifo,
+    'fifo' : fifo,
+    'fragment' : fragment,
+}
+
+#run a workload on a fresh allocator; returns (seconds, addresses returned, heap extent)
+def runWorkload(work, policy) :
+    start, end = memory.HEAP
+    mm = memorymanager.MemoryManager(start, end - start, policy)
+    malloc = mm.malloc
+    free = mm.free
+    addrs = []
+    sizes = []
+    begin = time.perf_counter()
+    for op, arg in work :
+        if op == 'm' :
+            addrs.append(malloc(arg))
+            sizes.append(arg)
+        else :
+            free(addrs[arg])
+    elapsed = time.perf_counter() - begin
+    extent = max(addr + size for addr, size in zip(addrs, sizes)) - start
+    return elapsed, addrs, extent
+
+if __name__ == '__main__' :
+
+    parser = argparse.ArgumentParser("Benchmark the heap allocator",add_help=True)
+    parser.add_argument("-n", dest="ops", type=int, default=100000, help="MALLOC/FREE operations per workload (default: 100000)")
+    parser.add_argument("-p", dest="policies", action="append", choices=memorymanager.policies,
+                        help="policy to run; may be repeated (default: all)")
+    parser.add_argument("-w", dest="workloads", action="append", choices=sorted(workloads),
+                        help="workload to run; may be repeated (default: all)")
+    parser.add_argument("-s", dest="seed", type=int, default=1, help="random seed (default: 1)")
+    args = parser.parse_args()
+
+    policies = args.policies or memorymanager.policies
+    for name in args.workloads or sorted(workloads) :
+        work = workloads[name](random.Random(args.seed), args.ops)
+        results = {}
+        for policy in policies :
+            elapsed, addrs, extent = runWorkload(work, policy)
+            results[policy] = addrs
+            print("{:9s} {:7s} {:8.3f}s {:12,.0f} ops/s   extent {:,} bytes".format(name, policy, elapsed, len(work) / elapsed, extent))
+        if 'first' in results and 'linear' in results :
+            assert results['first'] == results['linear'], "first-fit returned different addresses from the linear allocator"
@@ -0,0 +1,111 @@
+import instructions
+import program
+import memory
+import argparse
+import os
+import random
+import re
+import tempfile
+import time
+
+#benchmark the assembler on a large generated program: lines per second for Program.buildCodeFromFile,
+#against the parser it replaced (whole file read with readlines, then an uncompiled re.match for the
+#opcode and another for the operands of every line)
+
+_sample = [
+    'ADD t2, t0, t1',
+    'SUB a0, a1, a2',
+    'MUL t3, t2, t1',
+    'ADDI t0, t0, 1',
+    'SLLI t1, t0, 2',
+    'LI t4, 1000',
+    'MV a0, t4',
+    'LW t5, 0(a0)',
+    'SW t5, 4(sp)',
+    'FADD.S f1, f2, f3',
+    'FLW f4, 8(sp)',
+    'FIMM.S f5, 2.5',
+    'BLT t0, t1, L{}',
+    'J L{}',
+    'PUTI t2',
+]
+
+def generate(path, lines, seed = 1) :
+    rng = random.Random(seed)
+    labels = max(lines // 50, 1)
+    with open(path, 'w') as f :
+        f.write('.section .text\n')
+        written = 0
+        label = 0
+        while written < lines :
+            if written % 50 == 0 and label < labels :
+                f.write('L' + str(label) + ':\n')
+                label += 1
+            f.write('    ' + rng.choice(_sample).format(rng.randrange(labels)) + '\n')
+            written += 1
+        f.write('    HALT\n')
+
+#the previous parser, kept here for comparison only
+_legacyPatterns = {
+    0 : r'(\S+)',
+    1 : r'(\S+) (\S+)',
+    2 : r'(\S+) (\S+), (\S+)',
+    3 : r'(\S+) (\S+), (\S+), (\S+)',
+}
+
+def legacyBuild(filename) :
+    with open(filename, 'r') as f :
+        lines = f.readlines()
+    labels = {}
+    code = {}
+    state = 0
+    for line in lines :
+        l = line.strip()
+        if ((l == "") or (l[0] == ';')) : continue
+        if (state == 0) :
+            if (l == ".section .text") :
+                currAddr = memory.TEXT[0]
+                state = 1
+        elif (l[-1] == ':') :
+            labels[re.match(r'(.+):', l)[1]] = currAddr
+        else :
+            opcode = re.match(r'(\S+)', l)[0]
+            cls = instructions.opCodeMap[opcode]
+            if issubclass(cls, instructions.MemInstruction) :
+                match = re.match(r'(\S+) (\S+), (\S+)\((\S+)\)', l)
+                operands = [match[2], match[3] + '(' + match[4] + ')']
+            else :
+                match = re.match(_legacyPatterns[cls.operandCount], l)
+                operands = list(match.groups()[1:])
+            code[currAddr] = cls.fromOperands(match[1], operands)
+            currAddr += 4
+    return code
+
+def timeIt(build, path, repeat) :
+    best = None
+    for _ in range(repeat) :
+        start = time.perf_counter()
+        build(path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def buildProgram(path) :
+    program.Program().buildCodeFromFile(path)
+
+if __name__ == '__main__' :
+
+    parser = argparse.ArgumentParser("Benchmark the assembler",add_help=True)
+    parser.add_argument("-n", dest="lines", type=int, default=200000, help="instructions to generate (default: 200000)")
+    parser.add_argument("-r", dest="repeat", type=int, default=3, help="runs per parser; the best is reported (default: 3)")
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix = '.asm')
+    os.close(fd)
+    try :
+        generate(path, args.lines)
+        for name, build in (('previous parser', legacyBuild), ('assembler', buildProgram)) :
+            elapsed = timeIt(build, path, args.repeat)
+            print("{:16s} {:8.3f}s {:12,.0f} lines/s".format(name, elapsed, args.lines / elapsed))
+    finally :
+        os.remove(path)
@@ -0,0 +1,324 @@
+import timingmodel
+import programcache
+import program
+import machine
+import engines
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import time
+
+#benchmark the simulator itself: simulated instructions per second, parse time, startup time and peak RSS
+#for each workload, engine and timing model, saved as JSON so runs of different versions can be compared
+#
+#every measurement runs in a fresh process, so peak RSS belongs to that measurement alone. Parse time is
+#Program.buildCode on the workload's text; startup is making the Machine, loading the program and making
+#the engine (which is when the closure engine compiles its closures); run is the engine's run. With a
+#repeat count, the best of each is kept. Every run's output must match that of a reference run
+
+#workloads: each is a function of a size (the number of iterations of its main loop) returning the
+#program's source, and prints a checksum of its work
+
+#integer ALU work in a tight loop
+def intloop(n) :
+    return """.section .text
+main:
+    LI t0, 0
+    LI t1, {}
+    LI t2, 0
+    LI t3, 1
+    LI t8, 1000
+loop:
+    ADD t2, t2, t0
+    XOR t3, t3, t2
+    SLLI t4, t3, 3
+    SRLI t5, t4, 5
+    AND t6, t4, t5
+    OR t3, t3, t6
+    ANDI t3, t3, 1023
+    MUL t7, t0, t0
+    REM t7, t7, t8
+    ADD t2, t2, t7
+    ADDI t0, t0, 1
+    BLT t0, t1, loop
+    PUTI t2
+    PUTI t3
+    HALT
+""".format(n)
+
+#recursive calls through JAL and RET: fib(10), n times
+def recursion(n) :
+    return """.section .text
+main:
+    LI s0, 0
+    LI s1, {}
+    LI s2, 0
+outer:
+    LI a0, 10
+    JAL ra, fib
+    ADD s2, s2, a0
+    ADDI s0, s0, 1
+    BLT s0, s1, outer
+    PUTI s2
+    HALT
+
+fib:
+    LI t0, 2
+    BLT a0, t0, fibbase
+    ADDI sp, sp, -12
+    SW ra, 0(sp)
+    SW a0, 4(sp)
+    ADDI a0, a0, -1
+    JAL ra, fib
+    SW a0, 8(sp)
+    LW a0, 4(sp)
+    ADDI a0, a0, -2
+    JAL ra, fib
+    LW t1, 8(sp)
+    ADD a0, a0, t1
+    LW ra, 0(sp)
+    ADDI sp, sp, 12
+    RET
+fibbase:
+    RET
+""".format(n)
+
+#a float kernel: multiplies, square roots and divides, with a store and reload of each result
+def floats(n) :
+    return """.section .text
+main:
+    LI t0, 0
+    LI t1, {}
+    LI a0, 0x20000000
+    FIMM.S f1, 1.0001
+    FIMM.S f2, 0.5
+    FIMM.S f3, 1.0
+    FIMM.S f4, 0.0
+    FIMM.S f9, 0.0
+    FIMM.S f11, 1000.0
+loop:
+    FMUL.S f5, f3, f3
+    FADD.S f5, f5, f2
+    FSQRT.S f6, f5
+    FDIV.S f7, f3, f6
+    FADD.S f4, f4, f7
+    FMUL.S f3, f3, f1
+    FMIN.S f3, f3, f11
+    FSW f7, 0(a0)
+    FLW f8, 0(a0)
+    FMAX.S f9, f9, f8
+    IMOVF.S f10, t0
+    FMUL.S f10, f10, f2
+    FADD.S f4, f4, f10
+    ADDI t0, t0, 1
+    BLT t0, t1, loop
+    PUTF f4
+    PUTF f9
+    HALT
+""".format(n)
+
+#linked lists: each of n rounds MALLOCs a 16-node list of mixed node sizes, walks it and FREEs it
+def linked(n) :
+    return """.section .text
+main:
+    LI s0, 0
+    LI s1, {}
+    LI s2, 0
+    LI s4, 16
+round:
+    LI t0, 0
+    LI t1, 0
+build:
+    ANDI t5, t1, 3
+    SLLI t5, t5, 3
+    ADDI t5, t5, 8
+    MALLOC t2, t5
+    ADD t3, t1, s0
+    SW t3, 0(t2)
+    SW t0, 4(t2)
+    MV t0, t2
+    ADDI t1, t1, 1
+    BLT t1, s4, build
+walk:
+    LW t3, 0(t0)
+    ADD s2, s2, t3
+    LW t4, 4(t0)
+    FREE t0
+    MV t0, t4
+    BNE t0, x0, walk
+    ADDI s0, s0, 1
+    BLT s0, s1, round
+    PUTI s2
+    HALT
+""".format(n)
+
+#loads and stores over a 256-word array: n passes of a running sum through it
+def arrays(n) :
+    return """.section .text
+main:
+    LI a0, 0x20000000
+    LI t0, 0
+    LI t1, 256
+init:
+    SLLI t2, t0, 2
+    ADD t2, t2, a0
+    SW t0, 0(t2)
+    ADDI t0, t0, 1
+    BLT t0, t1, init
+    LI s0, 0
+    LI s1, {}
+pass:
+    MV t2, a0
+    ADDI t3, a0, 1020
+    LW t4, 0(t2)
+sweep:
+    LW t5, 4(t2)
+    ADD t5, t5, t4
+    ANDI t5, t5, 1023
+    SW t5, 4(t2)
+    MV t4, t5
+    ADDI t2, t2, 4
+    BLT t2, t3, sweep
+    ADDI s0, s0, 1
+    BLT s0, s1, pass
+    LW t6, 1020(a0)
+    PUTI t6
+    HALT
+""".format(n)
+
+#workload -> (generator, size at scale 1); each runs about 200,000 instructions at scale 1
+workloads = {
+    'intloop' : (intloop, 15000),
+    'recursion' : (recursion, 120),
+    'floats' : (floats, 12500),
+    'linked' : (linked, 800),
+    'arrays' : (arrays, 110),
+}
+
+#the source of workload name at scale
+def generate(name, scale = 1.0) :
+    make, size = workloads[name]
+    size = max(int(size * scale), 1)
+    return size, make(size)
+
+def build(source) :
+    p = program.Program()
+    p.buildCode(source.splitlines())
+    return p
+
+#run source once without timing, for its instruction count and its output
+def reference(source) :
+    output = io.StringIO()
+    m = machine.Machine(numIntRegisters = 256, numFloatRegisters = 256, stdin = io.StringIO(), stdout = output)
+    m.start(build(source))
+    engine = engines.engineMap['closure'](m)
+    #a limit makes the engine count what it runs
+    m.instructionLimit = float('inf')
+    engine.run()
+    m.output.flush()
+    return engine.executed, output.getvalue()
+
+#one measurement, in its own process; returns (parse, startup and run seconds, output, cycles, peak RSS in KB)
+def measure(source, engine, timing, repeat) :
+    best = [None, None, None]
+    for _ in range(repeat) :
+        start = time.perf_counter()
+        p = build(source)
+        parsed = time.perf_counter()
+        output = io.StringIO()
+        m = machine.Machine(numIntRegisters = 256, numFloatRegisters = 256, timingModel = timingmodel.timingModelMap[timing],
+                            stdin = io.StringIO(), stdout = output)
+        m.start(p)
+        e = engines.engineMap[engine](m)
+        started = time.perf_counter()
+        e.run()
+        m.output.flush()
+        finished = time.perf_counter()
+        for i, seconds in enumerate((parsed - start, started - parsed, finished - started)) :
+            if best[i] is None or seconds < best[i] :
+                best[i] = seconds
+    return best[0], best[1], best[2], output.getvalue(), m.timingModel.getTotalTime(), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+#measure every combination of workload, engine and timing model; returns the result rows
+def runSuite(names, engineNames, timings, scale = 1.0, repeat = 1, report = print) :
+    #spawned rather than forked workers, so no worker starts out with the memory of this process
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for name in names :
+        size, source = generate(name, scale)
+        instructions, expected = reference(source)
+        for engine in engineNames :
+            for timing in timings :
+                with context.Pool(1) as pool :
+                    parse, startup, run, output, cycles, rss = pool.apply(measure, (source, engine, timing, repeat))
+                assert output == expected, name + " printed different output under " + engine + " with " + timing + " timing"
+                row = {'workload' : name, 'size' : size, 'engine' : engine, 'timing' : timing, 'instructions' : instructions,
+                       'cycles' : cycles, 'parse_seconds' : round(parse, 6), 'startup_seconds' : round(startup, 6),
+                       'run_seconds' : round(run, 6), 'instructions_per_second' : round(instructions / run), 'peak_rss_kb' : rss}
+                results.append(row)
+                report(formatRow(row))
+    return results
+
+def formatRow(row) :
+    return "{:10s} {:12s} {:9s} {:10,d} instr {:12,d} instr/s   parse {:7.4f}s  startup {:7.4f}s  run {:8.4f}s  {:8,d} KB".format(
+                row['workload'], row['engine'], row['timing'], row['instructions'], row['instructions_per_second'],
+                row['parse_seconds'], row['startup_seconds'], row['run_seconds'], row['peak_rss_kb'])
+
+#lines comparing instructions per second of the rows in results with the matching rows of previous
+def compare(previous, results) :
+    old = {(row['workload'], row['size'], row['engine'], row['timing']) : row for row in previous['results']}
+    lines = ["Compared with {} ({}):".format(previous.get('version', 'unknown version')[:12], previous.get('date', 'unknown date'))]
+    for row in results :
+        before = old.get((row['workload'], row['size'], row['engine'], row['timing']))
+        if before is None :
+            continue
+        lines.append("{:10s} {:12s} {:9s} {:12,d} -> {:12,d} instr/s  {:6.2f}x".format(
+                        row['workload'], row['engine'], row['timing'], before['instructions_per_second'], row['instructions_per_second'],
+                        row['instructions_per_second'] / before['instructions_per_second']))
+    if len(lines) == 1 :
+        lines.append("  nothing to compare: no measurement of the same workload, size, engine and timing model")
+    return lines
+
+if __name__ == '__main__' :
+
+    parser = argparse.ArgumentParser("Benchmark simulator throughput",add_help=True)
+    parser.add_argument("-w", dest="workloads", action="append", choices=sorted(workloads),
+                        help="workload to run; may be repeated (default: all)")
+    parser.add_argument("-e", dest="engines", action="append", choices=sorted(engines.engineMap),
+                        help="engine to run; may be repeated (default: all)")
+    parser.add_argument("-t", dest="timings", action="append", choices=sorted(timingmodel.timingModelMap),
+                        help="timing model to run; may be repeated (default: all)")
+    parser.add_argument("-s", dest="scale", type=float, default=1.0,
+                        help="multiply every workload's size by this (default: 1, about 200000 instructions each)")
+    parser.add_argument("-r", dest="repeat", type=int, default=1, help="runs per measurement; the best is reported (default: 1)")
+    parser.add_argument("-o", dest="output", default=None, help="save the results to this JSON file")
+    parser.add_argument("--compare", dest="compare", default=None, metavar="FILE",
+                        help="compare instructions per second with the results saved in FILE")
+    parser.add_argument("--write", dest="write", default=None, metavar="DIR",
+                        help="only write the workloads, at the chosen scale, as .asm files in DIR")
+    args = parser.parse_args()
+
+    names = args.workloads or sorted(workloads)
+    if args.write :
+        os.makedirs(args.write, exist_ok = True)
+        for name in names :
+            size, source = generate(name, args.scale)
+            with open(os.path.join(args.write, name + '.asm'), 'w') as f :
+                f.write(source)
+    else :
+        results = runSuite(names, args.engines or sorted(engines.engineMap), args.timings or sorted(timingmodel.timingModelMap),
+                           args.scale, args.repeat)
+        if args.output :
+            with open(args.output, 'w') as f :
+                json.dump({'version' : programcache.VERSION, 'date' : time.strftime('%Y-%m-%d %H:%M:%S'),
+                           'python' : platform.python_version(), 'scale' : args.scale, 'repeat' : args.repeat,
+                           'results' : results}, f, indent = 1)
+        if args.compare :
+            with open(args.compare, 'r') as f :
+                previous = json.load(f)
+            for line in compare(previous, results) :
+                print(line)
@@ -0,0 +1,204 @@
+from array import array
+from util import location
+
+#branch predictors for timing models
+#every predictor keeps its state in fixed-size tables of 2-bit saturating counters, indexed by the
+#word address of the branch, so the cost of a prediction does not depend on the program
+
+#kinds of control transfer, see Instruction.controlKind
+BRANCH = 'branch' #conditional branch
+CALL = 'call' #jump that links to ra
+RETURN = 'return' #indirect jump through ra that does not link
+JUMP = 'jump' #any other jump
+
+#counters at or above this value predict taken
+TAKEN = 2
+
+#predicts without keeping any state
+#mode 'taken' or 'nottaken' always predicts the same way; 'btfn' predicts backward branches (loops) taken
+#and forward branches not taken
+class StaticPredictor :
+    def __init__(self, mode = 'btfn') :
+        assert mode in ('taken', 'nottaken', 'btfn'), "Unknown static prediction " + str(mode)
+        self.mode = mode
+
+    def predict(self, pc, target) :
+        if self.mode == 'btfn' :
+            return target <= pc
+        return self.mode == 'taken'
+
+    def update(self, pc, target, taken) :
+        pass
+
+#one 2-bit counter per entry, indexed by pc
+class BimodalPredictor :
+    def __init__(self, entries = 1024) :
+        assert entries > 0 and (entries & (entries - 1)) == 0, "Predictor size must be a power of two"
+        self.mask = entries - 1
+        self.counters = bytearray([TAKEN - 1]) * entries
+
+    def predict(self, pc, target) :
+        return self.counters[(pc >> 2) & self.mask] >= TAKEN
+
+    def update(self, pc, target, taken) :
+        counters = self.counters
+        i = (pc >> 2) & self.mask
+        if taken :
+            if counters[i] < 3 :
+                counters[i] += 1
+        elif counters[i] > 0 :
+            counters[i] -= 1
+
+#2-bit counters indexed by pc xor the outcomes of the last historyBits branches
+class GsharePredictor :
+    def __init__(self, entries = 4096, historyBits = 12) :
+        assert entries > 0 and (entries & (entries - 1)) == 0, "Predictor size must be a power of two"
+        self.mask = entries - 1
+        self.historyMask = (1 << historyBits) - 1
+        self.history = 0
+        self.counters = bytearray([TAKEN - 1]) * entries
+
+    def __index(self, pc) :
+        return ((pc >> 2) ^ self.history) & self.mask
+
+    def predict(self, pc, target) :
+        return self.counters[self.__index(pc)] >= TAKEN
+
+    def update(self, pc, target, taken) :
+        counters = self.counters
+        i = self.__index(pc)
+        if taken :
+            if counters[i] < 3 :
+                counters[i] += 1
+        elif counters[i] > 0 :
+            counters[i] -= 1
+        self.history = ((self.history << 1) | taken) & self.historyMask
+
+#a bimodal and a gshare predictor, with a table of 2-bit choosers (indexed by pc) that learns which of
+#the two to trust for each branch; counters at or above TAKEN pick gshare
+class TournamentPredictor :
+    def __init__(self, entries = 4096, historyBits = 12) :
+        self.local = BimodalPredictor(entries)
+        self.globl = GsharePredictor(entries, historyBits)
+        self.mask = entries - 1
+        self.choosers = bytearray([TAKEN - 1]) * entries
+
+    def predict(self, pc, target) :
+        if self.choosers[(pc >> 2) & self.mask] >= TAKEN :
+            return self.globl.predict(pc, target)
+        return self.local.predict(pc, target)
+
+    def update(self, pc, target, taken) :
+        localRight = self.local.predict(pc, target) == taken
+        globalRight = self.globl.predict(pc, target) == taken
+        if localRight != globalRight :
+            choosers = self.choosers
+            i = (pc >> 2) & self.mask
+            if globalRight :
+                if choosers[i] < 3 :
+                    choosers[i] += 1
+            elif choosers[i] > 0 :
+                choosers[i] -= 1
+        self.local.update(pc, target, taken)
+        self.globl.update(pc, target, taken)
+
+#circular stack of return addresses: calls push, returns pop. When it overflows the oldest entries are
+#overwritten, and popping more than was pushed predicts nothing
+class ReturnAddressStack :
+    def __init__(self, size = 16) :
+        assert size > 0, "Return address stack needs at least one entry"
+        self.size = size
+        self.entries = array('q', [-1]) * size
+        self.top = 0
+        self.depth = 0
+
+    def push(self, address) :
+        self.entries[self.top] = address
+        self.top = (self.top + 1) % self.size
+        if self.depth < self.size :
+            self.depth += 1
+
+    def pop(self) :
+        if self.depth == 0 :
+            return -1
+        self.depth -= 1
+        self.top = (self.top - 1) % self.size
+        return self.entries[self.top]
+
+#predictors selectable by name (see driver.py -b)
+predictorMap = {
+    'static' : StaticPredictor,
+    'bimodal' : BimodalPredictor,
+    'gshare' : GsharePredictor,
+    'tournament' : TournamentPredictor,
+}
+
+#combines a direction predictor with a return address stack and keeps the statistics
+#assumes a perfect target buffer: a correctly predicted taken branch or a direct jump costs nothing extra
+#indirect jumps other than returns are always charged the penalty
+class BranchUnit :
+    def __init__(self, predictor = None, rasSize = 16, penalty = 3) :
+        self.predictor = predictor if predictor is not None else BimodalPredictor()
+        self.ras = ReturnAddressStack(rasSize)
+        self.penalty = penalty
+        #branch pc -> [times executed, times mispredicted]; one entry per static branch
+        self.branchStats = {}
+        self.returns = 0
+        self.returnMisses = 0
+        self.indirectJumps = 0
+
+    #account for inst at pc transferring control to nextPc; returns the penalty in cycles
+    def resolve(self, inst, pc, nextPc) :
+        kind = inst.controlKind
+        if kind == BRANCH :
+            target = inst.target
+            if target == pc + 4 :
+                #both ways go to the same place, so nextPc does not say which was taken; the branch costs
+                #nothing either way, and is kept out of the predictor and the statistics
+                return 0
+            taken = nextPc != pc + 4
+            predicted = self.predictor.predict(pc, target)
+            self.predictor.update(pc, target, taken)
+            stats = self.branchStats.get(pc)
+            if stats is None :
+                stats = self.branchStats[pc] = [0, 0]
+            stats[0] += 1
+            if predicted != taken :
+                stats[1] += 1
+                return self.penalty
+            return 0
+        elif kind == RETURN :
+            self.returns += 1
+            if self.ras.pop() != nextPc :
+                self.returnMisses += 1
+                return self.penalty
+            return 0
+        elif kind == CALL :
+            self.ras.push(pc + 4)
+            if getattr(inst, 'target', None) is None :
+                self.indirectJumps += 1
+                return self.penalty
+            return 0
+        if getattr(inst, 'target', None) is None :
+            self.indirectJumps += 1
+            return self.penalty
+        return 0
+
+    #summary lines, followed by the worst predicted branches (labelled from symbols, address -> label)
+    def getStats(self, symbols = {}, worst = 10) :
+        executed = sum(s[0] for s in self.branchStats.values())
+        missed = sum(s[1] for s in self.branchStats.values())
+        lines = ["Branches: {} executed, {} mispredicted; {:.2f}% accuracy".format(executed, missed, self.__accuracy(executed, missed))]
+        lines.append("Returns: {} executed, {} mispredicted; {:.2f}% accuracy".format(self.returns, self.returnMisses, self.__accuracy(self.returns, self.returnMisses)))
+        if self.indirectJumps :
+            lines.append("Indirect jumps: {} (always mispredicted)".format(self.indirectJumps))
+        ranked = sorted(self.branchStats.items(), key = lambda item : (-item[1][1], item[0]))
+        for pc, (count, misses) in ranked[:worst] :
+            if misses == 0 :
+                break
+            where = hex(pc) + location(pc, symbols)
+            lines.append("  {}: {} executed, {} mispredicted; {:.2f}% accuracy".format(where, count, misses, self.__accuracy(count, misses)))
+        return lines
+
+    def __accuracy(self, count, misses) :
+        return (100.0 * (count - misses) / count) if count else 100.0
@@ -0,0 +1,135 @@
+from array import array
+
+#replacement policies
+LRU = 'lru'
+PLRU = 'plru'
+RANDOM = 'random'
+
+#one level of a set-associative cache; only tags are tracked, no data
+#all state lives in flat arrays indexed by set * associativity + way, so an access allocates nothing
+class Cache :
+    #size and lineSize are in bytes; size, associativity and lineSize must be powers of two
+    def __init__(self, name = 'L1', size = 32 * 1024, associativity = 4, lineSize = 64, policy = LRU, hitLatency = 1, seed = 1) :
+        assert policy in (LRU, PLRU, RANDOM), "Unknown replacement policy " + str(policy)
+        for value in (size, associativity, lineSize) :
+            assert value > 0 and (value & (value - 1)) == 0, "Cache size, associativity and line size must be powers of two"
+        assert size >= associativity * lineSize, "Cache too small for its associativity and line size"
+
+        self.name = name
+        self.size = size
+        self.associativity = associativity
+        self.lineSize = lineSize
+        self.policy = policy
+        self.hitLatency = hitLatency
+
+        self.numSets = size // (associativity * lineSize)
+        self.lineShift = lineSize.bit_length() - 1
+        self.setMask = self.numSets - 1
+
+        #tag store: the full line number held by each way, -1 if the way is empty
+        self.tags = array('q', [-1]) * (self.numSets * associativity)
+        #LRU: time of last use per way
+        self.stamps = array('q', [0]) * (self.numSets * associativity)
+        self.clock = 0
+        #PLRU: associativity - 1 tree bits per set; each bit points towards the less recently used half
+        self.treeBits = bytearray(self.numSets * max(associativity - 1, 1))
+        self.levels = associativity.bit_length() - 1
+        #random: xorshift state
+        self.seed = seed or 1
+
+        self.hits = 0
+        self.misses = 0
+
+    #look up the line holding address, filling it on a miss; returns True on a hit
+    def access(self, address) :
+        line = address >> self.lineShift
+        assoc = self.associativity
+        base = (line & self.setMask) * assoc
+        tags = self.tags
+        try :
+            way = tags.index(line, base, base + assoc)
+            self.hits += 1
+            self.__touch(base, way - base)
+            return True
+        except ValueError :
+            pass
+
+        self.misses += 1
+        try :
+            way = tags.index(-1, base, base + assoc) - base
+        except ValueError :
+            way = self.__victim(base)
+        tags[base + way] = line
+        self.__touch(base, way)
+        return False
+
+    def __touch(self, base, way) :
+        policy = self.policy
+        if policy == LRU :
+            self.clock += 1
+            self.stamps[base + way] = self.clock
+        elif policy == PLRU :
+            bits = self.treeBits
+            treeBase = (base // self.associativity) * (self.associativity - 1)
+            node = 0
+            for level in range(self.levels - 1, -1, -1) :
+                bit = (way >> level) & 1
+                bits[treeBase + node] = bit ^ 1
+                node = 2 * node + 1 + bit
+
+    def __victim(self, base) :
+        policy = self.policy
+        if policy == LRU :
+            stamps = self.stamps
+            way = 0
+            oldest = stamps[base]
+            for w in range(1, self.associativity) :
+                if stamps[base + w] < oldest :
+                    oldest = stamps[base + w]
+                    way = w
+            return way
+        elif policy == PLRU :
+            bits = self.treeBits
+            treeBase = (base // self.associativity) * (self.associativity - 1)
+            node = 0
+            way = 0
+            for level in range(self.levels) :
+                bit = bits[treeBase + node]
+                way = (way << 1) | bit
+                node = 2 * node + 1 + bit
+            return way
+        else :
+            x = self.seed
+            x ^= (x << 13) & 0xFFFFFFFF
+            x ^= x >> 17
+            x ^= (x << 5) & 0xFFFFFFFF
+            self.seed = x
+            return x % self.associativity
+
+    def getStats(self) :
+        accesses = self.hits + self.misses
+        rate = (100.0 * self.hits / accesses) if accesses else 0.0
+        return "{}: {} hits, {} misses; {:.2f}% hit rate".format(self.name, self.hits, self.misses, rate)
+
+    def __str__(self) :
+        return "{} {}B {}-way {}B lines {} ({} cycles)".format(self.name, self.size, self.associativity, self.lineSize, self.policy, self.hitLatency)
+
+#parse a cache description of the form size,associativity,lineSize[,policy[,hitLatency]], e.g. 32768,4,64,lru,1
+def parseCacheSpec(name, spec) :
+    fields = spec.split(',')
+    assert 3 <= len(fields) <= 5, "Cache spec must be size,associativity,lineSize[,policy[,hitLatency]]"
+    kwargs = {'name' : name, 'size' : int(fields[0]), 'associativity' : int(fields[1]), 'lineSize' : int(fields[2])}
+    if len(fields) > 3 :
+        kwargs['policy'] = fields[3].lower()
+    if len(fields) > 4 :
+        kwargs['hitLatency'] = int(fields[4])
+    return kwargs
+
+
+if __name__ == '__main__' :
+    for policy in (LRU, PLRU, RANDOM) :
+        c = Cache(size = 256, associativity = 4, lineSize = 16, policy = policy)
+        for rep in range(4) :
+            for addr in range(0, 512, 4) :
+                c.access(addr)
+        print(policy, c.getStats())
@@ -0,0 +1,60 @@
+import copy
+import pickle
+
+#checkpoints: the state of a Machine between two instructions of a run, so the rest of the run can be
+#simulated again -- under another timing model, or with other input -- without starting from the top
+#
+#memory is snapshotted copy-on-write (see Memory.snapshot): a checkpoint shares every page with the
+#machine until the machine next writes to it, so keeping many checkpoints only costs the pages written in
+#between. The rest of the state is small and copied outright. Checkpoints pickle, so save and load can
+#keep one on disk and resume the run in another process (see resume.py)
+
+class Checkpoint :
+    def __init__(self, machine) :
+        #flush first so output written before the checkpoint is never repeated after a restore
+        machine.output.flush()
+        self.prog = machine.prog
+        self.checked = machine.checked
+        self.pc = machine.pc
+        self.numIntRegisters = machine.numIntRegisters
+        self.numFloatRegisters = machine.numFloatRegisters
+        self.intRegisters = list(machine.intRegisters)
+        self.floatRegisters = list(machine.floatRegisters)
+        self.pages = machine.memory.snapshot()
+        self.accessCounts = (machine.memory.r_count, machine.memory.w_count)
+        self.memoryManager = copy.deepcopy(machine.memoryManager)
+        self.timingModel = copy.deepcopy(machine.timingModel)
+        #lines of input consumed so far
+        self.linesRead = machine.input.next
+
+    #whether the run had already reached HALT
+    @property
+    def halted(self) :
+        return self.pc == -1
+
+    #put the machine back in this state; the checkpoint is unchanged, so it can be restored any number of times
+    def restoreInto(self, machine) :
+        assert (len(self.intRegisters) == len(machine.intRegisters) and len(self.floatRegisters) == len(machine.floatRegisters)), \
+            "Checkpoint was taken on a machine with a different number of registers"
+        machine.output.flush()
+        machine.prog = self.prog
+        machine.checked = self.checked
+        machine.pc = self.pc
+        #in place, since register lists are shared with the register file
+        machine.intRegisters[:] = self.intRegisters
+        machine.floatRegisters[:] = self.floatRegisters
+        machine.memory.restore(self.pages)
+        machine.memory.r_count, machine.memory.w_count = self.accessCounts
+        machine.memoryManager = copy.deepcopy(self.memoryManager)
+        machine.timingModel = copy.deepcopy(self.timingModel)
+        machine.input.next = self.linesRead
+
+def save(checkpoint, path) :
+    with open(path, 'wb') as f :
+        pickle.dump(checkpoint, f, pickle.HIGHEST_PROTOCOL)
+
+def load(path) :
+    with open(path, 'rb') as f :
+        checkpoint = pickle.load(f)
+    assert isinstance(checkpoint, Checkpoint), path + " is not a checkpoint"
+    return checkpoint
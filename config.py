@@ -1,4 +0,0 @@
-import machine
-import timingmodel
-
-machine = machine.Machine(numIntRegisters = 256, numFloatRegisters = 256, timingModel = timingmodel.basicTimingModel)
\ No newline at end of file
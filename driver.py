@@ -2,11 +2,62 @@ from memory import Memory
 from registers import IRegister
 from registers import FRegister
 import timingmodel
-import program
-import config
+import programcache
 import machine
+import memorymanager
+import exectrace
+import checkpoint
+import sampling
+import engines
+import cache
+import branchpredictor
+import functools
+import json
 import sys
 import argparse
+from util import parseint
+
+#options that choose and configure the timing model; shared with replay.py
+def addTimingOptions(parser) :
+    parser.add_argument("-t", dest="timing", choices=sorted(timingmodel.timingModelMap), default="basic",
+                        help="timing model (default: basic)")
+    parser.add_argument("--l1", dest="l1", metavar="SPEC",
+                        help="L1 cache for -t cache, as size,assoc,line[,lru|plru|random[,latency]] (default: 32768,4,64,lru,1)")
+    parser.add_argument("--l2", dest="l2", metavar="SPEC",
+                        help="L2 cache for -t cache, same format, or 'none' (default: 262144,8,64,lru,10)")
+    parser.add_argument("--mem-latency", dest="mem_latency", type=int, default=100,
+                        help="main memory latency for -t cache (default: 100)")
+
+    parser.add_argument("--issue-width", dest="issue_width", type=int, default=1,
+                        help="instructions issued per cycle for -t pipeline (default: 1)")
+    parser.add_argument("--no-forwarding", dest="forwarding", action="store_false",
+                        help="disable result forwarding for -t pipeline")
+
+    parser.add_argument("-b", dest="predictor", choices=sorted(branchpredictor.predictorMap),
+                        help="branch predictor for -t branch (default: bimodal) and -t pipeline (default: none)")
+    parser.add_argument("--mispredict-penalty", dest="mispredict_penalty", type=int, default=3,
+                        help="cycles lost to a mispredicted branch (default: 3)")
+    parser.add_argument("--ras-size", dest="ras_size", type=int, default=16,
+                        help="entries in the return address stack (default: 16)")
+
+#the timing model class (or a partial of one) described by the options from addTimingOptions
+def buildTimingModel(args) :
+    timingModel = timingmodel.timingModelMap[args.timing]
+    branchUnit = None
+    if args.predictor or args.timing == 'branch' :
+        predictor = branchpredictor.predictorMap[args.predictor or 'bimodal']()
+        branchUnit = branchpredictor.BranchUnit(predictor, rasSize = args.ras_size, penalty = args.mispredict_penalty)
+    if args.timing == 'cache' :
+        l1 = cache.parseCacheSpec('L1', args.l1) if args.l1 else None
+        l2 = None
+        if args.l2 :
+            l2 = {} if args.l2 == 'none' else cache.parseCacheSpec('L2', args.l2)
+        timingModel = functools.partial(timingmodel.cacheTimingModel, l1 = l1, l2 = l2, memoryLatency = args.mem_latency)
+    elif args.timing == 'pipeline' :
+        timingModel = functools.partial(timingmodel.pipelineTimingModel, issueWidth = args.issue_width, forwarding = args.forwarding, branchUnit = branchUnit)
+    elif args.timing == 'branch' :
+        timingModel = functools.partial(timingmodel.branchTimingModel, branchUnit = branchUnit)
+    return timingModel
 
 if __name__ == '__main__' :
 
@@ -15,20 +66,147 @@ if __name__ == '__main__' :
                         help="show memory usage")
     parser.add_argument("asm", help="assembly file to simulate")
     parser.add_argument("nregs", nargs="?", help="number of registers to simulate")
-    parser.add_argument("-d",dest="use_debug", help="set to 1 to print assembly lines as they are being executed")
+    parser.add_argument("-d",dest="use_debug", help="set to 1 to print the pc and text of each instruction as it executes (see --exec-trace)")
+    parser.add_argument("-e", dest="engine", choices=sorted(engines.engineMap), default="interpreter",
+                        help="execution engine to simulate with (default: interpreter)")
+    parser.add_argument("-c", dest="checked", action="store_true", default=False,
+                        help="check register types and immediates as each instruction executes instead of verifying the program before it runs")
+
+    parser.add_argument("--max-instructions", dest="max_instructions", type=int, metavar="N",
+                        help="stop with an error after N instructions")
+    parser.add_argument("--program-cache", dest="program_cache", metavar="DIR", default=programcache.defaultDirectory(),
+                        help="reuse assembled programs cached in DIR (default: $RISCSIM_PROGRAM_CACHE, or no cache)")
+    parser.add_argument("--trace", dest="trace", metavar="FILE",
+                        help="record the run's timing events to FILE, for replay.py")
+    parser.add_argument("--heap-policy", dest="heap_policy", choices=memorymanager.policies, default="first",
+                        help="how MALLOC picks a free block (default: first)")
+    parser.add_argument("--heap-profile", dest="heap_profile", action="store_true", default=False,
+                        help="profile MALLOC/FREE and print a heap summary, including leaks, after the run")
+    parser.add_argument("--heap-series", dest="heap_series", metavar="FILE",
+                        help="also write a CSV time series of the heap to FILE (implies --heap-profile)")
+    parser.add_argument("--heap-interval", dest="heap_interval", type=int, default=1000, metavar="N",
+                        help="heap operations between time series samples (default: 1000)")
+    parser.add_argument("--profile", dest="profile", action="store_true", default=False,
+                        help="count executions and cycles per instruction and print them by label, by basic block and as an annotated listing")
+    parser.add_argument("--profile-output", dest="profile_output", metavar="FILE",
+                        help="write the profile to FILE instead of stdout (implies --profile)")
+    parser.add_argument("--mix", dest="mix", action="store_true", default=False,
+                        help="count retired instructions and print CPI, simulation speed and the dynamic mix by class and by opcode")
+    parser.add_argument("--mix-output", dest="mix_output", metavar="FILE",
+                        help="write the instruction mix to FILE as JSON instead (implies --mix)")
+    parser.add_argument("--exec-trace", dest="exec_trace", metavar="FILE",
+                        help="record each executed instruction to FILE ('-' for stdout); gzip-compressed if FILE ends in .gz")
+    parser.add_argument("--exec-trace-fields", dest="exec_trace_fields", default="pc,inst", metavar="FIELDS",
+                        help="comma-separated fields to record, from " + ",".join(exectrace.FIELDS) + " (default: pc,inst)")
+    parser.add_argument("--exec-trace-range", dest="exec_trace_ranges", action="append", default=[], metavar="START:END",
+                        help="only record instructions at addresses from START up to END; may be repeated")
+    parser.add_argument("--exec-trace-label", dest="exec_trace_labels", action="append", default=[], metavar="LABEL",
+                        help="only record instructions from LABEL up to the next label; may be repeated")
+    parser.add_argument("--exec-trace-ring", dest="exec_trace_ring", type=int, default=0, metavar="N",
+                        help="keep only the last N events, and write them only if the run fails")
+    parser.add_argument("--exec-trace-binary", dest="exec_trace_binary", action="store_true", default=False,
+                        help="write the trace in binary (read it back with exectrace.py)")
+    parser.add_argument("--checkpoint", dest="checkpoint", metavar="FILE",
+                        help="save the machine's state to FILE after --checkpoint-at instructions, for resume.py")
+    parser.add_argument("--checkpoint-at", dest="checkpoint_at", type=int, default=0, metavar="N",
+                        help="instructions to run before saving the checkpoint (default: 0)")
+    parser.add_argument("--sample-period", dest="sample_period", type=int, default=0, metavar="N",
+                        help="sampled simulation: time one sample in detail every N instructions, and run the rest functionally")
+    parser.add_argument("--sample-size", dest="sample_size", type=int, default=1000, metavar="N",
+                        help="instructions measured per sample (default: 1000)")
+    parser.add_argument("--sample-warmup", dest="sample_warmup", type=int, default=0, metavar="N",
+                        help="instructions simulated in detail, but not measured, before each sample (default: 0)")
+    parser.add_argument("--roi", dest="roi", action="store_true", default=False,
+                        help="sampled simulation: time only the regions between ROI.BEGIN and ROI.END instructions in detail")
+    parser.add_argument("--roi-begin", dest="roi_begins", action="append", default=[], metavar="LABEL",
+                        help="also start a region at LABEL (implies --roi); may be repeated")
+    parser.add_argument("--roi-end", dest="roi_ends", action="append", default=[], metavar="LABEL",
+                        help="also end a region at LABEL (implies --roi); may be repeated")
+    parser.add_argument("--input", dest="input", metavar="FILE",
+                        help="read the program's GET* input from FILE instead of stdin")
+    parser.add_argument("--output", dest="output", metavar="FILE",
+                        help="write the program's PUT* output to FILE instead of stdout")
+    addTimingOptions(parser)
 
     args = parser.parse_args()
 
+    sampled = args.sample_period or args.roi or args.roi_begins or args.roi_ends
+    #these are set up by Machine.run for a single run from the top, which sampled and checkpointed runs do
+    #not make
+    perRun = (("--exec-trace", args.exec_trace), ("-d", args.use_debug), ("--profile", args.profile or args.profile_output),
+              ("--trace", args.trace), ("--mix", args.mix or args.mix_output))
+    if sampled and args.checkpoint :
+        parser.error("--checkpoint cannot be used with sampled simulation")
+    for mode, chosen in (("sampled simulation", sampled), ("--checkpoint", args.checkpoint)) :
+        for flag, given in perRun :
+            if chosen and given :
+                parser.error(flag + " cannot be used with " + mode)
+
+    timingModel = buildTimingModel(args)
+    stdin = open(args.input, 'r') if args.input else None
+    stdout = open(args.output, 'w') if args.output else None
+
     if args.nregs :
         if int(args.nregs) < 32 :
             print("Cannot initialize simulator with fewer than 32 registers")
             sys.exit(1)
         print("Initializing machine with " + args.nregs + " registers")
-        config.machine = machine.Machine(numIntRegisters = int(args.nregs), numFloatRegisters = int(args.nregs), timingModel = timingmodel.basicTimingModel)
+        m = machine.Machine(numIntRegisters = int(args.nregs), numFloatRegisters = int(args.nregs), timingModel = timingModel, stdin = stdin, stdout = stdout, heapPolicy = args.heap_policy,
+                            heapProfile = args.heap_profile or bool(args.heap_series), heapInterval = args.heap_interval if args.heap_series else 0)
     else :
         print("Using default machine configuration with 256 registers")
+        m = machine.Machine(numIntRegisters = 256, numFloatRegisters = 256, timingModel = timingModel, stdin = stdin, stdout = stdout, heapPolicy = args.heap_policy,
+                            heapProfile = args.heap_profile or bool(args.heap_series), heapInterval = args.heap_interval if args.heap_series else 0)
+
+    m.instructionLimit = args.max_instructions
+
+    if args.exec_trace :
+        if args.exec_trace == '-' :
+            sink = exectrace.BinarySink(sys.stdout.buffer) if args.exec_trace_binary else exectrace.TextSink()
+        else :
+            sink = exectrace.openSink(args.exec_trace, args.exec_trace_binary)
+        ranges = [tuple(parseint(part) for part in r.split(':')) for r in args.exec_trace_ranges]
+        m.tracer = exectrace.Tracer(sink, args.exec_trace_fields.split(','), ranges, args.exec_trace_labels, args.exec_trace_ring)
+
+    p = programcache.loadProgram(args.asm, args.program_cache)
+
+    try :
+        if sampled :
+            run =sampling.SampledRun(m, args.engine, args.sample_period, args.sample_warmup, args.sample_size, args.roi_begins, args.roi_ends)
+            for line in run.run(p, args.checked).getStats() :
+                print(line)
+            if args.memuse :
+                for line in m.timingModel.getStats(m) :
+                    print(line)
+            for line in m.memoryManager.getStats(m.prog.symbols) :
+                print(line)
+        elif args.checkpoint :
+            m.start(p, args.checked)
+            m.resume(args.engine, args.checkpoint_at)
+            checkpoint.save(m.checkpoint(), args.checkpoint)
+            m.resume(args.engine)
+            m.printStats(args.memuse)
+        else :
+            m.execProgram(p, args.memuse, useDebug=args.use_debug, engine=args.engine, checked=args.checked, trace=args.trace,
+                          profile=args.profile or bool(args.profile_output), count=args.mix or bool(args.mix_output))
+    finally :
+        #the program's own I/O files are done with once the run is over
+        if stdin is not None :
+            stdin.close()
+        if stdout is not None :
+            stdout.close()
+
+    if args.profile_output :
+        with open(args.profile_output, 'w') as f :
+            f.write('\n'.join(m.profile.report()) + '\n')
+    elif args.profile :
+        print('\n'.join(m.profile.report()))
 
-    p = program.Program()
-    p.buildCodeFromFile(args.asm)
+    if args.mix_output :
+        with open(args.mix_output, 'w') as f :
+            json.dump(m.mix.toDict(), f, indent = 1)
+    elif args.mix :
+        print('\n'.join(m.mix.report()))
 
-    config.machine.execProgram(p, args.memuse, useDebug=args.use_debug)
+    if args.heap_series :
+        m.memoryManager.writeSeries(args.heap_series)
@@ -0,0 +1,148 @@
+import functools
+
+#execution engines: an engine runs the program loaded on a machine from machine.pc until HALT
+#if machine.instructionLimit is set, a run that would execute more instructions than that stops with
+#a RuntimeError instead; engines check the limit only in that case, so unlimited runs pay nothing for it
+#under a limit, engines also leave the number of instructions the run executed in their executed attribute
+#likewise, engines only count executions for machine.profile (see hotspots.py) and only trace steps for
+#machine.tracer (see exectrace.py) when they are set
+
+class InstructionLimitExceeded(RuntimeError) :
+    def __init__(self, limit) :
+        super().__init__("Instruction limit of " + str(limit) + " exceeded")
+
+#reference engine: look up each instruction by pc and call its exec method
+#in checked mode each instruction is verified right before it executes, instead of once at load time
+class InterpreterEngine :
+    def __init__(self, machine) :
+        self.machine = machine
+
+    def run(self) :
+        machine = self.machine
+        code = machine.prog.code
+        limit = machine.instructionLimit
+        executed = 0
+        profile = machine.profile
+        tracer = machine.tracer
+        timingModel = machine.timingModel
+        timeProfile = profile is not None and profile.timed and timingModel.dynamic
+        base = machine.memory.text[0]
+        try :
+            while (machine.pc != -1) :
+                if (limit is not None) :
+                    if (executed == limit) :
+                        raise InstructionLimitExceeded(limit)
+                    executed += 1
+                inst = code[machine.pc]
+                if (machine.checked):
+                    inst.verify()
+                if (profile is not None or tracer is not None) :
+                    i = (machine.pc - base) >> 2
+                    if (profile is not None) :
+                        profile.counts[i] += 1
+                        before = timingModel.elapsedTime
+                    if (tracer is not None) :
+                        tracer.step(i, functools.partial(inst.exec, machine))
+                    else :
+                        inst.exec(machine)
+                    if (timeProfile) :
+                        profile.cycles[i] += timingModel.elapsedTime - before
+                    continue
+                inst.exec(machine)
+        finally :
+            self.executed = executed
+
+#compile every instruction once into a closure (see Instruction.compile) and keep the closures in a list
+#indexed by (pc - text base) >> 2, so each step is one list index and one call
+#with a static timing model, the closures do not charge time; the engine adds each instruction's baked-in
+#cost from a parallel list instead
+class ClosureEngine :
+    def __init__(self, machine) :
+        self.machine = machine
+        self.base = machine.memory.text[0]
+        code = machine.prog.code
+        timingModel = machine.timingModel
+        self.code = []
+        self.costs = []
+        for addr in range(self.base, self.base + 4 * len(code), 4) :
+            inst = code[addr]
+            run = inst.compile(machine, addr)
+            self.code.append(run)
+            if (timingModel.dynamic or getattr(run, 'timed', False)) :
+                self.costs.append(0)
+            else :
+                self.costs.append(inst.cost(timingModel))
+
+    def run(self) :
+        machine = self.machine
+        code = self.code
+        costs = self.costs
+        base = self.base
+        pc = machine.pc
+        cycles = 0
+        limit = machine.instructionLimit
+        profile = machine.profile
+        tracer = machine.tracer
+        timingModel = machine.timingModel
+        timeProfile = profile is not None and profile.timed and timingModel.dynamic
+        executed = 0
+        try :
+            if (limit is not None or tracer is not None) :
+                while (pc != -1) :
+                    if (limit is not None) :
+                        if (executed == limit) :
+                            raise InstructionLimitExceeded(limit)
+                        executed += 1
+                    i = (pc - base) >> 2
+                    cycles += costs[i]
+                    run = code[i]
+                    if (profile is not None) :
+                        profile.counts[i] += 1
+                        before = timingModel.elapsedTime
+                    if (tracer is not None) :
+                        pc = tracer.step(i, run)
+                    else :
+                        pc = run()
+                    if (timeProfile) :
+                        profile.cycles[i] += timingModel.elapsedTime - before
+            elif (profile is not None) :
+                counts = profile.counts
+                if (timeProfile) :
+                    spent = profile.cycles
+                    while (pc != -1) :
+                        i = (pc - base) >> 2
+                        counts[i] += 1
+                        before = timingModel.elapsedTime
+                        pc = code[i]()
+                        spent[i] += timingModel.elapsedTime - before
+                else :
+                    while (pc != -1) :
+                        i = (pc - base) >> 2
+                        counts[i] += 1
+                        cycles += costs[i]
+                        pc = code[i]()
+            elif (machine.timingModel.dynamic) :
+                while (pc != -1) :
+                    pc = code[(pc - base) >> 2]()
+            else :
+                while (pc != -1) :
+                    i = (pc - base) >> 2
+                    cycles += costs[i]
+                    pc = code[i]()
+        except IndexError :
+            #running off the end of .text fails the same way the interpreter's pc lookup does
+            if ((pc - base) >> 2) < len(code) :
+                raise
+            raise KeyError(pc) from None
+        finally :
+            machine.pc = pc
+            machine.timingModel.elapsedTime += cycles
+            self.executed = executed
+
+#engines selectable by name (see driver.py -e)
+engineMap = {
+    'interpreter' : InterpreterEngine,
+    'closure' : ClosureEngine,
+}
+
+import translator #registers the basic-block translator
@@ -0,0 +1,227 @@
+from collections import deque
+import argparse
+import gzip
+import struct
+import sys
+import instructions
+import program
+from registers import X0_SINK
+
+#execution tracing: one event per executed instruction, with a chosen set of fields, for debugging and
+#for tools. Engines only look at machine.tracer when it is set, so runs without a tracer pay nothing;
+#with one, they dispatch an instruction at a time and hand each step to Tracer.step
+#
+#fields:
+#  pc    address of the instruction
+#  inst  the instruction's text
+#  regs  the registers it wrote and their new values
+#  mem   the address a load or store accessed
+#events can be limited to address ranges and labels (a label covers the addresses up to the next label).
+#With ring set, only the last ring events are kept, and they are written out only if the run fails
+
+FIELDS = ('pc', 'inst', 'regs', 'mem')
+
+#binary trace format: MAGIC, a byte of field flags (bit n set if FIELDS[n] was recorded), the length of
+#the program source as a 4-byte little-endian int and the source itself (utf-8), then one record per
+#event, all little-endian: the pc (uint32); with regs, the value written to each destination of the
+#instruction, in the order of its destinations() (int64 for int registers, float64 for float ones);
+#with mem, a byte that is 1 for loads and stores, followed by the address (int64) if so.
+#Instruction text is not stored; readers take it from the program
+MAGIC = b'RVEXEC1\n'
+
+#writes events as text, one line per event with its fields separated by tabs
+class TextSink :
+    def __init__(self, stream = None) :
+        self.stream = stream
+
+    def start(self, prog, fields) :
+        self.fields = fields
+
+    def write(self, event) :
+        (self.stream or sys.stdout).write(formatEvent(event, self.fields) + '\n')
+
+    def close(self) :
+        if self.stream is not None :
+            self.stream.close()
+
+#writes events in the binary format above
+class BinarySink :
+    def __init__(self, stream) :
+        self.stream = stream
+
+    def start(self, prog, fields) :
+        self.fields = fields
+        flags = sum(1 << n for n, field in enumerate(FIELDS) if field in fields)
+        source = prog.source.encode('utf-8')
+        self.stream.write(MAGIC + bytes([flags]) + struct.pack('<I', len(source)) + source)
+
+    def write(self, event) :
+        pc, inst, writes, address = event
+        data = [struct.pack('<I', pc)]
+        if 'regs' in self.fields :
+            for name, regtype, value in writes :
+                if regtype == int :
+                    #wrapped to 64 bits, since Python ints do not overflow
+                    data.append(struct.pack('<q', ((value + (1 << 63)) & ((1 << 64) - 1)) - (1 << 63)))
+                else :
+                    data.append(struct.pack('<d', value))
+        if 'mem' in self.fields :
+            data.append(b'\0' if address is None else b'\1' + struct.pack('<q', address))
+        self.stream.write(b''.join(data))
+
+    def close(self) :
+        self.stream.close()
+
+#a sink writing to path: binary if binary is set, text otherwise; gzip-compressed if path ends in .gz
+def openSink(path, binary = False) :
+    if path.endswith('.gz') :
+        return BinarySink(gzip.open(path, 'wb')) if binary else TextSink(gzip.open(path, 'wt'))
+    return BinarySink(open(path, 'wb')) if binary else TextSink(open(path, 'w'))
+
+#an event as a line of text
+def formatEvent(event, fields) :
+    pc, inst, writes, address = event
+    parts = []
+    if 'pc' in fields :
+        parts.append(hex(pc))
+    if 'inst' in fields :
+        parts.append(str(inst))
+    if 'regs' in fields :
+        parts.append(' '.join(name + '=' + str(value) for name, regtype, value in writes))
+    if 'mem' in fields :
+        parts.append('' if address is None else '@' + hex(address))
+    return '\t'.join(parts)
+
+class Tracer :
+    #sink: where events go (default: text on stdout); fields: a subset of FIELDS
+    #ranges: (start, end) address ranges, end excluded; labels: label names; events are only kept for
+    #instructions in one of them, or for all instructions if neither is given
+    #ring: if not 0, keep only the last ring events, and write them only if the run fails
+    def __init__(self, sink = None, fields = ('pc', 'inst'), ranges = (), labels = (), ring = 0) :
+        for field in fields :
+            if field not in FIELDS :
+                raise KeyError("Unknown trace field " + str(field))
+        self.sink = sink if sink is not None else TextSink()
+        self.fields = tuple(field for field in FIELDS if field in fields)
+        self.ranges = list(ranges)
+        self.labels = list(labels)
+        self.ring = deque(maxlen = ring) if ring else None
+        self.wantsRegs = 'regs' in self.fields
+        self.wantsMem = 'mem' in self.fields
+
+    #whether events are written as text to whatever sys.stdout is
+    def toStdout(self) :
+        return isinstance(self.sink, TextSink) and self.sink.stream is None and self.ring is None
+
+    #called by Machine.run before the program starts
+    def start(self, prog, machine) :
+        self.machine = machine
+        self.base = machine.memory.text[0]
+        self.code = [prog.code[self.base + 4 * i] for i in range(len(prog.code))]
+
+        #which instruction indexes are traced
+        ranges = list(self.ranges)
+        if self.labels :
+            ends = sorted(set(prog.labels.values())) + [self.base + 4 * len(self.code)]
+            for label in self.labels :
+                start = prog.labels[label]
+                ranges.append((start, min(end for end in ends if end > start)))
+        if ranges :
+            self.selected = bytearray(len(self.code))
+            for start, end in ranges :
+                for addr in range(max(start, self.base), min(end, self.base + 4 * len(self.code)), 4) :
+                    self.selected[(addr - self.base) >> 2] = 1
+        else :
+            self.selected = bytearray(b'\1') * len(self.code)
+
+        #destinations worth reporting, per instruction: writes to x0 are thrown away
+        self.destinations = [[(name, reg) for name, reg in inst.destinations() if reg[1] != X0_SINK] for inst in self.code]
+        self.sink.start(prog, self.fields)
+
+    #run the instruction at index i by calling run, recording an event for it once it is done; returns
+    #what run returns
+    def step(self, i, run) :
+        if not self.selected[i] :
+            return run()
+        inst = self.code[i]
+        machine = self.machine
+        address = None
+        if self.wantsMem and isinstance(inst, instructions.MemInstruction) :
+            address = inst._calculateAddress(machine)
+        try :
+            result = run()
+        except Exception :
+            #the instruction that failed is the one most worth seeing, even though it wrote nothing
+            self.__record((self.base + 4 * i, inst, (), address))
+            raise
+        writes = ()
+        if self.wantsRegs :
+            registers = machine.registers
+            writes = [(name, regtype, registers[regtype][index]) for name, (regtype, index) in self.destinations[i]]
+        self.__record((self.base + 4 * i, inst, writes, address))
+        return result
+
+    def __record(self, event) :
+        if self.ring is not None :
+            self.ring.append(event)
+        else :
+            self.sink.write(event)
+
+    #called by Machine.run when the run fails: write out the events the ring kept
+    def postMortem(self) :
+        if self.ring is not None :
+            for event in self.ring :
+                self.sink.write(event)
+            self.ring.clear()
+
+    def close(self) :
+        self.sink.close()
+
+#events of a binary trace at path, as (pc, inst, writes, address) like the ones a Tracer records,
+#along with the fields it holds and the Program it was recorded from
+def readTrace(path) :
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f :
+        data = f.read()
+    assert data.startswith(MAGIC), path + " is not a binary execution trace"
+    offset = len(MAGIC)
+    flags = data[offset]
+    (length,) = struct.unpack_from('<I', data, offset + 1)
+    offset += 5
+    source = data[offset : offset + length].decode('utf-8')
+    offset += length
+    fields = tuple(field for n, field in enumerate(FIELDS) if flags & (1 << n))
+
+    prog = program.Program()
+    prog.buildCode(source.splitlines())
+    destinations = {pc : [(name, reg) for name, reg in inst.destinations() if reg[1] != X0_SINK] for pc, inst in prog.code.items()}
+
+    events = []
+    while offset < len(data) :
+        (pc,) = struct.unpack_from('<I', data, offset)
+        offset += 4
+        inst = prog.code[pc]
+        writes = []
+        if 'regs' in fields :
+            for name, (regtype, index) in destinations[pc] :
+                (value,) = struct.unpack_from('<q' if regtype == int else '<d', data, offset)
+                offset += 8
+                writes.append((name, regtype, value))
+        address = None
+        if 'mem' in fields :
+            if data[offset] :
+                (address,) = struct.unpack_from('<q', data, offset + 1)
+                offset += 8
+            offset += 1
+        events.append((pc, inst, writes, address))
+    return fields, prog, events
+
+if __name__ == '__main__' :
+
+    parser = argparse.ArgumentParser("Print a binary execution trace as text",add_help=True)
+    parser.add_argument("trace", help="trace file written by driver.py --exec-trace ... --exec-trace-binary")
+    args = parser.parse_args()
+
+    fields, prog, events = readTrace(args.trace)
+    for event in events :
+        print(formatEvent(event, fields))
@@ -0,0 +1,140 @@
+import memorymanager
+from util import location
+
+#heap profiling: a MemoryManager that keeps counters on every MALLOC and FREE, for tuning allocation-heavy
+#programs. Each operation only updates counters and dicts; anything that needs a walk of the free list
+#(free block counts, the largest hole, fragmentation) is only worked out for a sample or the summary
+#
+#the free block running to the end of the heap is the part of the heap never handed out, not a hole, so
+#hole statistics leave it out. Fragmentation is the fraction of the heap below that block that is free
+#
+#with an interval, a sample of the heap is appended to series every interval heap operations (MALLOC or
+#FREE). Samples are indexed by operation rather than by cycle, since engines running a static timing model
+#only bring the cycle count up to date when the run ends
+
+#columns of a sample in series
+SERIES_COLUMNS = ('operation', 'live_bytes', 'live_blocks', 'holes', 'hole_bytes', 'largest_hole', 'fragmentation')
+
+class HeapProfiler(memorymanager.MemoryManager) :
+
+    def __init__(self, startAddr, size, policy = 'first', interval = 0) :
+        super().__init__(startAddr, size, policy)
+        self.startAddr = startAddr
+        self.endAddr = startAddr + size
+        self.interval = interval
+        self.series = []
+
+        self.operations = 0
+        self.mallocs = 0
+        self.frees = 0
+        self.allocatedBytes = 0 #over the whole run
+        self.liveBytes = 0
+        self.peakBytes = 0
+        self.peakBlocks = 0
+        self.top = startAddr #end of the highest block ever handed out
+        self.sizeClasses = {} #bit length of the size -> allocations
+        self.sites = {} #pc of the MALLOC -> [allocations, bytes]
+        self.owners = {} #address of each live block -> pc of the MALLOC that allocated it
+
+    def malloc(self, size, site = None) :
+        addr = super().malloc(size, site)
+        self.mallocs += 1
+        self.allocatedBytes += size
+        self.liveBytes += size
+        if self.liveBytes > self.peakBytes :
+            self.peakBytes = self.liveBytes
+        if len(self.allocatedBlocks) > self.peakBlocks :
+            self.peakBlocks = len(self.allocatedBlocks)
+        if addr + size > self.top :
+            self.top = addr + size
+        k = size.bit_length()
+        self.sizeClasses[k] = self.sizeClasses.get(k, 0) + 1
+        counts = self.sites.get(site)
+        if counts is None :
+            counts = self.sites[site] = [0, 0]
+        counts[0] += 1
+        counts[1] += size
+        self.owners[addr] = site
+        self.__tick()
+        return addr
+
+    def free(self, addr) :
+        size = self.allocatedBlocks.get(addr, 0)
+        super().free(addr)
+        self.frees += 1
+        self.liveBytes -= size
+        del self.owners[addr]
+        self.__tick()
+
+    def __tick(self) :
+        self.operations += 1
+        if self.interval and self.operations % self.interval == 0 :
+            self.series.append(self.sample())
+
+    #(holes, hole bytes, largest hole) of the free list right now
+    def holes(self) :
+        count = 0
+        total = 0
+        largest = 0
+        for addr, size in self.freeList.blocks() :
+            if addr + size == self.endAddr :
+                continue
+            count += 1
+            total += size
+            if size > largest :
+                largest = size
+        return count, total, largest
+
+    def fragmentation(self, holeBytes) :
+        used = holeBytes + self.liveBytes
+        return holeBytes / used if used else 0.0
+
+    #one row of the time series, in the order of SERIES_COLUMNS
+    def sample(self) :
+        count, total, largest = self.holes()
+        return (self.operations, self.liveBytes, len(self.allocatedBlocks), count, total, largest, round(self.fragmentation(total), 4))
+
+    #write series as CSV, with a header row
+    def writeSeries(self, path) :
+        with open(path, 'w') as f :
+            f.write(','.join(SERIES_COLUMNS) + '\n')
+            for row in self.series :
+                f.write(','.join(str(value) for value in row) + '\n')
+
+    #blocks still allocated (at HALT, once a run is over), as (site, blocks, bytes) with the most bytes first
+    def leaks(self) :
+        bySite = {}
+        for addr, site in self.owners.items() :
+            counts = bySite.setdefault(site, [0, 0])
+            counts[0] += 1
+            counts[1] += self.allocatedBlocks[addr]
+        return sorted(((site, blocks, size) for site, (blocks, size) in bySite.items()), key = lambda leak : (-leak[2], leak[0] or 0))
+
+    def __where(self, site, symbols) :
+        return "unknown site" if site is None else hex(site) + location(site, symbols)
+
+    def getStats(self, symbols = {}, top = 10) :
+        count, total, largest = self.holes()
+        lines = ["Heap: {} mallocs, {} frees, {} bytes allocated; peak {} bytes live in {} blocks, {} bytes of heap used".format(
+                    self.mallocs, self.frees, self.allocatedBytes, self.peakBytes, self.peakBlocks, self.top - self.startAddr)]
+        lines.append("Heap at end: {} bytes live in {} blocks; {} holes, {} bytes, largest {}; {:.2f}% fragmentation".format(
+                    self.liveBytes, len(self.allocatedBlocks), count, total, largest, 100.0 * self.fragmentation(total)))
+
+        if self.sizeClasses :
+            lines.append("Allocation sizes:")
+            for k in sorted(self.sizeClasses) :
+                sizes = "0" if k == 0 else "{}-{}".format(1 << (k - 1), (1 << k) - 1)
+                lines.append("  {}: {}".format(sizes, self.sizeClasses[k]))
+
+        ranked = sorted(self.sites.items(), key = lambda item : (-item[1][1], item[0] or 0))
+        if ranked :
+            lines.append("Allocation sites:")
+            for site, (allocations, size) in ranked[:top] :
+                lines.append("  {}: {} allocations, {} bytes".format(self.__where(site, symbols), allocations, size))
+
+        leaks = self.leaks()
+        if leaks :
+            lines.append("Leaks: {} blocks, {} bytes never freed".format(sum(leak[1] for leak in leaks), sum(leak[2] for leak in leaks)))
+            for site, blocks, size in leaks[:top] :
+                lines.append("  {}: {} blocks, {} bytes".format(self.__where(site, symbols), blocks, size))
+        return lines
@@ -0,0 +1,104 @@
+#hot-spot profiling: how many times each instruction ran and how many cycles it was charged, reported per
+#label, per basic block and as an annotated listing of the program
+#
+#engines fill counts, a plain list indexed like their code lists by (pc - text base) >> 2, when
+#machine.profile is set. Under a static timing model an instruction always costs the same, so engines only
+#count and finish works the cycles out from the counts; under a dynamic model engines also add the cycles
+#each instruction was charged to cycles, unless timed is False because only the counts are wanted (as for
+#instmix.py), which lets them keep to their faster paths
+
+class Profile :
+    def __init__(self, prog, base, timed = True) :
+        self.prog = prog
+        self.base = base
+        self.timed = timed
+        self.counts = [0] * len(prog.code)
+        self.cycles = [0] * len(prog.code)
+
+    #add the instructions run by a block-at-a-time engine: entries[i] is the number of times the block
+    #starting at index i ran, and lengths[i] the number of instructions in it
+    def addBlocks(self, entries, lengths) :
+        counts = self.counts
+        for start, count in enumerate(entries) :
+            if count :
+                for i in range(start, start + lengths[start]) :
+                    counts[i] += count
+
+    #called once the run is over
+    def finish(self, timingModel) :
+        if not timingModel.dynamic :
+            code = self.prog.code
+            for i, count in enumerate(self.counts) :
+                self.cycles[i] = count * code[self.base + 4 * i].cost(timingModel)
+
+    #index of the first instruction of every basic block: the start of .text, every label, and every
+    #instruction after one that transfers control
+    def blockStarts(self) :
+        code = self.prog.code
+        starts = {0}
+        for addr in self.prog.labels.values() :
+            if addr in code :
+                starts.add((addr - self.base) >> 2)
+        for i in range(len(self.counts)) :
+            if code[self.base + 4 * i].endsBlock and i + 1 < len(self.counts) :
+                starts.add(i + 1)
+        return sorted(starts)
+
+    def __percent(self, part, whole) :
+        return 100.0 * part / whole if whole else 0.0
+
+    #lines of the report: totals, then labels and the hottest blocks by cycles (by executions when no
+    #cycles were charged), then the listing
+    def report(self, top = 10) :
+        counts = self.counts
+        cycles = self.cycles
+        code = self.prog.code
+        symbols = self.prog.symbols
+        executed = sum(counts)
+        total = sum(cycles)
+        #what hot means
+        weights = cycles if total else counts
+        whole = total if total else executed
+
+        lines = ["Profile: {} instructions executed, {} cycles".format(executed, total)]
+
+        #everything up to the next label counts towards a label
+        labels = []
+        current = None
+        for i in range(len(counts)) :
+            addr = self.base + 4 * i
+            if current is None or addr in symbols :
+                current = [symbols.get(addr, hex(addr)), 0, 0, 0]
+                labels.append(current)
+            current[1] += counts[i]
+            current[2] += cycles[i]
+            current[3] += weights[i]
+        lines.append("By label:")
+        lines.append("  {:>12s} {:>7s} {:>12s} {:>7s}  label".format("executed", "%", "cycles", "%"))
+        for name, count, spent, weight in sorted(labels, key = lambda label : -label[3]) :
+            if weight == 0 :
+                break
+            lines.append("  {:12d} {:6.2f}% {:12d} {:6.2f}%  {}".format(count, self.__percent(count, executed), spent, self.__percent(spent, total), name))
+
+        starts = self.blockStarts()
+        blocks = []
+        for start, end in zip(starts, starts[1:] + [len(counts)]) :
+            weight = sum(weights[start:end])
+            if weight :
+                blocks.append((weight, start, end))
+        blocks.sort(key = lambda block : (-block[0], block[1]))
+        lines.append("Hottest blocks:")
+        lines.append("  {:>12s} {:>12s} {:>7s}  block".format("runs", "cycles", "%"))
+        for weight, start, end in blocks[:top] :
+            addr = self.base + 4 * start
+            where = hex(addr) + ("" if addr not in symbols else " <" + symbols[addr] + ">")
+            lines.append("  {:12d} {:12d} {:6.2f}%  {} ({} instructions)".format(counts[start], sum(cycles[start:end]), self.__percent(weight, whole), where, end - start))
+
+        lines.append("Listing:")
+        lines.append("  {:>12s} {:>12s} {:>7s}".format("executed", "cycles", "%"))
+        for i in range(len(counts)) :
+            addr = self.base + 4 * i
+            if addr in symbols :
+                lines.append(symbols[addr] + ":")
+            lines.append("  {:12d} {:12d} {:6.2f}%  {:>8s}  {}".format(counts[i], cycles[i], self.__percent(weights[i], whole), hex(addr), code[addr]))
+        return lines
@@ -0,0 +1,87 @@
+import instructions
+import branchpredictor
+
+#dynamic instruction mix: how many instructions a run retired, by opcode and by class of instruction,
+#with the CPI of the run and how fast it was simulated
+#
+#the engines only count executions per instruction (through a hotspots.Profile, see Machine.run); the
+#counts are folded into a list indexed by opcode id (see instructions.opCodeIds) once the run is over, so
+#the run itself pays no more than a profile's counting. Classes are folded per instruction rather than per
+#opcode, since whether a JAL or JALR is a call depends on whether it links
+
+#classes of instructions, in report order
+CLASSES = ('alu', 'fp', 'load', 'store', 'branch', 'call', 'io', 'alloc', 'other')
+
+#control transfers go by their controlKind, as the branch unit sees them: calls and returns are 'call',
+#jumps and conditional branches are 'branch'
+def classify(inst) :
+    kind = inst.controlKind
+    if kind in (branchpredictor.CALL, branchpredictor.RETURN) :
+        return 'call'
+    if kind in (branchpredictor.JUMP, branchpredictor.BRANCH) :
+        return 'branch'
+    cls = type(inst)
+    if issubclass(cls, instructions.LDInstruction) :
+        return 'load'
+    if issubclass(cls, instructions.STInstruction) :
+        return 'store'
+    if issubclass(cls, instructions.IOInstruction) :
+        return 'io'
+    if issubclass(cls, (instructions.MallocInstruction, instructions.FreeInstruction)) :
+        return 'alloc'
+    if issubclass(cls, (instructions.NopInstruction, instructions.HaltInstruction)) :
+        return 'other'
+    if issubclass(cls, (instructions.FRInstruction, instructions.FORInstruction, instructions.FCmpInstruction, instructions.FUInstruction)) :
+        return 'fp'
+    return 'alu'
+
+class InstructionMix :
+    #counts: executions of each instruction of prog, indexed by (pc - base) >> 2, as a Profile keeps them
+    #cycles: cycles the run took; seconds: wall-clock time it took to simulate
+    def __init__(self, prog, base, counts, cycles, seconds) :
+        self.opcodes = [0] * len(instructions.opCodeNames)
+        self.byClass = dict.fromkeys(CLASSES, 0)
+        code = prog.code
+        for i, count in enumerate(counts) :
+            if count :
+                inst = code[base + 4 * i]
+                self.opcodes[instructions.opCodeIds[inst.opcode]] += count
+                self.byClass[classify(inst)] += count
+        self.retired = sum(self.opcodes)
+        self.cycles = cycles
+        self.seconds = seconds
+
+    @property
+    def cpi(self) :
+        return self.cycles / self.retired if self.retired else 0.0
+
+    #millions of instructions simulated per wall-clock second
+    @property
+    def mips(self) :
+        return self.retired / self.seconds / 1e6 if self.seconds else 0.0
+
+    #retired instructions by class
+    def classes(self) :
+        return dict(self.byClass)
+
+    def __percent(self, count) :
+        return 100.0 * count / self.retired if self.retired else 0.0
+
+    def report(self) :
+        lines = ["Retired: {} instructions in {} cycles, CPI {:.4f}; simulated in {:.3f}s, {:.3f} MIPS".format(
+                    self.retired, self.cycles, self.cpi, self.seconds, self.mips)]
+        lines.append("By class:")
+        for name, count in self.classes().items() :
+            if count :
+                lines.append("  {:8s} {:12d} {:6.2f}%".format(name, count, self.__percent(count)))
+        lines.append("By opcode:")
+        ranked = sorted(((count, opcode) for opcode, count in zip(instructions.opCodeNames, self.opcodes) if count), key = lambda item : (-item[0], item[1]))
+        for count, opcode in ranked :
+            lines.append("  {:8s} {:12d} {:6.2f}%".format(opcode, count, self.__percent(count)))
+        return lines
+
+    #the same, as a dict ready for json.dump
+    def toDict(self) :
+        return {'instructions' : self.retired, 'cycles' : self.cycles, 'cpi' : self.cpi, 'seconds' : self.seconds, 'mips' : self.mips,
+                'classes' : self.classes(),
+                'opcodes' : {opcode : count for opcode, count in zip(instructions.opCodeNames, self.opcodes) if count}}
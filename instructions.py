@@ -1,38 +1,171 @@
 from util import parseint
+from registers import decodeRegister, decodeDestination, X0_SINK
 import re
-import timingmodel
-import config
+import branchpredictor
 
 #base class for instructions
 class Instruction :
+    #set on instructions that transfer control; the translator ends a basic block after them
+    endsBlock = False
+
+    #for control transfers, which kind they are (see branchpredictor): timing models that predict
+    #branches are told about every one through timingModel.branchExec
+    controlKind = None
+
+    #Python expression equivalent to funcExec, with {0}, {1} standing for the operands; lets the
+    #translator inline the operation instead of calling funcExec
+    pyExpr = None
+
+    #set on instructions whose exec charges the timing model (through exec or cacheExec)
+    timed = False
+
+    #number of comma-separated operands after the opcode
+    operandCount = 0
+
     def __init__(self, opcode) :
         self.opcode = opcode #name of opcode
 
+    #build the instruction from its opcode and operand strings, as split by tokenize; the assembler
+    #has already checked there are operandCount of them
+    @classmethod
+    def fromOperands(cls, opcode, operands) :
+        raise NotImplementedError('fromOperands not implemented for ' + opcode)
+
+    #build the instruction from one line of assembly
+    @classmethod
+    def parse(cls, instr) :
+        opcode, operands = tokenize(instr)
+        return buildInstruction(opcode, operands, cls)
+
     #execute the instruction, including updating memory/registers as necessary
     #assumption: exec does not check dependences. This will be checked at other phases in the code
     #could simply schedule code for execution, rather than directly executing it
     #TODO: extend these to handle different timing models -- move the basic exec code into a "simpleExec" function instead
-    def exec(self) :
+    def exec(self, machine) :
         raise NotImplementedError('exec not implemented for ' + self.opcode)
 
+    #check everything about the instruction that does not depend on machine state: register classes
+    #of the operands, immediate widths and offset limits. Raises the same errors exec used to raise for
+    #these. Program.verify runs this once per instruction before execution, so exec does not repeat it
+    def verify(self) :
+        pass
+
+    #True if verify passes
+    def _verifies(self) :
+        try :
+            self.verify()
+        except (AssertionError, TypeError, ValueError) :
+            return False
+        return True
+
+    #cycles the instruction always costs under timingModel, for baking into compiled code
+    #only meaningful when the model is not dynamic
+    def cost(self, timingModel) :
+        if (self.timed) :
+            return timingModel.latency(self)
+        return 0
+
+    #compile the instruction into a closure that runs it on machine and returns the next pc
+    #pc is the address the instruction lives at. Derived classes bind their operands ahead of time;
+    #this generic version just calls verify and exec, and is also used whenever verify fails (only
+    #possible in checked mode), so the failure is reported at the same point in execution as with exec
+    #closures charge no time themselves when the timing model is static: the engine adds the baked-in
+    #cost from cost(). The generic closure goes through exec, which charges the model itself, and is
+    #marked as timed so the engine knows not to add the cost again
+    def compile(self, machine, pc) :
+        def run() :
+            machine.pc = pc
+            self.verify()
+            self.exec(machine)
+            return machine.pc
+        run.timed = True
+        return run
+
+    #wrap a compiled closure of a timed instruction so it charges the timing model first; only needed
+    #for dynamic models, since static costs are added by the engine
+    def _timed(self, machine, run) :
+        timingModel = machine.timingModel
+        if not timingModel.dynamic :
+            return run
+        timing = timingModel.exec
+        inst = self
+
+        def timedRun() :
+            timing(inst)
+            return run()
+        return timedRun
+
+    #wrap a compiled closure of a control transfer so it reports where it went to the timing model;
+    #like _timed, only needed for dynamic models
+    def _branched(self, machine, pc, run) :
+        timingModel = machine.timingModel
+        if not timingModel.dynamic :
+            return run
+        branch = timingModel.branchExec
+        inst = self
+
+        def branchedRun() :
+            nextPc = run()
+            branch(inst, pc, nextPc)
+            return nextPc
+        return branchedRun
+
+    #append Python source that runs the instruction to a translator.Block; control transfers end
+    #with a return of the next pc. This generic version calls the compiled closure, and is also used
+    #whenever a static check fails
+    def translate(self, block, pc) :
+        compiled = self.compile(block.machine, pc)
+        if not getattr(compiled, 'timed', False) :
+            block.chargeStatic(self)
+        run = block.bind(compiled)
+        if (self.endsBlock) :
+            block.emit('return ' + run + '()')
+        else :
+            block.emit(run + '()')
+
+    #source for the operation applied to the given operand expressions
+    def _translateOp(self, block, *operands) :
+        if (self.pyExpr is not None) :
+            return self.pyExpr.format(*operands)
+        return block.bind(self.funcExec) + '(' + ', '.join(operands) + ')'
+
+    #bind the instruction to the addresses of any labels it refers to; raises KeyError for an undefined label
+    def link(self, labels) :
+        pass
+
+    #registers read by the instruction, as (name, (type, index)) pairs
+    def sources(self) :
+        return []
+
+    #registers written by the instruction, as (name, (type, index)) pairs
+    def destinations(self) :
+        return []
+
     def __repr__(self) :
         return str(self)
 
 #base class for u-type instructions
 class UInstruction(Instruction) :
 
+    timed = True
+
+    #OP dst, imm
+    operandCount = 2
+
     @classmethod
-    def parse(cls, instr) :
-        # print(instr)
-        match = re.match(r'(\S+) (\S+), (\S+)', instr)
-        return cls(match[2], match[3], match[1])
+    def fromOperands(cls, opcode, operands) :
+        return cls(operands[0], operands[1], opcode)
 
     def __init__(self, dst, imm, opcode) :
         super().__init__(opcode)
         self.dst = dst
+        self._dst = decodeDestination(dst)
         self._imm = 0
         self.imm = imm
 
+    def destinations(self) :
+        return [(self.dst, self._dst)]
+
     @property
     def dsttype(self) :
         raise NotImplementedError("Define type in derived class")
@@ -45,16 +178,46 @@ class UInstruction(Instruction) :
     def imm(self, value) :
         raise NotImplementedError("Define immediate setter in derived class")
 
-    def exec(self) :
-        config.machine.timingModel.exec(self)
-        destReg = config.machine.registerFile[self.dst]
-        assert destReg.type == self.dsttype, "Destination register is not " + str(self.dsttype)
+    def verify(self) :
+        assert self._dst[0] == self.dsttype, "Destination register is not " + str(self.dsttype)
+
+    def exec(self, machine) :
+        machine.timingModel.exec(self)
+        dsttype, dst = self._dst
 
         d = self.funcExec(self.imm)
 
-        destReg.write(d)
+        machine.registers[dsttype][dst] = d
 
-        config.machine.pc += 4
+        machine.pc += 4
+
+    def compile(self, machine, pc) :
+        dsttype, dst = self._dst
+        if not self._verifies() :
+            return Instruction.compile(self, machine, pc)
+        try :
+            d = self.funcExec(self.imm)
+        except NotImplementedError :
+            return Instruction.compile(self, machine, pc)
+
+        dstfile = machine.registers[dsttype]
+        nextPc = pc + 4
+
+        def run() :
+            dstfile[dst] = d
+            return nextPc
+        return self._timed(machine, run)
+
+    def translate(self, block, pc) :
+        if not self._verifies() :
+            return Instruction.translate(self, block, pc)
+        try :
+            d = self.funcExec(self.imm)
+        except NotImplementedError :
+            return Instruction.translate(self, block, pc)
+
+        block.charge(self)
+        block.emit(block.reg(self._dst) + ' = ' + block.const(d))
 
     def funcExec(self, imm) :
         raise NotImplementedError("funcExec not implemented for u-type instruction " + self.opcode)
@@ -98,15 +261,28 @@ class MIUInstruction(UInstruction) :
 
 #base class for 2-operand r-type instructions
 class ORInstruction(Instruction) :
+
+    timed = True
+
+    #OP dst, src
+    operandCount = 2
+
     @classmethod
-    def parse(cls, instr) :
-        match = re.match(r'(\S+) (\S+), (\S+)', instr)
-        return cls(match[3], match[2], match[1])
+    def fromOperands(cls, opcode, operands) :
+        return cls(operands[1], operands[0], opcode)
 
     def __init__(self, src1, dst, opcode) :
         super().__init__(opcode)
         self.src1 = src1
         self.dst = dst
+        self._src1 = decodeRegister(src1)
+        self._dst = decodeDestination(dst)
+
+    def sources(self) :
+        return [(self.src1, self._src1)]
+
+    def destinations(self) :
+        return [(self.dst, self._dst)]
 
     @property 
     def srctype(self) :
@@ -116,20 +292,45 @@ class ORInstruction(Instruction) :
     def dsttype(self) :
         raise NotImplementedError("Define type in the derived class!")
 
-    def exec(self) :
-        config.machine.timingModel.exec(self)
-        src1reg = config.machine.registerFile[self.src1]
-        assert src1reg.type == self.srctype, "Src 1 register is not " + str(self.srctype)
-        s1 = src1reg.read()
+    def verify(self) :
+        assert self._src1[0] == self.srctype, "Src 1 register is not " + str(self.srctype)
+        assert self._dst[0] == self.dsttype, "Destination register is not " + str(self.dsttype)
+
+    def exec(self, machine) :
+        machine.timingModel.exec(self)
+        registers = machine.registers
+        src1type, src1 = self._src1
+        s1 = registers[src1type][src1]
 
         d = self.funcExec(s1)
 
-        destReg = config.machine.registerFile[self.dst]    
-        assert destReg.type == self.dsttype, "Destination register is not " + str(self.dsttype)
+        dsttype, dst = self._dst
+        registers[dsttype][dst] = d
+
+        machine.pc += 4
 
-        destReg.write(d)
+    def compile(self, machine, pc) :
+        src1type, src1 = self._src1
+        dsttype, dst = self._dst
+        if not self._verifies() :
+            return Instruction.compile(self, machine, pc)
 
-        config.machine.pc += 4
+        src1file = machine.registers[src1type]
+        dstfile = machine.registers[dsttype]
+        op = self.funcExec
+        nextPc = pc + 4
+
+        def run() :
+            dstfile[dst] = op(src1file[src1])
+            return nextPc
+        return self._timed(machine, run)
+
+    def translate(self, block, pc) :
+        if not self._verifies() :
+            return Instruction.translate(self, block, pc)
+
+        block.charge(self)
+        block.emit(block.reg(self._dst) + ' = ' + self._translateOp(block, block.reg(self._src1)))
 
     def funcExec(self, s1) :
         raise NotImplementedError("funcExec not implemented for 2-operand r-type instruction " + self.opcode)
@@ -160,16 +361,29 @@ class FORInstruction(ORInstruction) :
 #base class for 3-operand r-type instructions
 class RInstruction(Instruction) :
 
+    timed = True
+
+    #OP dst, src1, src2
+    operandCount = 3
+
     @classmethod
-    def parse(cls, instr) :
-        match = re.match(r'(\S+) (\S+), (\S+), (\S+)', instr)
-        return cls(match[3], match[4], match[2], match[1])
+    def fromOperands(cls, opcode, operands) :
+        return cls(operands[1], operands[2], operands[0], opcode)
 
     def __init__(self, src1, src2, dst, opcode) :
         super().__init__(opcode)
         self.src1 = src1
         self.src2 = src2
         self.dst = dst
+        self._src1 = decodeRegister(src1)
+        self._src2 = decodeRegister(src2)
+        self._dst = decodeDestination(dst)
+
+    def sources(self) :
+        return [(self.src1, self._src1), (self.src2, self._src2)]
+
+    def destinations(self) :
+        return [(self.dst, self._dst)]
 
     @property 
     def srctype(self) :
@@ -179,24 +393,51 @@ class RInstruction(Instruction) :
     def dsttype(self) :
         raise NotImplementedError("Define type in the derived class!")
 
-    def exec(self) :
-        config.machine.timingModel.exec(self)
-        src1reg = config.machine.registerFile[self.src1]
-        assert src1reg.type == self.srctype, "Src 1 register is not " + str(self.srctype)
-        s1 = src1reg.read()
+    def verify(self) :
+        assert self._src1[0] == self.srctype, "Src 1 register is not " + str(self.srctype)
+        assert self._src2[0] == self.srctype, "Src 2 register is not " + str(self.srctype)
+        assert self._dst[0] == self.dsttype, "Destination register is not " + str(self.dsttype)
+
+    def exec(self, machine) :
+        machine.timingModel.exec(self)
+        registers = machine.registers
+        src1type, src1 = self._src1
+        s1 = registers[src1type][src1]
 
-        src2reg = config.machine.registerFile[self.src2]
-        assert src2reg.type == self.srctype, "Src 2 register is not " + str(self.srctype)
-        s2 = src2reg.read()
+        src2type, src2 = self._src2
+        s2 = registers[src2type][src2]
 
         d = self.funcExec(s1, s2)
 
-        destReg = config.machine.registerFile[self.dst]    
-        assert destReg.type == self.dsttype, "Destination register is not " + str(self.dsttype)
+        dsttype, dst = self._dst
+        registers[dsttype][dst] = d
+
+        machine.pc += 4
+
+    def compile(self, machine, pc) :
+        src1type, src1 = self._src1
+        src2type, src2 = self._src2
+        dsttype, dst = self._dst
+        if not self._verifies() :
+            return Instruction.compile(self, machine, pc)
 
-        destReg.write(d)
+        src1file = machine.registers[src1type]
+        src2file = machine.registers[src2type]
+        dstfile = machine.registers[dsttype]
+        op = self.funcExec
+        nextPc = pc + 4
 
-        config.machine.pc += 4
+        def run() :
+            dstfile[dst] = op(src1file[src1], src2file[src2])
+            return nextPc
+        return self._timed(machine, run)
+
+    def translate(self, block, pc) :
+        if not self._verifies() :
+            return Instruction.translate(self, block, pc)
+
+        block.charge(self)
+        block.emit(block.reg(self._dst) + ' = ' + self._translateOp(block, block.reg(self._src1), block.reg(self._src2)))
 
     def funcExec(self, s1, s2) :
         raise NotImplementedError("funcExec not implemented for r-type instruction " + self.opcode)
@@ -238,34 +479,75 @@ class FCmpInstruction(RInstruction) :
 #base class for i-type instructions
 class IInstruction(Instruction) :
 
+    timed = True
+
+    #OP dst, src1, src2
+    operandCount = 3
+
     @classmethod
-    def parse(cls, instr) :
-        match = re.match(r'(\S+) (\S+), (\S+), (\S+)', instr)
-        return cls(match[3], match[4], match[2], match[1])
+    def fromOperands(cls, opcode, operands) :
+        return cls(operands[1], operands[2], operands[0], opcode)
         
     def __init__(self, src1, imm, dst, opcode) :
         super().__init__(opcode)
         self.src1 = src1
         self.imm = imm
         self.dst = dst
+        self._src1 = decodeRegister(src1)
+        self._dst = decodeDestination(dst)
+
+    def sources(self) :
+        return [(self.src1, self._src1)]
 
-    def exec(self) :
-        config.machine.timingModel.exec(inst = self)
-        src1reg = config.machine.registerFile[self.src1]
-        assert src1reg.type == int, "Src 1 register is not an integer"
-        s1 = src1reg.read()
+    def destinations(self) :
+        return [(self.dst, self._dst)]
+
+    def verify(self) :
+        assert self._src1[0] == int, "Src 1 register is not an integer"
+        assert self._dst[0] == int, "Destination register is not an integer"
 
         #cast imm to the type of the destination register
-        destReg = config.machine.registerFile[self.dst]    
-        assert destReg.type == int, "Destination register is not an integer"
-    
-        imm = destReg.type(self.imm)
+        imm = int(self.imm)
         assert (imm < (2 ** 11 - 1) and imm > (-1 * 2 ** 11)), "Immediate value is too large; must fit in 12 bits"
 
+    def exec(self, machine) :
+        machine.timingModel.exec(inst = self)
+        registers = machine.registers
+        src1type, src1 = self._src1
+        s1 = registers[src1type][src1]
+
+        dsttype, dst = self._dst
+        imm = int(self.imm)
+
         d = self.funcExec(s1, imm)
-        destReg.write(d)
+        registers[dsttype][dst] = d
+
+        machine.pc += 4
+
+    def compile(self, machine, pc) :
+        if not self._verifies() :
+            return Instruction.compile(self, machine, pc)
+        src1type, src1 = self._src1
+        dsttype, dst = self._dst
+        imm = int(self.imm)
+
+        src1file = machine.registers[src1type]
+        dstfile = machine.registers[dsttype]
+        op = self.funcExec
+        nextPc = pc + 4
 
-        config.machine.pc += 4
+        def run() :
+            dstfile[dst] = op(src1file[src1], imm)
+            return nextPc
+        return self._timed(machine, run)
+
+    def translate(self, block, pc) :
+        if not self._verifies() :
+            return Instruction.translate(self, block, pc)
+        imm = int(self.imm)
+
+        block.charge(self)
+        block.emit(block.reg(self._dst) + ' = ' + self._translateOp(block, block.reg(self._src1), repr(imm)))
 
     def funcExec(self, s1, imm) :
         raise NotImplementedError("funcExec not implemented for i-type instruction " + self.opcode)
@@ -277,25 +559,41 @@ class IInstruction(Instruction) :
 #base class for memory instruction
 class MemInstruction(Instruction) :
 
+    timed = True
+
     #LOAD: LW reg1, imm(reg2) : reg1 = *(reg2 + imm)
     #STORE: SW reg1, imm(reg2) : *(reg2 + imm) = reg1
 
+    #OP reg1, imm(reg2)
+    operandCount = 2
+
     @classmethod
-    def parse(cls, instr) :
-        match = re.match(r'(\S+) (\S+), (\S+)\((\S+)\)', instr)
-        return cls(match[2], match[4], match[3], match[1])
+    def fromOperands(cls, opcode, operands) :
+        match = _memOperand.match(operands[1])
+        if match is None :
+            raise ValueError("expected offset(register), not '" + operands[1] + "'")
+        return cls(operands[0], match[2], match[1], opcode)
         
     def __init__(self, reg1, reg2, imm, opcode) :
         super().__init__(opcode)
         self.reg1 = reg1
         self.reg2 = reg2
         self.imm = imm
+        self._reg1 = decodeRegister(reg1)
+        self._reg2 = decodeRegister(reg2)
 
-    def _calculateAddress(self) :
+    def sources(self) :
+        return [(self.reg1, self._reg1), (self.reg2, self._reg2)]
+
+    def verify(self) :
         offset = int(self.imm)
         assert (offset < 2 ** 12), "Offset too large"
 
-        base = config.machine.registerFile[self.reg2].read()
+    def _calculateAddress(self, machine) :
+        offset = int(self.imm)
+
+        basetype, base = self._reg2
+        base = machine.registers[basetype][base]
 
         return base + offset
 
@@ -305,25 +603,82 @@ class MemInstruction(Instruction) :
 #base class for int/fp loads
 class LDInstruction(MemInstruction) :
 
-    def exec(self) :
+    def __init__(self, reg1, reg2, imm, opcode) :
+        super().__init__(reg1, reg2, imm, opcode)
+        self._reg1 = decodeDestination(reg1)
+
+    def sources(self) :
+        return [(self.reg2, self._reg2)]
+
+    def destinations(self) :
+        return [(self.reg1, self._reg1)]
+
+    def verify(self) :
+        super().verify()
+        assert (self._reg1[0] == self.dsttype), "Destination register not of type " + str(self.dsttype)
+
+    def exec(self, machine) :
         #calculate address
-        addr = self._calculateAddress()
+        addr = self._calculateAddress(machine)
 
         #perform load
-        val = self.funcExec(addr, config.machine.memory)
+        val = self.funcExec(addr, machine.memory)
 
         #store result into register
         assert(type(val) == self.dsttype), "Value in memory not of type " + str(self.dsttype)
 
-        destReg = config.machine.registerFile[self.reg1]
+        dsttype, dst = self._reg1
+        machine.registers[dsttype][dst] = val
 
-        assert (destReg.type == self.dsttype), "Destination register not of type " + str(self.dsttype)
+        machine.timingModel.cacheExec(self, addr)
 
-        destReg.write(val)
+        machine.pc += 4
 
-        config.machine.timingModel.cacheExec(self, addr)
+    def compile(self, machine, pc) :
+        if not self._verifies() :
+            return Instruction.compile(self, machine, pc)
+        offset = int(self.imm)
+        dsttype, dst = self._reg1
+
+        basetype, base = self._reg2
+        basefile = machine.registers[basetype]
+        dstfile = machine.registers[dsttype]
+        memory = machine.memory
+        cache = machine.timingModel.cacheExec
+        op = self.funcExec
+        inst = self
+        nextPc = pc + 4
+
+        if not machine.timingModel.dynamic :
+            def run() :
+                addr = basefile[base] + offset
+                val = op(addr, memory)
+                assert(type(val) == dsttype), "Value in memory not of type " + str(dsttype)
+                dstfile[dst] = val
+                return nextPc
+            return run
+
+        def run() :
+            addr = basefile[base] + offset
+            val = op(addr, memory)
+            assert(type(val) == dsttype), "Value in memory not of type " + str(dsttype)
+            dstfile[dst] = val
+            cache(inst, addr)
+            return nextPc
+        return run
+
+    def translate(self, block, pc) :
+        if not self._verifies() :
+            return Instruction.translate(self, block, pc)
+        offset = int(self.imm)
 
-        config.machine.pc += 4
+        addr = block.temp()
+        val = block.temp()
+        block.emit(addr + ' = ' + block.reg(self._reg2) + ' + ' + repr(offset))
+        block.emit(val + ' = M[' + addr + ']')
+        block.emit('assert (type(' + val + ') == ' + block.bind(self.dsttype) + '), ' + repr("Value in memory not of type " + str(self.dsttype)))
+        block.emit(block.reg(self._reg1) + ' = ' + val)
+        block.chargeCache(self, addr)
 
     def funcExec(self, addr, memory) :
         return memory[addr]
@@ -335,23 +690,62 @@ class LDInstruction(MemInstruction) :
 #base class for int/fp stores
 class STInstruction(MemInstruction) :
 
-    def exec(self) :
+    def verify(self) :
+        super().verify()
+        assert (self._reg1[0] == self.srctype), "Source register not of type " + str(self.srctype)
+
+    def exec(self, machine) :
         #calculate address
-        addr = self._calculateAddress()
+        addr = self._calculateAddress(machine)
 
         #get value from register
-        srcReg = config.machine.registerFile[self.reg1]
+        srctype, src = self._reg1
+        val = machine.registers[srctype][src]
 
-        assert (srcReg.type == self.srctype), "Source register not of type " + str(self.srctype)
+        #perform store
+        self.funcExec(addr, val, machine.memory)
 
-        val = srcReg.read()
+        machine.timingModel.cacheExec(self, addr)
 
-        #perform store
-        self.funcExec(addr, val, config.machine.memory)
+        machine.pc += 4
 
-        config.machine.timingModel.cacheExec(self, addr)
+    def compile(self, machine, pc) :
+        if not self._verifies() :
+            return Instruction.compile(self, machine, pc)
+        offset = int(self.imm)
+        srctype, src = self._reg1
+
+        basetype, base = self._reg2
+        basefile = machine.registers[basetype]
+        srcfile = machine.registers[srctype]
+        memory = machine.memory
+        cache = machine.timingModel.cacheExec
+        op = self.funcExec
+        inst = self
+        nextPc = pc + 4
+
+        if not machine.timingModel.dynamic :
+            def run() :
+                op(basefile[base] + offset, srcfile[src], memory)
+                return nextPc
+            return run
+
+        def run() :
+            addr = basefile[base] + offset
+            op(addr, srcfile[src], memory)
+            cache(inst, addr)
+            return nextPc
+        return run
+
+    def translate(self, block, pc) :
+        if not self._verifies() :
+            return Instruction.translate(self, block, pc)
+        offset = int(self.imm)
 
-        config.machine.pc += 4
+        addr = block.temp()
+        block.emit(addr + ' = ' + block.reg(self._reg2) + ' + ' + repr(offset))
+        block.emit('M[' + addr + '] = ' + block.reg(self._reg1))
+        block.chargeCache(self, addr)
 
     def funcExec(self, addr, val, memory) :
         # print("updating memory location: " + hex(addr))
@@ -364,14 +758,20 @@ class STInstruction(MemInstruction) :
 #base class for IO magic instructions
 class IOInstruction(Instruction) :
 
+    #OP reg
+    operandCount = 1
+
     @classmethod
-    def parse(cls, instr) :
-        match = re.match(r'(\S+) (\S+)', instr)
-        return cls(match[2], match[1])
+    def fromOperands(cls, opcode, operands) :
+        return cls(operands[0], opcode)
 
     def __init__(self, reg, opcode) :
         super().__init__(opcode)
         self.reg = reg
+        self._reg = decodeRegister(reg)
+
+    def sources(self) :
+        return [(self.reg, self._reg)]
 
     def __str__(self) :
         return str(self.opcode + " " + self.reg)
@@ -379,18 +779,44 @@ class IOInstruction(Instruction) :
 #base class for reading stdin
 class InputInstruction(IOInstruction) :
 
-    def exec(self) :
-        dstreg = config.machine.registerFile[self.reg]
-        assert dstreg.type == self.dsttype, "Reading into register of type " + str(dstreg.type) + " when expecting " + str(self.dsttype)
+    def __init__(self, reg, opcode) :
+        super().__init__(reg, opcode)
+        self._reg = decodeDestination(reg)
+
+    def sources(self) :
+        return []
+
+    def destinations(self) :
+        return [(self.reg, self._reg)]
+
+    def verify(self) :
+        assert self._reg[0] == self.dsttype, "Reading into register of type " + str(self._reg[0]) + " when expecting " + str(self.dsttype)
+
+    def exec(self, machine) :
+        dsttype, dst = self._reg
+
+        val = self.funcExec(machine)
+
+        machine.registers[dsttype][dst] = val
 
-        val = self.funcExec()
+        machine.pc += 4
 
-        dstreg.write(val)
+    def compile(self, machine, pc) :
+        if not self._verifies() :
+            return Instruction.compile(self, machine, pc)
+        dsttype, dst = self._reg
 
-        config.machine.pc += 4
+        dstfile = machine.registers[dsttype]
+        op = self.funcExec
+        nextPc = pc + 4
 
-    def funcExec(self) :
-        return self.dsttype(input())
+        def run() :
+            dstfile[dst] = op(machine)
+            return nextPc
+        return run
+
+    def funcExec(self, machine) :
+        return self.dsttype(machine.input.readLine())
 
     @property
     def dsttype(self) :
@@ -399,18 +825,34 @@ class InputInstruction(IOInstruction) :
 #base class for writing to stdout
 class OutputInstruction(IOInstruction) :
 
-    def exec(self) :
-        srcreg = config.machine.registerFile[self.reg]
-        assert srcreg.type == self.srctype, "Writing register of type " + str(srcreg.type) + " when expecting " + str(self.srctype)
+    def verify(self) :
+        assert self._reg[0] == self.srctype, "Writing register of type " + str(self._reg[0]) + " when expecting " + str(self.srctype)
+
+    def exec(self, machine) :
+        srctype, src = self._reg
+
+        val = machine.registers[srctype][src]
+
+        self.funcExec(val, machine)
 
-        val = srcreg.read()
+        machine.pc += 4
 
-        self.funcExec(val)
+    def compile(self, machine, pc) :
+        if not self._verifies() :
+            return Instruction.compile(self, machine, pc)
+        srctype, src = self._reg
 
-        config.machine.pc += 4
+        srcfile = machine.registers[srctype]
+        op = self.funcExec
+        nextPc = pc + 4
 
-    def funcExec(self, val) :
-        print (val)
+        def run() :
+            op(srcfile[src], machine)
+            return nextPc
+        return run
+
+    def funcExec(self, val, machine) :
+        machine.output.write(str(val) + '\n')
 
     @property
     def srctype(self) :
@@ -418,17 +860,18 @@ class OutputInstruction(IOInstruction) :
 
 class ImmControlInstruction(Instruction) :
 
+    #OP label
+    operandCount = 1
+
     @classmethod
-    def parse(cls, instr) :
-        #OP label
-        match = re.match(r'(\S+) (\S+)', instr)
-        return cls(match[1], match[2])
+    def fromOperands(cls, opcode, operands) :
+        return cls(opcode, operands[0])
 
     def __init__(self, opcode, label) :
         self.opcode = opcode
         self.label = label
 
-    def exec(self) :
+    def exec(self, machine) :
         raise NotImplementedError("Implement exec in base class")
 
     def __str__(self) :
@@ -437,31 +880,77 @@ class ImmControlInstruction(Instruction) :
 #base class for branch instructinos
 class BranchInstruction(Instruction) :
 
+    endsBlock = True
+
+    controlKind = branchpredictor.BRANCH
+
+    #OP src1, src2, label
+    operandCount = 3
+
     @classmethod
-    def parse(cls, instr) :
-        #OP src1, src2, label
-        match = re.match(r'(\S+) (\S+), (\S+), (\S+)', instr)
-        return cls(match[1], match[2], match[3], match[4])
+    def fromOperands(cls, opcode, operands) :
+        return cls(opcode, operands[0], operands[1], operands[2])
 
     def __init__(self, opcode, src1, src2, label) :
         self.opcode = opcode
         self.src1 = src1
         self.src2 = src2
         self.label = label
+        self.target = None
+        self._src1 = decodeRegister(src1)
+        self._src2 = decodeRegister(src2)
 
-    def exec(self) :
-        srcreg1 = config.machine.registerFile[self.src1]
-        assert srcreg1.type == int, "Can only compare integer registers"
+    def link(self, labels) :
+        self.target = labels[self.label]
 
-        srcreg2 = config.machine.registerFile[self.src2]
-        assert srcreg2.type == int, "Can only compare integer registers"
+    def sources(self) :
+        return [(self.src1, self._src1), (self.src2, self._src2)]
 
-        taken = self.funcExec(srcreg1.read(), srcreg2.read())
+    def verify(self) :
+        assert self._src1[0] == int, "Can only compare integer registers"
+        assert self._src2[0] == int, "Can only compare integer registers"
 
+    def exec(self, machine) :
+        registers = machine.registers
+        src1type, src1 = self._src1
+        src2type, src2 = self._src2
+
+        taken = self.funcExec(registers[src1type][src1], registers[src2type][src2])
+
+        pc = machine.pc
         if (taken == True) :
-            config.machine.pc = config.machine.prog.labels[self.label]
+            machine.pc = self.target
         else :
-            config.machine.pc += 4
+            machine.pc += 4
+        machine.timingModel.branchExec(self, pc, machine.pc)
+
+    def compile(self, machine, pc) :
+        src1type, src1 = self._src1
+        src2type, src2 = self._src2
+        if not self._verifies() :
+            return Instruction.compile(self, machine, pc)
+
+        src1file = machine.registers[src1type]
+        src2file = machine.registers[src2type]
+        op = self.funcExec
+        target = self.target
+        nextPc = pc + 4
+
+        def run() :
+            if (op(src1file[src1], src2file[src2]) == True) :
+                return target
+            return nextPc
+        return self._branched(machine, pc, run)
+
+    def translate(self, block, pc) :
+        if not self._verifies() :
+            return Instruction.translate(self, block, pc)
+
+        block.emit('if (' + self._translateOp(block, block.reg(self._src1), block.reg(self._src2)) + ') :')
+        block.chargeBranch(self, pc, str(self.target), '    ')
+        block.emit('    return ' + str(self.target))
+        block.chargeBranch(self, pc, str(pc + 4))
+        block.emit('return ' + str(pc + 4))
 
     def funcExec(self, val1, val2) :
         raise NotImplementedError("Implement funcExec in derived class")
@@ -473,6 +962,9 @@ class BranchInstruction(Instruction) :
 
 #map opcodes (in text) to class associated with instruction
 opCodeMap = {}
+#opcodes numbered in the order they are defined, so counters can be lists indexed by opcode (see instmix.py)
+opCodeIds = {}
+opCodeNames = []
 
 #decorator for concrete instructions to set up opcode map
 
@@ -483,28 +975,76 @@ class concreteInstruction :
 
     def __call__(self, cls) :
         opCodeMap[self.opcode] = cls
+        opCodeIds[self.opcode] = len(opCodeNames)
+        opCodeNames.append(self.opcode)
         return cls
 
 @concreteInstruction('JAL')
 class JalInstruction(Instruction) :
 
+    timed = True
+
+    endsBlock = True
+
+    #JAL reg, label
+    operandCount = 2
+
     @classmethod
-    def parse(cls, instr) :
-        #JAL reg, label
-        match = re.match(r'(\S+) (\S+), (\S+)', instr)
-        return cls(match[1], match[2], match[3])
+    def fromOperands(cls, opcode, operands) :
+        return cls(opcode, operands[0], operands[1])
 
     def __init__(self, opcode, reg, label) :
         self.opcode = opcode
         self.label = label
         self.reg = reg
+        self.target = None
+        self._reg = decodeDestination(reg)
+
+    def link(self, labels) :
+        self.target = labels[self.label]
+
+    @property
+    def controlKind(self) :
+        return branchpredictor.CALL if self._reg == (int, 1) else branchpredictor.JUMP
 
-    def exec(self) :
-        config.machine.timingModel.exec(inst = self)
-        dstreg = config.machine.registerFile[self.reg]
+    def destinations(self) :
+        return [(self.reg, self._reg)]
 
-        dstreg.write(config.machine.pc + 4)
-        config.machine.pc = config.machine.prog.labels[self.label]
+    def verify(self) :
+        if (self._reg[0] != int) :
+            raise(TypeError('Writing data of type ' + str(int) + ' to register ' + self.reg + ' which holds type ' + str(self._reg[0])))
+
+    def exec(self, machine) :
+        machine.timingModel.exec(inst = self)
+        dsttype, dst = self._reg
+
+        pc = machine.pc
+        machine.registers[dsttype][dst] = pc + 4
+        machine.pc = self.target
+        machine.timingModel.branchExec(self, pc, self.target)
+
+    def compile(self, machine, pc) :
+        dsttype, dst = self._reg
+        if not self._verifies() :
+            return Instruction.compile(self, machine, pc)
+
+        dstfile = machine.registers[dsttype]
+        target = self.target
+        link = pc + 4
+
+        def run() :
+            dstfile[dst] = link
+            return target
+        return self._timed(machine, self._branched(machine, pc, run))
+
+    def translate(self, block, pc) :
+        if not self._verifies() :
+            return Instruction.translate(self, block, pc)
+
+        block.charge(self)
+        block.emit(block.reg(self._reg) + ' = ' + str(pc + 4))
+        block.chargeBranch(self, pc, str(self.target))
+        block.emit('return ' + str(self.target))
 
     def __str__(self) :
         return str(self.opcode + " " + self.reg + ", " + self.label)
@@ -512,37 +1052,104 @@ class JalInstruction(Instruction) :
 @concreteInstruction('JALR')
 class JalrInstruction(IInstruction) :
 
-    def exec(self) :
-        config.machine.timingModel.exec(inst = self)
-        src1reg = config.machine.registerFile[self.src1]
-        assert src1reg.type == int, "Src 1 register is not an integer"
-        s1 = src1reg.read()
+    endsBlock = True
 
-        #cast imm to the type of the destination register
-        destReg = config.machine.registerFile[self.dst]    
-        assert destReg.type == int, "Destination register is not an integer"
-    
-        imm = destReg.type(self.imm)
-        assert (imm < (2 ** 11 - 1) and imm > (-1 * 2 ** 11)), "Immediate value is too large; must fit in 12 bits"
-
-        destReg.write(config.machine.pc + 4)
-
-        config.machine.pc = s1 + imm
+    @property
+    def controlKind(self) :
+        if self._dst == (int, 1) :
+            return branchpredictor.CALL
+        if self._src1 == (int, 1) and self._dst[1] == X0_SINK :
+            return branchpredictor.RETURN
+        return branchpredictor.JUMP
+
+    def exec(self, machine) :
+        machine.timingModel.exec(inst = self)
+        registers = machine.registers
+        src1type, src1 = self._src1
+        s1 = registers[src1type][src1]
+
+        dsttype, dst = self._dst
+        imm = int(self.imm)
+
+        pc = machine.pc
+        registers[dsttype][dst] = pc + 4
+
+        machine.pc = s1 + imm
+        machine.timingModel.branchExec(self, pc, s1 + imm)
+
+    def compile(self, machine, pc) :
+        if not self._verifies() :
+            return Instruction.compile(self, machine, pc)
+        src1type, src1 = self._src1
+        dsttype, dst = self._dst
+        imm = int(self.imm)
+
+        src1file = machine.registers[src1type]
+        dstfile = machine.registers[dsttype]
+        code = machine.prog.code
+        link = pc + 4
+
+        def run() :
+            s1 = src1file[src1]
+            dstfile[dst] = link
+            target = s1 + imm
+            #computed targets can land anywhere, so fail the same way a pc lookup would
+            if target not in code :
+                raise KeyError(target)
+            return target
+        return self._timed(machine, self._branched(machine, pc, run))
+
+    def translate(self, block, pc) :
+        if not self._verifies() :
+            return Instruction.translate(self, block, pc)
+        imm = int(self.imm)
+
+        target = block.temp()
+        block.charge(self)
+        block.emit(target + ' = ' + block.reg(self._src1) + ' + ' + repr(imm))
+        block.emit(block.reg(self._dst) + ' = ' + str(pc + 4))
+        block.emit('if ' + target + ' not in ' + block.bind(block.machine.prog.code) + ' :')
+        block.emit('    raise KeyError(' + target + ')')
+        block.chargeBranch(self, pc, target)
+        block.emit('return ' + target)
 
 @concreteInstruction('RET')
 class RetInstruction(Instruction) :
 
+    endsBlock = True
+
     @classmethod
-    def parse(cls, instr) :
-        match = re.match(r'(\S+)', instr)
-        return cls(match[1])
+    def fromOperands(cls, opcode, operands) :
+        return cls(opcode)
 
     def __init__(self, opcode) :
         self.opcode = opcode
         self._jalr = JalrInstruction('x1', 0, 'x0', 'JALR')
 
-    def exec(self) :
-        return self._jalr.exec()
+    @property
+    def controlKind(self) :
+        return self._jalr.controlKind
+
+    def sources(self) :
+        return self._jalr.sources()
+
+    def destinations(self) :
+        return self._jalr.destinations()
+
+    def exec(self, machine) :
+        return self._jalr.exec(machine)
+
+    def verify(self) :
+        self._jalr.verify()
+
+    def cost(self, timingModel) :
+        return self._jalr.cost(timingModel)
+
+    def compile(self, machine, pc) :
+        return self._jalr.compile(machine, pc)
+
+    def translate(self, block, pc) :
+        return self._jalr.translate(block, pc)
 
     def __str__(self) :
         return self.opcode
@@ -550,111 +1157,192 @@ class RetInstruction(Instruction) :
 @concreteInstruction('JR')
 class JrInstruction(ImmControlInstruction) :
 
+    endsBlock = True
+
     def __init__(self, opcode, label) :
         super().__init__(opcode, label)
         self._jal = JalInstruction('JAL', 'x1', self.label)
 
-    def exec(self) :
-        self._jal.exec()
+    @property
+    def controlKind(self) :
+        return self._jal.controlKind
+
+    def destinations(self) :
+        return self._jal.destinations()
+
+    def exec(self, machine) :
+        self._jal.exec(machine)
+
+    def verify(self) :
+        self._jal.verify()
+
+    def cost(self, timingModel) :
+        return self._jal.cost(timingModel)
+
+    def compile(self, machine, pc) :
+        return self._jal.compile(machine, pc)
+
+    def translate(self, block, pc) :
+        return self._jal.translate(block, pc)
+
+    def link(self, labels) :
+        self._jal.link(labels)
 
 @concreteInstruction('J')
 class JInstruction(ImmControlInstruction) :
-    
+
+    endsBlock = True
+
     def __init__(self, opcode, label) :
         super().__init__(opcode, label)
         # print(JalInstruction)
         self._jal = JalInstruction('JAL', 'x0', self.label)
 
-    def exec(self) :
-        self._jal.exec()
+    @property
+    def controlKind(self) :
+        return self._jal.controlKind
+
+    def exec(self, machine) :
+        self._jal.exec(machine)
+
+    def verify(self) :
+        self._jal.verify()
+
+    def cost(self, timingModel) :
+        return self._jal.cost(timingModel)
+
+    def compile(self, machine, pc) :
+        return self._jal.compile(machine, pc)
+
+    def translate(self, block, pc) :
+        return self._jal.translate(block, pc)
+
+    def link(self, labels) :
+        self._jal.link(labels)
 
 @concreteInstruction('ADD')
 class AddInstruction(IRInstruction) :
+    pyExpr = '{0} + {1}'
+
     def funcExec(self, s1, s2) :
         return s1 + s2
 
 @concreteInstruction('SUB')
 class SubInstruction(IRInstruction) :
+    pyExpr = '{0} - {1}'
+
     def funcExec(self, s1, s2) :
         return s1 - s2
 
 @concreteInstruction('MUL')
 class MulInstruction(IRInstruction) :
+    pyExpr = '{0} * {1}'
+
     def funcExec(self, s1, s2) :
         return s1 * s2
 
 @concreteInstruction('DIV')
 class DivInstruction(IRInstruction) :
+    pyExpr = '{0} // {1}'
+
     def funcExec(self, s1, s2) :
         return s1 // s2      
 
 @concreteInstruction('REM')
 class RemInstruction(IRInstruction) :
+    pyExpr = '{0} % {1}'
+
     def funcExec(self, s1, s2) :
         return s1 % s2
 
 @concreteInstruction('SLT')
 class SltInstruction(IRInstruction) :
+    pyExpr = '1 if {0} < {1} else 0'
+
     def funcExec(self, s1, s2) :
         return 1 if s1 < s2 else 0
 
 @concreteInstruction('AND')
 class AndInstruction(IRInstruction) :
+    pyExpr = '{0} & {1}'
+
     def funcExec(self, s1, s2) :
         return s1 & s2
 
 @concreteInstruction('OR')
 class OIRInstruction(IRInstruction) :
+    pyExpr = '{0} | {1}'
+
     def funcExec(self, s1, s2) :
         return s1 | s2
 
 @concreteInstruction('XOR')
 class XoIRInstruction(IRInstruction) :
+    pyExpr = '{0} ^ {1}'
+
     def funcExec(self, s1, s2) :
         return s1 ^ s2
 
 @concreteInstruction('SLL')
 class SllInstruction(IRInstruction) :
+    pyExpr = '{0} << ({1} % 32)'
+
     def funcExec(self, s1, s2) :
         return s1 << (s2 % 32)
 
 @concreteInstruction('SRL')
 class SrlInstruction(IRInstruction) :
+    pyExpr = '{0} >> ({1} % 32)'
+
     def funcExec(self, s1, s2) :
         return s1 >> (s2 % 32)        
 
 @concreteInstruction('ADDI')
 class AddiInstruction(IInstruction) :
+    pyExpr = '{0} + {1}'
+
     def funcExec(self, s1, imm) :
         return s1 + imm
 
 @concreteInstruction('ANDI')
 class AndiInstruction(IInstruction) :
+    pyExpr = '{0} & {1}'
+
     def funcExec(self, s1, imm) :
         return s1 & imm
 
 @concreteInstruction('ORI')
 class OriInstruction(IInstruction) :
+    pyExpr = '{0} | {1}'
+
     def funcExec(self, s1, imm) :
         return s1 | imm
 
 @concreteInstruction('XORI')
 class XoriInstruction(IInstruction) :
+    pyExpr = '{0} ^ {1}'
+
     def funcExec(self, s1, imm) :
         return s1 ^ imm
 
 @concreteInstruction('SLTI')
 class SltiInstruction(IInstruction) :
+    pyExpr = '1 if {0} < {1} else 0'
+
     def funcExec(self, s1, imm) :
         return 1 if s1 < imm else 0
 
 @concreteInstruction('SLLI')
 class SlliInstruction(IInstruction) :
+    pyExpr = '{0} << ({1} % 5)'
+
     def funcExec(self, s1, imm) :
         return s1 << (imm % 5)
 
 @concreteInstruction('SRLI')
 class SrliInstruction(IInstruction) :
+    pyExpr = '{0} >> ({1} % 5)'
+
     def funcExec(self, s1, imm) :
         return s1 >> (imm % 5)
 
@@ -665,81 +1353,115 @@ class LuiInstruction(IUInstruction) :
 
 @concreteInstruction('MV')
 class MvInstruction(IORInstruction) :
+    pyExpr = '{0}'
+
     def funcExec(self, s1) :
         return s1
 
 @concreteInstruction('NOT')
 class NotInstruction(IORInstruction) :
+    pyExpr = '~{0}'
+
     def funcExec(self, s1) :
         return ~s1
 
 @concreteInstruction('NEG')
 class NegInstruction(IORInstruction) :
+    pyExpr = '-1 * {0}'
+
     def funcExec(self, s1) :
         return -1 * s1
 
 @concreteInstruction('FADD.S')
 class FaddInstruction(FRInstruction) :
+    pyExpr = '{0} + {1}'
+
     def funcExec(self, s1, s2) :
         return s1 + s2
 
 @concreteInstruction('FSUB.S')
 class FsubInstruction(FRInstruction) :
+    pyExpr = '{0} - {1}'
+
     def funcExec(self, s1, s2) :
         return s1 - s2
 
 @concreteInstruction('FMUL.S')
 class FmulInstruction(FRInstruction) :
+    pyExpr = '{0} * {1}'
+
     def funcExec(self, s1, s2) :
         return s1 * s2
 
 @concreteInstruction('FDIV.S')
 class FdivInstruction(FRInstruction) :
+    pyExpr = '{0} / {1}'
+
     def funcExec(self, s1, s2) :
         return s1 / s2
 
 @concreteInstruction('FMIN.S')
 class FminInstruction(FRInstruction) :
+    pyExpr = '{0} if {0} < {1} else {1}'
+
     def funcExec(self, s1, s2) :
         return s1 if s1 < s2 else s2
 
 @concreteInstruction('FMAX.S')
 class FmaxInstruction(FRInstruction) :
+    pyExpr = '{0} if {0} > {1} else {1}'
+
     def funcExec(self, s1, s2) :
         return s1 if s1 > s2 else s2        
 
 @concreteInstruction('FSQRT.S')
 class FsqrtInstruction(FORInstruction) :
     def funcExec(self, s1) :
-        return s1 ** 0.5
+        d = s1 ** 0.5
+        #square root of a negative number is complex, which no register can hold
+        if (type(d) != float) :
+            raise(TypeError('Writing data of type ' + str(type(d)) + ' to register ' + self.dst + ' which holds type ' + str(float)))
+        return d
 
 @concreteInstruction('FMV.S')
 class FmvInstruction(FORInstruction) :
+    pyExpr = '{0}'
+
     def funcExec(self, s1) :
         return s1
 
 @concreteInstruction('FABS.S')
 class FabsInstruction(FORInstruction) :
+    pyExpr = 'abs({0})'
+
     def funcExec(self, s1) :
         return abs(s1)
 
 @concreteInstruction('FNEG.S')
 class FnegInstruction(FORInstruction) :
+    pyExpr = '-1 * {0}'
+
     def funcExec(self, s1) :
         return -1 * s1
 
 @concreteInstruction('FLT.S')
 class FltInstruction(FCmpInstruction) :
+    pyExpr = '1 if {0} < {1} else 0'
+
     def funcExec(self, s1, s2) :
         return 1 if s1 < s2 else 0
 
 @concreteInstruction('FLE.S')
 class FleInstruction(FCmpInstruction) :
+    pyExpr = '1 if {0} <= {1} else 0'
+
     def funcExec(self, s1, s2) :
         return 1 if s1 <= s2 else 0
 
 @concreteInstruction('FEQ.S')
 class FeqInstruction(FCmpInstruction) :
+    pyExpr = '1 if {0} == {1} else 0'
+
     def funcExec(self, s1, s2) :
         return 1 if s1 == s2 else 0        
 
@@ -771,43 +1493,71 @@ class FswInstruction(STInstruction) :
 @concreteInstruction('NOP')
 class NopInstruction(Instruction) :
     @classmethod
-    def parseInstruction(cls, inst) :
-        match = re.match(r'(\S+)', inst)
-        cls(match[1])
+    def fromOperands(cls, opcode, operands) :
+        return cls(opcode)
 
-    def exec(self) :
-        config.machine.pc += 4
+    def exec(self, machine) :
+        machine.pc += 4
+
+    def compile(self, machine, pc) :
+        nextPc = pc + 4
+
+        def run() :
+            return nextPc
+        return run
+
+    def translate(self, block, pc) :
+        pass
 
     def __str__(self) :
         return self.opcode        
 
+#region of interest markers: no-ops that mark where detailed timing starts and stops in a sampled run
+#(see sampling.py)
+@concreteInstruction('ROI.BEGIN')
+@concreteInstruction('ROI.END')
+class RoiInstruction(NopInstruction) :
+    pass
+
 @concreteInstruction('BGE')
 class BgeInstruction(BranchInstruction) :
+    pyExpr = '{0} >= {1}'
+
     def funcExec(self, val1, val2) :
         return True if val1 >= val2 else False
 
 @concreteInstruction('BLE')
 class BleInstruction(BranchInstruction) :
+    pyExpr = '{0} <= {1}'
+
     def funcExec(self, val1, val2) :
         return True if val1 <= val2 else False
 
 @concreteInstruction('BGT')
 class BgtInstruction(BranchInstruction) :
+    pyExpr = '{0} > {1}'
+
     def funcExec(self, val1, val2) :
         return True if val1 > val2 else False
 
 @concreteInstruction('BLT')
 class BltInstruction(BranchInstruction) :
+    pyExpr = '{0} < {1}'
+
     def funcExec(self, val1, val2) :
         return True if val1 < val2 else False
 
 @concreteInstruction('BEQ')
 class BeqInstruction(BranchInstruction) :
+    pyExpr = '{0} == {1}'
+
     def funcExec(self, val1, val2) :
         return True if val1 == val2 else False
 
 @concreteInstruction('BNE')
 class BneInstruction(BranchInstruction) :
+    pyExpr = '{0} != {1}'
+
     def funcExec(self, val1, val2) :
         return True if val1 != val2 else False
 
@@ -834,6 +1584,8 @@ class FimmInstruction(FUInstruction) :
 #move floating point to integer
 @concreteInstruction('FMOVI.S')
 class FmoviInstruction(FORInstruction) :
+    pyExpr = 'int({0})'
+
     def funcExec(self, src1) :
         return int(src1)
 
@@ -848,6 +1600,8 @@ class FmoviInstruction(FORInstruction) :
 #move integer to floating point
 @concreteInstruction('IMOVF.S')
 class ImovfInstruction(FORInstruction) :
+    pyExpr = 'float({0})'
+
     def funcExec(self, src1) :
         return float(src1)
 
@@ -890,25 +1644,51 @@ class PutsInstruction(IOInstruction) :
     def __init__(self, reg, opcode) :
         self.reg = reg
         self.opcode = opcode
-
-    def exec(self) :
-        addr = config.machine.registerFile[self.reg].read()
-        assert (addr >= config.machine.memory.strings[0] and addr < config.machine.memory.strings[1]), "Writing string from a bad address"
-
-        print(config.machine.memory[addr], end = '')
-        config.machine.pc += 4
+        self._reg = decodeRegister(reg)
+
+    def exec(self, machine) :
+        regtype, reg = self._reg
+        addr = machine.registers[regtype][reg]
+        assert (addr >= machine.memory.strings[0] and addr < machine.memory.strings[1]), "Writing string from a bad address"
+
+        machine.output.write(str(machine.memory[addr]))
+        machine.pc += 4
+
+    def compile(self, machine, pc) :
+        regtype, reg = self._reg
+        regfile = machine.registers[regtype]
+        memory = machine.memory
+        strings = memory.strings
+        write = machine.output.write
+        nextPc = pc + 4
+
+        def run() :
+            addr = regfile[reg]
+            assert (addr >= strings[0] and addr < strings[1]), "Writing string from a bad address"
+            write(str(memory[addr]))
+            return nextPc
+        return run
         
 @concreteInstruction('HALT')
 class HaltInstruction(Instruction) :
 
+    endsBlock = True
+
     @classmethod
-    def parse(cls, inst) :
-        match = re.match(r'(\S+)', inst)
-        return cls(match[1])
+    def fromOperands(cls, opcode, operands) :
+        return cls(opcode)
 
-    def exec(self) :
+    def exec(self, machine) :
         #HALT by moving pc to -1
-        config.machine.pc = -1
+        machine.pc = -1
+
+    def compile(self, machine, pc) :
+        def run() :
+            return -1
+        return run
+
+    def translate(self, block, pc) :
+        block.emit('return -1')
 
     def __str__(self) :
         return self.opcode
@@ -916,36 +1696,65 @@ class HaltInstruction(Instruction) :
 @concreteInstruction('MALLOC')
 class MallocInstruction(Instruction) :
 
+    timed = True
+
+    #OP dst, size
+    operandCount = 2
+
     @classmethod
-    def parse(cls, inst) :
-        match = re.match(r'(\S+) (\S+), (\S+)', inst)
-        return cls(match[2], match[3], match[1])
+    def fromOperands(cls, opcode, operands) :
+        return cls(operands[0], operands[1], opcode)
 
     def __init__(self, dstReg, sizeReg, opcode) :
         self.dstReg = dstReg
         self.sizeReg = sizeReg
         self.opcode = opcode
+        self._dstReg = decodeDestination(dstReg)
+        self._sizeReg = decodeRegister(sizeReg)
 
-    def exec(self) :
+    def sources(self) :
+        return [(self.sizeReg, self._sizeReg)]
 
-        config.machine.timingModel.exec(self)
+    def destinations(self) :
+        return [(self.dstReg, self._dstReg)]
 
-        sizeReg = config.machine.registerFile[self.sizeReg]
-        assert sizeReg.type == int, "Size register is not an integer"
+    def verify(self) :
+        assert self._sizeReg[0] == int, "Size register is not an integer"
+        assert self._dstReg[0] == int, "Address not being stored in integer reg"
 
-        size = sizeReg.read()
+    def exec(self, machine) :
+
+        machine.timingModel.exec(self)
+
+        sizetype, sizeReg = self._sizeReg
+
+        size = machine.registers[sizetype][sizeReg]
 
         #call the memory allocator to allocate sizeReg amount of space
-        addr = config.machine.memoryManager.malloc(size)
+        addr = machine.memoryManager.malloc(size, machine.pc)
 
         # print("Allocated at address " + str(addr));
 
-        destReg = config.machine.registerFile[self.dstReg]
-        assert destReg.type == int, "Address not being stored in integer reg"
+        dsttype, dst = self._dstReg
+        machine.registers[dsttype][dst] = addr
+
+        machine.pc += 4
 
-        config.machine.registerFile[self.dstReg].write(addr)
+    def compile(self, machine, pc) :
+        if not self._verifies() :
+            return Instruction.compile(self, machine, pc)
+        sizetype, sizeReg = self._sizeReg
+        dsttype, dst = self._dstReg
 
-        config.machine.pc += 4
+        sizefile = machine.registers[sizetype]
+        dstfile = machine.registers[dsttype]
+        malloc = machine.memoryManager.malloc
+        nextPc = pc + 4
+
+        def run() :
+            dstfile[dst] = malloc(sizefile[sizeReg], pc)
+            return nextPc
+        return self._timed(machine, run)
 
     def __str__(self) :
         return str(self.opcode + " " + self.dstReg + " " + self.sizeReg)
@@ -953,30 +1762,54 @@ class MallocInstruction(Instruction) :
 @concreteInstruction('FREE')
 class FreeInstruction(Instruction) :
 
+    timed = True
+
+    #OP addr
+    operandCount = 1
+
     @classmethod
-    def parse(cls, inst) :
-        match = re.match(r'(\S+) (\S+)', inst)
-        return cls(match[2], match[1])
+    def fromOperands(cls, opcode, operands) :
+        return cls(operands[0], opcode)
 
     def __init__(self, addrReg, opcode) :
         self.addrReg = addrReg
         self.opcode = opcode
+        self._addrReg = decodeRegister(addrReg)
+
+    def sources(self) :
+        return [(self.addrReg, self._addrReg)]
     
-    def exec(self) :
+    def verify(self) :
+        assert self._addrReg[0] == int, "address needs to be an integer reg"
+
+    def exec(self, machine) :
 
-        config.machine.timingModel.exec(self)
+        machine.timingModel.exec(self)
 
-        addrReg = config.machine.registerFile[self.addrReg]
-        assert addrReg.type == int, "address needs to be an integer reg"
+        addrtype, addrReg = self._addrReg
 
-        addr = addrReg.read()
+        addr = machine.registers[addrtype][addrReg]
 
         # print("Freeing address " + str(addr));
 
         #call the memory allocator to release the address
-        config.machine.memoryManager.free(addr)
+        machine.memoryManager.free(addr)
+
+        machine.pc += 4
 
-        config.machine.pc += 4
+    def compile(self, machine, pc) :
+        if not self._verifies() :
+            return Instruction.compile(self, machine, pc)
+        addrtype, addrReg = self._addrReg
+
+        addrfile = machine.registers[addrtype]
+        free = machine.memoryManager.free
+        nextPc = pc + 4
+
+        def run() :
+            free(addrfile[addrReg])
+            return nextPc
+        return self._timed(machine, run)
 
     def __str__(self) :
         return str(self.opcode + " " + self.addrReg)
@@ -1024,42 +1857,61 @@ class RemuInstruction(IRInstruction) :
 
 ###### Parsing ######
 
+#offset(register) operand of loads and stores
+_memOperand = re.compile(r'(\S+)\((\S+)\)$')
+
+#split a line of assembly (without comments) into its opcode and list of operands
+#operands are separated by commas and/or whitespace; none of them can contain either
+def tokenize(inst) :
+    tokens = inst.replace(',', ' ').split()
+    return tokens[0], tokens[1:]
+
+#build the instruction for opcode from its operands, through the class opCodeMap has for it unless
+#cls is given; raises ValueError for an unknown opcode or the wrong number of operands, and KeyError
+#for an unknown register
+def buildInstruction(opcode, operands, cls = None) :
+    if cls is None :
+        cls = opCodeMap.get(opcode)
+        if cls is None :
+            raise ValueError("unknown opcode '" + opcode + "'")
+    if len(operands) != cls.operandCount :
+        raise ValueError(opcode + " takes " + str(cls.operandCount) + " operand(s), not " + str(len(operands)))
+    return cls.fromOperands(opcode, operands)
+
 #Parse the instruction and generate the right derived instruction from it
 #The instruction is a single instruction string
 def parseInstruction(inst) :
-    base = inst.strip()
-    opcode = re.match(r'(\S+)', base)[0]
-    return opCodeMap[opcode].parse(base)
+    return buildInstruction(*tokenize(inst.strip()))
 
 ####### Test #######
 
-def testAdd() :
-    config.machine.registerFile['t0'].write(3)
-    config.machine.registerFile['t1'].write(4)
-    print(config.machine.registerFile['t2'])
+def testAdd(machine) :
+    machine.registerFile['t0'].write(3)
+    machine.registerFile['t1'].write(4)
+    print(machine.registerFile['t2'])
     # inst1 = AddInstruction(src1 = 't0', src2 = 't1', dst = 't2', opcode = 'ADD')
     inst1 = parseInstruction("ADD t2, t0, t1")
     print(inst1)
-    inst1.exec()
-    print(config.machine.registerFile['t2'])
+    inst1.exec(machine)
+    print(machine.registerFile['t2'])
 
 def testParse() :
     inst = parseInstruction("  ADD t2, t0, t1 ")
     print(inst)
 
-def testExecList() :
-    config.machine.registerFile['t0'].write(3)
-    config.machine.registerFile['t1'].write(4)
-    config.machine.registerFile['t2'].write(5)
-    config.machine.registerFile['t3'].write(6)
+def testExecList(machine) :
+    machine.registerFile['t0'].write(3)
+    machine.registerFile['t1'].write(4)
+    machine.registerFile['t2'].write(5)
+    machine.registerFile['t3'].write(6)
 
     addr1 = 0x40000000
     addr2 = 0x40000004
-    config.machine.registerFile['a0'].write(addr1)
-    config.machine.registerFile['a1'].write(addr2)
+    machine.registerFile['a0'].write(addr1)
+    machine.registerFile['a1'].write(addr2)
 
-    config.machine.memory[0x10000000] = "Hello World"
-    config.machine.registerFile['a2'].write(0x10000000)
+    machine.memory[0x10000000] = "Hello World"
+    machine.registerFile['a2'].write(0x10000000)
 
     insts = [
         'ADD t4, t0, t1',
@@ -1084,24 +1936,25 @@ def testExecList() :
     ops = [parseInstruction(i) for i in insts]
     for o in ops :
         print(o)
-        o.exec()
+        o.exec(machine)
 
-    print(config.machine.registerFile['t4'])
-    print(config.machine.registerFile['t5'])
-    print(config.machine.registerFile['t6'])
-    print(config.machine.registerFile['t7'])
-    print(config.machine.registerFile['t8'])
-    print(config.machine.registerFile['f1'])
-    print(config.machine.registerFile['f2'])
-    print(config.machine.registerFile['f3'])  
-    print(config.machine.registerFile['t10'])  
+    print(machine.registerFile['t4'])
+    print(machine.registerFile['t5'])
+    print(machine.registerFile['t6'])
+    print(machine.registerFile['t7'])
+    print(machine.registerFile['t8'])
+    print(machine.registerFile['f1'])
+    print(machine.registerFile['f2'])
+    print(machine.registerFile['f3'])  
+    print(machine.registerFile['t10'])  
 
-    print("Memory at " + hex(addr1) + ": " + str(config.machine.memory[addr1]))
-    print("Memory at " + hex(addr2) + ": " + str(config.machine.memory[addr2]))
+    print("Memory at " + hex(addr1) + ": " + str(machine.memory[addr1]))
+    print("Memory at " + hex(addr2) + ": " + str(machine.memory[addr2]))
 
-    print(config.machine.registerFile['t11'])  
-    print(config.machine.registerFile['f4'])  
+    print(machine.registerFile['t11'])  
+    print(machine.registerFile['f4'])  
 
 
 if __name__ == '__main__' :
-    testExecList()
+    from machine import Machine
+    testExecList(Machine(numIntRegisters = 256, numFloatRegisters = 256))
@@ -0,0 +1,57 @@
+import sys
+
+#program I/O channels owned by a Machine: PUT* instructions write to its OutputSink and GET* instructions
+#read from its InputSource, so programs do not pay for a print or input() call per value
+
+#collects program output and writes it to its stream in bulk, once bufferSize characters are waiting
+#and whenever flush is called. A stream of None means whatever sys.stdout is at the time of the write,
+#so redirecting sys.stdout still works; a bufferSize of 0 writes everything straight through
+class OutputSink :
+    def __init__(self, stream = None, bufferSize = 1 << 16) :
+        self.stream = stream
+        self.bufferSize = bufferSize
+        self.parts = []
+        self.size = 0
+
+    def write(self, text) :
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= self.bufferSize :
+            self.flush()
+
+    def flush(self) :
+        if self.parts :
+            stream = self.stream if self.stream is not None else sys.stdout
+            stream.write(''.join(self.parts))
+            stream.flush()
+            self.parts = []
+            self.size = 0
+
+#hands out program input a line at a time, reading the whole stream the first time a line is asked for
+#a stream of None means sys.stdin. Lines come back without their newline, and asking for a line past
+#the end raises EOFError, the same as input(). If output is given, it is flushed before the stream is
+#read, so anything the program printed first (a prompt) is out before the simulator waits for input
+class InputSource :
+    def __init__(self, stream = None, output = None) :
+        self.stream = stream
+        self.output = output
+        self.lines = None
+        self.next = 0
+
+    def __load(self) :
+        if self.output is not None :
+            self.output.flush()
+        stream = self.stream if self.stream is not None else sys.stdin
+        self.lines = stream.read().split('\n')
+        #text ending in a newline does not have an empty last line
+        if self.lines[-1] == '' :
+            self.lines.pop()
+
+    def readLine(self) :
+        if self.lines is None :
+            self.__load()
+        if self.next == len(self.lines) :
+            raise EOFError("EOF when reading a line")
+        line = self.lines[self.next]
+        self.next += 1
+        return line
@@ -1,118 +1,183 @@
 from memory import Memory
-from registers import IRegister
-from registers import FRegister
+from registers import RegisterFile
 from memorymanager import MemoryManager
+from heapprofile import HeapProfiler
 import timingmodel
+import tracefile
+import hotspots
+import instmix
+import exectrace
+import checkpoint
+import iochannels
+import engines
 import program
-import config
+import time
 
 
 
+#all simulation state lives on the Machine, and instructions are handed the machine they run on, so any
+#number of machines can exist and run (including from different threads) in one process
 class Machine :
-    def __init__(self, numIntRegisters = 32, numFloatRegisters = 32, timingModel = timingmodel.defaultTimingModel) :
+    #stdin and stdout are the streams GET*/PUT* instructions use; None means sys.stdin/sys.stdout at the time
+    #program output is buffered (see iochannels.py) and flushed when a run ends
+    #heapPolicy is the MALLOC allocation policy (see memorymanager.policies); with heapProfile set, the heap is
+    #profiled (see heapprofile.py), sampling it every heapInterval heap operations if that is not 0
+    def __init__(self, numIntRegisters = 32, numFloatRegisters = 32, timingModel = timingmodel.defaultTimingModel, stdin = None, stdout = None,
+                 heapPolicy = 'first', heapProfile = False, heapInterval = 0) :
         self.memory = Memory()
 
-        self.registerFile = {}
+        self.registerFile = RegisterFile(numIntRegisters, numFloatRegisters)
         self.numIntRegisters = numIntRegisters
         self.numFloatRegisters = numFloatRegisters
-        self.__createRegisterFile()
 
-        self.memoryManager = MemoryManager(self.memory.heap[0], self.memory.heap[1] - self.memory.heap[0])
+        #flat register storage; instructions index these with register numbers decoded at parse time
+        self.intRegisters = self.registerFile.intRegisters
+        self.floatRegisters = self.registerFile.floatRegisters
+        self.registers = self.registerFile.registers
+
+        #kept to build a fresh allocator and timing model on reset
+        self.timingModelFactory = timingModel
+        self.heapPolicy = heapPolicy
+        self.heapProfile = heapProfile
+        self.heapInterval = heapInterval
+
+        self.reset(stdin, stdout)
+
+    #put the machine back in the state a new one starts in, with new I/O streams, so it can run another
+    #program without being built again (see machinepool.py). Only what a run can have changed is cleared:
+    #the memory pages it wrote (which are kept to be reused), the registers, the allocator, the timing model
+    #and the counters
+    def reset(self, stdin = None, stdout = None) :
+        self.memory.reset()
+        self.output = iochannels.OutputSink(stdout)
+        self.input = iochannels.InputSource(stdin, self.output)
+
+        #in place, since register lists are shared with the register file
+        self.intRegisters[:] = [0] * len(self.intRegisters)
+        self.floatRegisters[:] = [0.0] * len(self.floatRegisters)
+
+        heapStart, heapEnd = self.memory.heap
+        if self.heapProfile :
+            self.memoryManager = HeapProfiler(heapStart, heapEnd - heapStart, self.heapPolicy, self.heapInterval)
+        else :
+            self.memoryManager = MemoryManager(heapStart, heapEnd - heapStart, self.heapPolicy)
         # print("Memory allocator " + str(self.memoryManager))
 
-        self.timingModel = timingModel()
+        self.timingModel = self.timingModelFactory()
         # print(self.timingModel)
 
         self.prog = None
+        self.checked = False
+        #maximum number of instructions a run may execute, None for no limit (see engines.py)
+        self.instructionLimit = None
+        #execution counts of the last run made with profile or count set (see hotspots.py), or None
+        self.profile = None
+        #instruction mix of the last run made with count set (see instmix.py), or None
+        self.mix = None
+        #exectrace.Tracer to record the steps of the next run, or None
+        self.tracer = None
 
         self.pc = self.memory.text[0]
         self.registerFile['sp'].write(self.memory.text[1] - 4) #initialize the stack pointer
 
-    def __createRegisterFile(self) :
-        #initialize integer registers
-        for i in range(self.numIntRegisters) :
-            name = 'x' + str(i)
-            self.registerFile[name] = IRegister(name)
-
-        #Standard integer register aliases
-        self.registerFile['zero'] = self.registerFile['x0']
-        self.registerFile['ra'] = self.registerFile['x1']
-        self.registerFile['sp'] = self.registerFile['x2']
-        self.registerFile['gp'] = self.registerFile['x3']
-        self.registerFile['tp'] = self.registerFile['x4']
-        self.registerFile['t0'] = self.registerFile['x5']
-        self.registerFile['t1'] = self.registerFile['x6']
-        self.registerFile['t2'] = self.registerFile['x7']
-        self.registerFile['s0'] = self.registerFile['x8']
-        self.registerFile['fp'] = self.registerFile['x8']
-        self.registerFile['s1'] = self.registerFile['x9']
-        self.registerFile['a0'] = self.registerFile['x10']
-        self.registerFile['a1'] = self.registerFile['x11']
-        self.registerFile['a2'] = self.registerFile['x12']
-        self.registerFile['a3'] = self.registerFile['x13']
-        self.registerFile['a4'] = self.registerFile['x14']
-        self.registerFile['a5'] = self.registerFile['x15']
-        self.registerFile['a6'] = self.registerFile['x16']
-        self.registerFile['a7'] = self.registerFile['x17']
-        self.registerFile['s2'] = self.registerFile['x18']
-        self.registerFile['s3'] = self.registerFile['x19']
-        self.registerFile['s4'] = self.registerFile['x20']
-        self.registerFile['s5'] = self.registerFile['x21']
-        self.registerFile['s6'] = self.registerFile['x22']
-        self.registerFile['s7'] = self.registerFile['x23']
-        self.registerFile['s8'] = self.registerFile['x24']
-        self.registerFile['s9'] = self.registerFile['x25']
-        self.registerFile['s10'] = self.registerFile['x26']
-        self.registerFile['s11'] = self.registerFile['x27']
-        self.registerFile['t3'] = self.registerFile['x28']
-        self.registerFile['t4'] = self.registerFile['x29']
-        self.registerFile['t5'] = self.registerFile['x30']
-        self.registerFile['t6'] = self.registerFile['x31']
-
-        #alias any extra integer registers
-        for i in range(self.numIntRegisters - 32) :
-            self.registerFile['t' + str(7 + i)] = self.registerFile['x' + str(32 + i)]
-
-        #initialize floating point registers
-        for f in range(self.numFloatRegisters) :
-            name = 'f' + str(f)
-            self.registerFile[name] = FRegister(name)
-
-        #standard floating point register aliases
-        for i in range(0, 8) :
-            self.registerFile['ft' + str(i)] = self.registerFile['f' + str(i)]
-
-        self.registerFile['fs0'] = self.registerFile['f8']
-        self.registerFile['fs1'] = self.registerFile['f9']
-
-        for i in range(0, 8) :
-            self.registerFile['fa' + str(i)] = self.registerFile['f1' + str(i)]
-
-        for i in range(2, 12) :
-            self.registerFile['fs' + str(i)] = self.registerFile['f' + str(16 + i)]
-
-        for i in range(8, 12) :
-            self.registerFile['ft' + str(i)] = self.registerFile['f' + str(20 + i)]
-
-        #alias any extra floating point registers
-        for f in range(self.numFloatRegisters - 32) :
-            self.registerFile['ft' + str(12 + f)] = self.registerFile['f' + str(32 + f)]
-
-    def execProgram(self, p, showMemoryStats=False, useDebug=False) :
-
+    #attach a program to the machine, making sure every register it names exists on this machine
+    #unless checked is set, the program is also verified up front and runs without per-instruction checks
+    def loadProgram(self, p, checked=False) :
+        for inst in p.code.values() :
+            for name, reg in inst.sources() + inst.destinations() :
+                self.registerFile.check(name, reg)
+        if not checked :
+            p.verify()
+        for addr, string in p.strings.items() :
+            self.memory[addr] = string
         self.prog = p
+        self.checked = checked
+
+    #load p and set the machine to run it from the top (see resume)
+    def start(self, p, checked=False) :
+        self.loadProgram(p, checked)
         self.pc = self.memory.text[0]
-        while (self.pc != -1) :
-            if (useDebug):
-                print(self.pc) #UNCOMMENT TO DEBUG BY PRINTING PC VALUE
-            inst = p.code[self.pc]
-            if (useDebug):
-                print(inst) #UNCOMMENT TO DEBUG BY PRINTING INSTRUCTION TRACE
-            inst.exec()
 
+    #continue the loaded program from self.pc; with count, stop once count more instructions have run
+    #(the translator stops at the block boundary before that). Returns True once the program has reached HALT
+    def resume(self, engine='interpreter', count=None) :
+        if self.pc == -1 :
+            return True
+        limit = self.instructionLimit
+        if count is not None :
+            self.instructionLimit = count
+        try :
+            engines.engineMap[engine](self).run()
+        except engines.InstructionLimitExceeded :
+            if count is None :
+                raise
+            return False
+        finally :
+            self.instructionLimit = limit
+            self.output.flush()
+        return True
+
+    #the machine's state right now, to restore later (see checkpoint.py)
+    def checkpoint(self) :
+        return checkpoint.Checkpoint(self)
+
+    def restore(self, cp) :
+        cp.restoreInto(self)
+
+    #load p and run it to completion without printing anything besides the program's own output
+    #if trace names a file, every call the run makes into the timing model is also saved there (see tracefile.py)
+    #with profile set, the run counts executions and cycles per instruction into self.profile
+    #with count set, the run counts executions only, and leaves the instruction mix in self.mix
+    #useDebug traces the pc and text of every instruction to stdout, unless self.tracer is already set
+    def run(self, p, useDebug=False, engine='interpreter', checked=False, trace=None, profile=False, count=False) :
+        self.start(p, checked)
+        self.profile = hotspots.Profile(p, self.memory.text[0], timed = profile) if (profile or count) else None
+        self.mix = None
+        tracer = self.tracer
+        if useDebug and tracer is None :
+            self.tracer = exectrace.Tracer()
+        bufferSize = self.output.bufferSize
+        if self.tracer is not None :
+            self.tracer.start(p, self)
+            #a trace on stdout has to stay in step with the program's output, so that cannot be held back
+            if self.tracer.toStdout() :
+                self.output.bufferSize = 0
+        if trace :
+            self.timingModel = tracefile.TraceRecorder(self.timingModel, p, trace)
+        start = time.perf_counter()
+        try :
+            engines.engineMap[engine](self).run()
+        except Exception :
+            if self.tracer is not None :
+                self.tracer.postMortem()
+            raise
+        finally :
+            self.output.flush()
+            self.output.bufferSize = bufferSize
+            if self.tracer is not None :
+                self.tracer.close()
+                self.tracer = tracer
+            if trace :
+                self.timingModel.close()
+                self.timingModel = self.timingModel.model
+            if profile :
+                self.profile.finish(self.timingModel)
+            if count :
+                self.mix = instmix.InstructionMix(p, self.memory.text[0], self.profile.counts, self.timingModel.getTotalTime(), time.perf_counter() - start)
+
+    def execProgram(self, p, showMemoryStats=False, useDebug=False, engine='interpreter', checked=False, trace=None, profile=False, count=False) :
+
+        self.run(p, useDebug, engine, checked, trace, profile, count)
+        self.printStats(showMemoryStats)
+
+    def printStats(self, showMemoryStats=False) :
         print("Execution time: " + str(self.timingModel.getTotalTime()) + " cycles")
         if showMemoryStats:
             print("Memory usage: {} reads, {} writes; {} total".format(*self.memory.getAccessCounts()))
+            for line in self.timingModel.getStats(self) :
+                print(line)
+        for line in self.memoryManager.getStats(self.prog.symbols) :
+            print(line)
 
 
 # machine = Machine(numIntRegisters = 64, numFloatRegisters = 64)
@@ -123,4 +188,4 @@ if __name__ == '__main__' :
     p = program.Program()
     p.buildCodeFromFile('testFile.asm')
 
-    config.machine.execProgram(p)
+    Machine(numIntRegisters = 256, numFloatRegisters = 256, timingModel = timingmodel.basicTimingModel).execProgram(p)
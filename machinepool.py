@@ -0,0 +1,50 @@
+import contextlib
+import threading
+import machine
+
+#a pool of built Machines, kept by register count, so runners of many short programs (see batch.py) reset
+#a machine (see Machine.reset) instead of building a new one for every program
+#
+#every machine in a pool is built with the same settings (timing model, heap policy, ...), given as the
+#keyword arguments Machine takes besides the register counts and I/O streams. A machine is reset when it
+#is handed out, not when it comes back, so one given back after a failed run is fine
+
+class MachinePool :
+    #maxIdle: most machines kept per register count while nobody is using them
+    def __init__(self, maxIdle = 4, **settings) :
+        self.maxIdle = maxIdle
+        self.settings = settings
+        self.idle = {} #(int registers, float registers) -> machines ready to be handed out
+        self.lock = threading.Lock()
+        self.built = 0
+        self.reused = 0
+
+    #a machine with these register counts, reset to read stdin and write stdout
+    def acquire(self, numIntRegisters = 32, numFloatRegisters = 32, stdin = None, stdout = None) :
+        with self.lock :
+            machines = self.idle.get((numIntRegisters, numFloatRegisters))
+            m = machines.pop() if machines else None
+            if m is None :
+                self.built += 1
+            else :
+                self.reused += 1
+        if m is None :
+            return machine.Machine(numIntRegisters, numFloatRegisters, stdin = stdin, stdout = stdout, **self.settings)
+        m.reset(stdin, stdout)
+        return m
+
+    #give back a machine from acquire
+    def release(self, m) :
+        with self.lock :
+            machines = self.idle.setdefault((m.numIntRegisters, m.numFloatRegisters), [])
+            if len(machines) < self.maxIdle :
+                machines.append(m)
+
+    #acquire a machine for the length of a with block, then release it
+    @contextlib.contextmanager
+    def machine(self, numIntRegisters = 32, numFloatRegisters = 32, stdin = None, stdout = None) :
+        m = self.acquire(numIntRegisters, numFloatRegisters, stdin, stdout)
+        try :
+            yield m
+        finally :
+            self.release(m)
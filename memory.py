@@ -1,14 +1,66 @@
-class Memory(dict) :
+from array import array
+
+#memory is split into fixed-size pages that are allocated the first time they are written
+PAGE_SHIFT = 12 #4KB pages
+PAGE_SIZE = 1 << PAGE_SHIFT
+PAGE_WORDS = PAGE_SIZE >> 2
+WORD_MASK = PAGE_WORDS - 1
+
+#what a word of a page currently holds
+EMPTY = 0
+INT = 1
+FLOAT = 2
+OBJECT = 3 #anything that does not fit a 64-bit slot (strings, very large ints) lives in the page's side store
+
+#most pages Memory.reset keeps to reuse
+SPARE_PAGES = 256
+_emptyTags = bytes(PAGE_WORDS)
+
+class Page :
+    __slots__ = ('segment', 'tags', 'ints', 'floats', 'objects', 'shared')
+
+    #segment: the (start, end) tuple of the segment the page belongs to
+    def __init__(self, segment) :
+        self.segment = segment
+        self.tags = bytearray(PAGE_WORDS)
+        #ints and floats share the same 8-byte slots; tags says how to read each one
+        self.ints = array('q', bytes(8 * PAGE_WORDS))
+        self.floats = memoryview(self.ints).cast('B').cast('d')
+        self.objects = {}
+        #set once a snapshot holds the page; it must not change after that, so writes go to a copy
+        self.shared = False
+
+    def copy(self) :
+        page = Page.__new__(Page)
+        page.__setstate__(self.__getstate__())
+        return page
+
+    #the floats view cannot be pickled; it is rebuilt over ints
+    def __getstate__(self) :
+        return (self.segment, bytearray(self.tags), array('q', self.ints), dict(self.objects))
+
+    def __setstate__(self, state) :
+        self.segment, self.tags, self.ints, self.objects = state
+        self.floats = memoryview(self.ints).cast('B').cast('d')
+        self.shared = False
+
+#default segment layout
+GLOBALS = (0x20000000, 0x30000000)
+STACK = (0x30000000, 0x40000000)
+HEAP = (0x40000000, 0x80000000)
+TEXT = (0x00000000, 0x10000000)
+STRINGS = (0x1000000, 0x20000000)
+
+class Memory :
     #initialize memory by making clear what the valid segments are: .globals, .stack, .heap, .text, .strings
     #IMPORTANT: memory is not byte addressable -- can only be addressed at word granularity -- means we do not have to actually manage byte mapping
     #           and we don't have to worry about endianness
     #IMPORTANT: we do not actually allow reading/writing to the text space, but Memory keeps track of the address range since it's part of the memory configuration
-    def __init__(self, globs = (0x20000000, 0x30000000),
-                       stack = (0x30000000, 0x40000000),
-                       heap = (0x40000000, 0x80000000),
-                       text = (0x00000000, 0x10000000),
-                       strings = (0x1000000, 0x20000000)) :
-        super().__init__()
+    def __init__(self, globs = GLOBALS,
+                       stack = STACK,
+                       heap = HEAP,
+                       text = TEXT,
+                       strings = STRINGS) :
         self.globs = globs
         self.stack = stack
         self.heap = heap
@@ -17,32 +69,116 @@ class Memory(dict) :
         self.r_count = 0
         self.w_count = 0
 
+        #page number -> Page; a page only exists if it lies in a mapped segment, so finding it is the whole validity check
+        self.pages = {}
+        #cleared pages left over from before a reset, handed out again before new ones are made
+        self.spare = []
+        self.segments = [self.globs, self.stack, self.heap, self.strings]
+        for s in self.segments :
+            assert (s[0] % PAGE_SIZE == 0 and s[1] % PAGE_SIZE == 0), "Segment boundaries must be page aligned"
+
     def __getitem__(self, key) :
-        self.__validateAddress(key)
+        assert(type(key) == int), "Can only address memory with integers"
+        assert(key % 0x4 == 0), "Memory must be addressed at byte granularity"
+
+        page = self.pages.get(key >> PAGE_SHIFT)
+        if page is None :
+            self.__validateAddress(key)
+            self.r_count += 1
+            return self.__missing__(key)
         self.r_count += 1
-        return super().__getitem__(key)
+
+        i = (key >> 2) & WORD_MASK
+        tag = page.tags[i]
+        if tag == INT :
+            return page.ints[i]
+        elif tag == FLOAT :
+            return page.floats[i]
+        elif tag == OBJECT :
+            return page.objects[i]
+        return self.__missing__(key)
 
     def __setitem__(self, key, value) :
-        self.__validateAddress(key)
+        assert(type(key) == int), "Can only address memory with integers"
+        assert(key % 0x4 == 0), "Memory must be addressed at byte granularity"
+
+        page = self.pages.get(key >> PAGE_SHIFT)
+        if page is None :
+            page = self.pages[key >> PAGE_SHIFT] = self.__newPage(self.__validateAddress(key))
+        elif page.shared :
+            page = self.pages[key >> PAGE_SHIFT] = page.copy()
         self.w_count += 1
-        super().__setitem__(key, value)
+
+        i = (key >> 2) & WORD_MASK
+        tags = page.tags
+        if tags[i] == OBJECT :
+            del page.objects[i]
+
+        valtype = type(value)
+        if valtype == int :
+            try :
+                page.ints[i] = value
+                tags[i] = INT
+                return
+            except OverflowError :
+                pass
+        elif valtype == float :
+            page.floats[i] = value
+            tags[i] = FLOAT
+            return
+        page.objects[i] = value
+        tags[i] = OBJECT
+
+    def __contains__(self, key) :
+        page = self.pages.get(key >> PAGE_SHIFT)
+        return (page is not None) and (page.tags[(key >> 2) & WORD_MASK] != EMPTY)
 
     def __missing__(self, key) :
         assert False, "Reading from uninitialized memory location: " + hex(key)
 
-    def __validateAddress(self, key) :
-        #key needs to be an integer
-        assert(type(key) == int), "Can only address memory with integers"
+    def __newPage(self, segment) :
+        if self.spare :
+            page = self.spare.pop()
+            page.segment = segment
+            return page
+        return Page(segment)
 
-        #key needs to be a multiple of 4
-        assert(key % 0x4 == 0), "Memory must be addressed at byte granularity"
+    #empty memory, as a new Memory starts out. Pages only exist where something was written, so those are
+    #the only ones to clear; they are kept (up to SPARE_PAGES) to reuse, except for pages a snapshot holds
+    def reset(self) :
+        for page in self.pages.values() :
+            if len(self.spare) == SPARE_PAGES :
+                break
+            if not page.shared :
+                #words are only read through their tags, so the old values can stay
+                page.tags[:] = _emptyTags
+                page.objects.clear()
+                self.spare.append(page)
+        self.pages = {}
+        self.r_count = 0
+        self.w_count = 0
 
+    #slow path, only taken when an address falls on a page that has not been allocated
+    #returns the segment the address belongs to
+    def __validateAddress(self, key) :
         #key needs to be in a segment
-        valid = False
-        for s in [self.globs, self.stack, self.heap, self.strings] :
+        for s in self.segments :
             if (key >= s[0] and key < s[1]) :
-                valid = True
-        assert valid == True, "Address not in a mapped segment"
+                return s
+        assert False, "Address not in a mapped segment"
+
+    #the contents of memory as they are now, for restore; pages are shared with the snapshot and only
+    #copied when one of them is next written, so taking a snapshot costs one dict copy
+    def snapshot(self) :
+        for page in self.pages.values() :
+            page.shared = True
+        return dict(self.pages)
+
+    #put back the contents of a snapshot; the snapshot itself is left as it was, so it can be restored again
+    def restore(self, pages) :
+        for page in pages.values() :
+            page.shared = True
+        self.pages = dict(pages)
 
     def getAccessCounts(self):
         return (self.r_count, self.w_count, self.r_count + self.w_count)
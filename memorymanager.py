@@ -1,12 +1,25 @@
+from bisect import bisect_left, insort
+
+#allocation policies MemoryManager accepts: how malloc picks among the free blocks big enough for a request
+#'first' takes the lowest address, 'best' the smallest block, 'next' the lowest address at or after where the
+#previous allocation ended (wrapping around). 'linear' is the original list-scanning FreeList, which 'first'
+#returns identical addresses to
+policies = ('first', 'best', 'next', 'linear')
+
 class MemoryManager :
 
     #startAddr: starting address to allocate from
     #size: amount of memory to allocate
-    def __init__(self, startAddr, size) :
-        self.freeList = FreeList(startAddr, size)
+    #policy: one of policies
+    def __init__(self, startAddr, size, policy = 'first') :
+        if policy == 'linear' :
+            self.freeList = FreeList(startAddr, size)
+        else :
+            self.freeList = SegregatedFreeList(startAddr, size, policy)
         self.allocatedBlocks = {}
 
-    def malloc(self, size) :
+    #site is the pc of the MALLOC instruction asking, for profiling (see heapprofile.py)
+    def malloc(self, size, site = None) :
         #print("DEBUG: Allocating " + str(size) + " bytes")
         bl = self.freeList.getBlock(size)
         self.allocatedBlocks[bl[0]] = bl[1]
@@ -22,6 +35,10 @@ class MemoryManager :
 
         #print(self)
 
+    #extra lines to print after a run; a plain MemoryManager keeps no statistics
+    def getStats(self, symbols = {}) :
+        return []
+
     def __str__(self) :
         return "Allocated Blocks: " + str(self.allocatedBlocks) + "\nFree list: " + str(self.freeList)
 
@@ -75,9 +92,155 @@ class FreeList :
         else : #otherwise, add a new block at the current position
             self.freeList.insert(i, (addr, size))
 
+    #(address, size) of every free block, in address order
+    def blocks(self) :
+        return list(self.freeList)
+
     def __str__ (self) :
         return str(self.freeList)
 
+#free blocks kept in an address-ordered index (for coalescing) and in size-class bins (for finding a block),
+#so malloc and free cost O(log n) in the number of free blocks instead of a scan of the whole free list
+#
+#bin k holds the blocks whose size has bit length k, i.e. sizes in [2^(k-1), 2^k), so every block in a bin
+#above a request's own bin fits it, and only the request's own bin has to be checked block by block.
+#Bins are sorted lists: by address for the first and next policies, by (size, address) for best
+class SegregatedFreeList :
+
+    def __init__(self, startAddr, size, policy = 'first') :
+        if policy not in ('first', 'best', 'next') :
+            raise KeyError("Unknown allocation policy " + str(policy))
+        self.policy = policy
+        self.bySize = (policy == 'best')
+        self.startAddr = startAddr
+        self.starts = [] #start addresses of the free blocks, sorted
+        self.sizes = {} #start address -> size
+        self.bins = [[] for _ in range(size.bit_length() + 1)]
+        self.nonEmpty = 0 #bit k is set when bins[k] has blocks
+        self.rover = startAddr #where the next-fit search starts
+        if size > 0 :
+            self.__insert(startAddr, size)
+
+    def __insert(self, addr, size) :
+        insort(self.starts, addr)
+        self.sizes[addr] = size
+        k = size.bit_length()
+        insort(self.bins[k], (size, addr) if self.bySize else addr)
+        self.nonEmpty |= 1 << k
+
+    def __remove(self, addr) :
+        size = self.sizes.pop(addr)
+        del self.starts[bisect_left(self.starts, addr)]
+        k = size.bit_length()
+        bin = self.bins[k]
+        del bin[bisect_left(bin, (size, addr) if self.bySize else addr)]
+        if not bin :
+            self.nonEmpty &= ~(1 << k)
+        return size
+
+    #lowest-address free block at or after lo with at least size bytes, or None
+    def __firstFit(self, size, lo) :
+        k = size.bit_length()
+        if k >= len(self.bins) :
+            #bigger than the whole heap
+            return None
+        best = None
+        #any block in a higher bin fits, so each non-empty one contributes its first block at or after lo
+        higher = self.nonEmpty >> (k + 1) << (k + 1)
+        while higher :
+            low = higher & -higher
+            higher ^= low
+            bin = self.bins[low.bit_length() - 1]
+            i = bisect_left(bin, lo) if lo > bin[0] else 0
+            if i < len(bin) and (best is None or bin[i] < best) :
+                best = bin[i]
+        #blocks in the request's own bin might be too small; only those below best are worth checking
+        bin = self.bins[k]
+        sizes = self.sizes
+        for i in range(bisect_left(bin, lo), len(bin)) :
+            addr = bin[i]
+            if best is not None and addr > best :
+                break
+            if sizes[addr] >= size :
+                best = addr
+                break
+        return best
+
+    #smallest free block with at least size bytes, the lowest-address one among equals, or None
+    def __bestFit(self, size) :
+        k = size.bit_length()
+        if k >= len(self.bins) :
+            return None
+        bin = self.bins[k]
+        i = bisect_left(bin, (size, -1))
+        if i < len(bin) :
+            return bin[i][1]
+        higher = self.nonEmpty >> (k + 1)
+        if higher :
+            #the lowest set bit is the smallest non-empty bin above the request's
+            return self.bins[k + (higher & -higher).bit_length()][0][1]
+        return None
+
+    def getBlock(self, size) :
+        if size < 0 :
+            raise RuntimeError("Cannot allocate " + str(size) + " bytes")
+        if self.policy == 'first' :
+            addr = self.__firstFit(size, self.startAddr)
+        elif self.policy == 'best' :
+            addr = self.__bestFit(size)
+        else :
+            addr = self.__firstFit(size, self.rover)
+            if addr is None :
+                addr = self.__firstFit(size, self.startAddr)
+
+        if addr is None :
+            raise RuntimeError("No free block available to allocate " + str(size) + " bytes")
+        if size == 0 :
+            #nothing to take; the block stays free (as with FreeList)
+            return (addr, size)
+
+        blockSize = self.sizes[addr]
+        rest = blockSize - size
+        if rest and not self.bySize and rest.bit_length() == blockSize.bit_length() :
+            #the rest of the block stays in the same bin, and in the same place in the address order
+            starts = self.starts
+            starts[bisect_left(starts, addr)] = addr + size
+            bin = self.bins[blockSize.bit_length()]
+            bin[bisect_left(bin, addr)] = addr + size
+            del self.sizes[addr]
+            self.sizes[addr + size] = rest
+        else :
+            self.__remove(addr)
+            if rest :
+                #free blocks never touch, so the rest of the block has nothing to merge with
+                self.__insert(addr + size, rest)
+        self.rover = addr + size
+        return (addr, size)
+
+    def releaseBlock(self, addr, size) :
+        if size == 0 :
+            return
+        starts = self.starts
+        sizes = self.sizes
+        i = bisect_left(starts, addr)
+
+        #merge with the next block if this block ends where it starts
+        if i < len(starts) and starts[i] == addr + size :
+            size += self.__remove(starts[i])
+        #and with the previous block if it ends where this block starts
+        if i > 0 and starts[i - 1] + sizes[starts[i - 1]] == addr :
+            prev = starts[i - 1]
+            size += self.__remove(prev)
+            addr = prev
+        self.__insert(addr, size)
+
+    #(address, size) of every free block, in address order
+    def blocks(self) :
+        return [(addr, self.sizes[addr]) for addr in self.starts]
+
+    def __str__ (self) :
+        return str(self.blocks())
+
 if __name__ == '__main__' :
     allocator = MemoryManager(0, 10)
     print(allocator)
@@ -90,4 +253,14 @@ if __name__ == '__main__' :
     allocator.free(addr2)
     print(allocator)
     allocator.free(addr1)
-    print(allocator)
\ No newline at end of file
+    print(allocator)
+
+    #a request bigger than the heap fails the same way under every policy
+    for policy in policies :
+        allocator = MemoryManager(0x10000000, 0x1000, policy)
+        try :
+            allocator.malloc(0x2000)
+        except RuntimeError as e :
+            print(policy + ": " + str(e))
+        else :
+            raise AssertionError(policy + " allocated a block bigger than the heap")
\ No newline at end of file
@@ -1,13 +1,24 @@
 import instructions
-import re
 from util import parseint
-import timingmodel
-import config
+import memory
 
 class Program :
     def __init__(self) :
         self.labels = {}
         self.code = {}
+        self.symbols = {} #reverse symbol table: address -> label, filled in by link
+        self.strings = {} #address -> string, written into memory when a machine loads the program
+        self.filename = None
+        self._source = None
+
+    #the program's assembly text, so a trace of the program can carry the program with it (see tracefile.py)
+    #programs assembled from a file only read it back when asked
+    @property
+    def source(self) :
+        if self._source is None and self.filename is not None :
+            with open(self.filename, 'r') as f :
+                self._source = f.read()
+        return self._source or ''
 
     #file format:
     #.section .text
@@ -16,58 +27,114 @@ class Program :
     #addr string
     #addr string
     #...
+    #lines can be any iterable, and are assembled in a single pass as they are read. Each instruction
+    #line is split once (see instructions.tokenize) and built by the class opCodeMap has for its opcode.
+    #Lines that fail to assemble are all reported together, with their line numbers, in a RuntimeError
     def buildCode(self, lines) :
+        if isinstance(lines, list) :
+            self._source = ''.join(line if line.endswith('\n') else line + '\n' for line in lines)
+        errors = []
         state = 0
-        for line in lines :
+        code = self.code
+        opCodeMap = instructions.opCodeMap
+        for number, line in enumerate(lines, 1) :
             l = line.strip()
             if ((l == "") or (l[0] == ';')) : continue
             # print ("line: " + l)
-            if (state == 0) :
-                if (l == ".section .text") :
-                    currAddr = config.machine.memory.text[0]
-                    state = 1
-            elif (state == 1) :
-                if (l == ".section .strings") :
-                    currAddr = config.machine.memory.strings[0]
-                    state = 2
-                else :                    
-                    currAddr = self.addInstr(l, currAddr)
-            elif (state == 2) :
-                self.addString(l)
+            try :
+                if (state == 1) :
+                    #a label names the address of the next instruction
+                    if (l[-1] == ':') :
+                        self.labels[l[:-1]] = currAddr
+                    elif (l == ".section .strings") :
+                        currAddr = memory.STRINGS[0]
+                        state = 2
+                    else :
+                        #an instruction, possibly followed by a comment
+                        if ';' in l :
+                            l = l[:l.index(';')]
+                        tokens = l.replace(',', ' ').split()
+                        cls = opCodeMap.get(tokens[0])
+                        if (cls is None) or (cls.operandCount != len(tokens) - 1) :
+                            #let buildInstruction report the problem
+                            instructions.buildInstruction(tokens[0], tokens[1:])
+                        code[currAddr] = cls.fromOperands(tokens[0], tokens[1:])
+                        currAddr += 4
+                elif (state == 0) :
+                    if (l == ".section .text") :
+                        currAddr = memory.TEXT[0]
+                        state = 1
+                elif (state == 2) :
+                    self.addString(l)
+            except (ValueError, KeyError, IndexError, TypeError) as e :
+                if isinstance(e, KeyError) :
+                    message = "unknown register " + str(e)
+                else :
+                    message = str(e)
+                errors.append("line " + str(number) + ": " + message + " (" + l + ")")
+                if (state == 1) :
+                    #keep the addresses of later instructions where they would have been
+                    currAddr += 4
+        if errors :
+            raise RuntimeError("Syntax error(s):\n" + "\n".join(errors))
+        self.link()
+
+    #resolve every label reference to its address, so control flow never looks labels up at run time,
+    #and build the reverse symbol table. All undefined labels are reported together
+    def link(self) :
+        self.symbols = {}
+        for label, addr in self.labels.items() :
+            #if several labels share an address, keep the first one defined
+            self.symbols.setdefault(addr, label)
+
+        unresolved = []
+        for addr in sorted(self.code) :
+            inst = self.code[addr]
+            try :
+                inst.link(self.labels)
+            except KeyError as e :
+                unresolved.append("'" + str(e.args[0]) + "' (" + str(inst) + " at " + hex(addr) + ")")
+        if unresolved :
+            raise RuntimeError("Undefined label(s): " + ", ".join(unresolved))
+
+    #run every instruction's static checks (register classes, immediate widths, offset limits) once,
+    #so execution does not have to repeat them. All failures are reported together
+    def verify(self) :
+        failures = []
+        for addr in sorted(self.code) :
+            inst = self.code[addr]
+            try :
+                inst.verify()
+            except (AssertionError, TypeError, ValueError) as e :
+                failures.append(hex(addr) + " (" + str(inst) + "): " + str(e))
+        assert not failures, "\n".join(failures)
 
+    #assemble a file, reading it a line at a time
     def buildCodeFromFile(self, filename) :
         with open(filename, 'r') as f:
-            lines = f.readlines()
-            self.buildCode(lines)
-
-    def addInstr(self, l, addr) :
-        #if it's a label, create an entry in the label dictionary, but don't bump the pointer
-        if (l[-1] == ':') :
-            #get label name:
-            label = re.match(r'(.+):', l)[1]
-            self.labels[label] = addr
-            return addr
-        else :
-            #otherwise parse the instruction and add it to the list
-            inst = instructions.parseInstruction(l)
-            # print ("Adding instruction: " + inst.opcode + " at address " + str(addr))
-            self.code[addr] = inst
-            return addr + 4
+            self.buildCode(f)
+        self.filename = filename
 
     def addString(self, l) :
-        match = re.match(r'(\S+) (.+)', l)
-        addr = parseint(match[1])
-        string = bytes(match[2][1:-1], 'utf-8').decode('unicode_escape')
-        config.machine.memory[addr] = string
-                
+        parts = l.split(None, 1)
+        if len(parts) != 2 :
+            raise ValueError("expected an address and a quoted string")
+        addr = parseint(parts[0])
+        string = bytes(parts[1][1:-1], 'utf-8').decode('unicode_escape')
+        self.strings[addr] = string
+
 
 ### TEST ###
 if __name__ == '__main__' :
+    from machine import Machine
+    import timingmodel
+
     p = Program()
     p.buildCodeFromFile('testFile.asm')
     print(p.code)
 
-    config.machine.timingModel = timingmodel.basicTimingModel()
+    m = Machine(numIntRegisters = 256, numFloatRegisters = 256, timingModel = timingmodel.basicTimingModel)
+    m.loadProgram(p)
 
     print (p.labels)
 
@@ -75,7 +142,7 @@ if __name__ == '__main__' :
     pc = 0
     while (pc in p.code) :
         print (p.code[pc])
-        p.code[pc].exec()
+        p.code[pc].exec(m)
         pc += 4
 
-    print(config.machine.timingModel.getTotalTime())
\ No newline at end of file
+    print(m.timingModel.getTotalTime())
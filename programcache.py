@@ -0,0 +1,103 @@
+import program
+import hashlib
+import os
+import pickle
+
+#on-disk cache of assembled programs, so re-simulating the same assembly file skips parsing it
+#
+#entries are keyed on a hash of the file's contents together with VERSION, a hash of the simulator
+#sources that decide what a parsed program looks like, so editing either one invalidates the entry.
+#Each entry is the pickled Program (instructions with their decoded operands and linked targets,
+#labels, symbols, strings). Using an entry refreshes its modification time; when the cache grows past
+#maxBytes, the entries used least recently are deleted
+
+#modules whose code determines the contents of a parsed Program
+_parserModules = ('program.py', 'instructions.py', 'registers.py', 'util.py', 'memory.py', 'programcache.py')
+
+def _version() :
+    h = hashlib.sha256()
+    root = os.path.dirname(os.path.abspath(__file__))
+    for name in _parserModules :
+        with open(os.path.join(root, name), 'rb') as f :
+            h.update(f.read())
+    return h.hexdigest()
+
+VERSION = _version()
+
+class ProgramCache :
+    def __init__(self, directory, maxBytes = 64 * 1024 * 1024) :
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok = True)
+
+    def __path(self, key) :
+        return os.path.join(self.directory, key + '.prog')
+
+    #the Program in filename, from the cache if it holds one for the file's current contents
+    def load(self, filename) :
+        with open(filename, 'rb') as f :
+            text = f.read()
+        key = hashlib.sha256(VERSION.encode() + b'\0' + text).hexdigest()
+        path = self.__path(key)
+
+        try :
+            with open(path, 'rb') as f :
+                p = pickle.load(f)
+            os.utime(path)
+            self.hits += 1
+            return p
+        except FileNotFoundError :
+            pass
+        except Exception :
+            #an unreadable entry (e.g. truncated by a crash) is simply rebuilt
+            pass
+
+        self.misses += 1
+        p = program.Program()
+        p.buildCode(text.decode('utf-8').splitlines())
+        self.__store(path, p)
+        return p
+
+    def __store(self, path, p) :
+        #write under a temporary name and rename, so concurrent readers never see half an entry
+        temp = path + '.' + str(os.getpid()) + '.tmp'
+        with open(temp, 'wb') as f :
+            pickle.dump(p, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, path)
+        self.__evict()
+
+    #delete least recently used entries until the cache fits in maxBytes
+    def __evict(self) :
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory) :
+            if entry.name.endswith('.prog') :
+                try :
+                    st = entry.stat()
+                except FileNotFoundError :
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+        entries.sort()
+        for mtime, size, path in entries :
+            if total <= self.maxBytes :
+                break
+            try :
+                os.remove(path)
+            except FileNotFoundError :
+                pass
+            total -= size
+
+#the directory named by RISCSIM_PROGRAM_CACHE, if set
+def defaultDirectory() :
+    return os.environ.get('RISCSIM_PROGRAM_CACHE')
+
+#read filename into a Program, through a ProgramCache in directory if one is given
+def loadProgram(filename, directory = None) :
+    if directory :
+        return ProgramCache(directory).load(filename)
+    p = program.Program()
+    p.buildCodeFromFile(filename)
+    return p
@@ -1,23 +1,118 @@
-numIntRegisters = 64 #TODO: make this a configurable number, at least 32
-numFloatRegisters = 64 #TODO: make this a configurable number, at least 32
-numRegisters = numIntRegisters + numFloatRegisters
+import re
 
+#registers live in two flat lists (one integer, one floating point) indexed by register number
+#the integer list carries one extra slot at the end that soaks up writes to x0, so x0 always reads as 0
+X0_SINK = -1
+
+#standard integer register aliases
+intAliases = {'zero' : 0, 'ra' : 1, 'sp' : 2, 'gp' : 3, 'tp' : 4, 't0' : 5, 't1' : 6, 't2' : 7, 's0' : 8, 'fp' : 8, 's1' : 9}
+for i in range(0, 8) :
+    intAliases['a' + str(i)] = 10 + i
+for i in range(2, 12) :
+    intAliases['s' + str(i)] = 16 + i
+for i in range(3, 7) :
+    intAliases['t' + str(i)] = 25 + i
+
+#standard floating point register aliases
+floatAliases = {'fs0' : 8, 'fs1' : 9}
+for i in range(0, 8) :
+    floatAliases['ft' + str(i)] = i
+for i in range(0, 8) :
+    floatAliases['fa' + str(i)] = 10 + i
+for i in range(2, 12) :
+    floatAliases['fs' + str(i)] = 16 + i
+for i in range(8, 12) :
+    floatAliases['ft' + str(i)] = 20 + i
+
+#raw names (x<n>, f<n>) and the aliases for any registers beyond the first 32 (t7, t8, ... and ft12, ft13, ...)
+_numberedRegister = re.compile(r'(x|f|t|ft)(0|[1-9][0-9]*)$')
+
+_decoded = {}
+
+#turn a register name into a (type, index) pair, where type is int or float
+#this does not know how many registers the machine has; RegisterFile.check does the bounds check
+def decodeRegister(name) :
+    try :
+        return _decoded[name]
+    except KeyError :
+        pass
+
+    if name in intAliases :
+        reg = (int, intAliases[name])
+    elif name in floatAliases :
+        reg = (float, floatAliases[name])
+    else :
+        match = _numberedRegister.match(name)
+        if match is None :
+            raise KeyError(name)
+        prefix, num = match[1], int(match[2])
+        if prefix == 'x' :
+            reg = (int, num)
+        elif prefix == 'f' :
+            reg = (float, num)
+        elif prefix == 't' and num >= 7 :
+            reg = (int, 32 + num - 7)
+        elif prefix == 'ft' and num >= 12 :
+            reg = (float, 32 + num - 12)
+        else :
+            raise KeyError(name)
+
+    _decoded[name] = reg
+    return reg
+
+#same as decodeRegister, but for registers that are written: x0 is redirected to the write sink
+def decodeDestination(name) :
+    reg = decodeRegister(name)
+    if reg == (int, 0) :
+        return (int, X0_SINK)
+    return reg
+
+class RegisterFile :
+    def __init__(self, numIntRegisters, numFloatRegisters) :
+        self.numIntRegisters = numIntRegisters
+        self.numFloatRegisters = numFloatRegisters
+        self.intRegisters = [0] * (numIntRegisters + 1) #last slot is the x0 write sink
+        self.floatRegisters = [0.0] * numFloatRegisters
+        self.registers = {int : self.intRegisters, float : self.floatRegisters}
+
+    #make sure a decoded register exists on this machine
+    def check(self, name, reg) :
+        regtype, index = reg
+        limit = self.numIntRegisters if regtype == int else self.numFloatRegisters
+        if (index != X0_SINK) and (index >= limit) :
+            raise KeyError(name)
+
+    #look up a register by name; slow path meant for tests and debugging
+    def __getitem__(self, name) :
+        reg = decodeRegister(name)
+        self.check(name, reg)
+        if reg[0] == int :
+            return IRegister(name, self.intRegisters, reg[1])
+        else :
+            return FRegister(name, self.floatRegisters, reg[1])
+
+#a named view onto one slot of a register file
 class Register :
-    def __init__(self) :
-        self.value = None
-        self.name = None
+    def __init__(self, name, values, index) :
+        self.values = values
+        self.index = index
+        self.name = name
         self.type = None
 
+    @property
+    def value(self) :
+        return self.values[self.index]
+
     def read(self) :
-        return self.value
+        return self.values[self.index]
 
     def write(self, value) :
-        if (self.name == 'x0') :
+        if (self.type == int and self.index == 0) :
             pass
         elif (type(value) != self.type) :
             raise(TypeError('Writing data of type ' + str(type(value)) + ' to register ' + self.name + ' which holds type ' + str(self.type)))
         else :
-            self.value = value
+            self.values[self.index] = value
 
     def __repr__(self) :
         return 'Register ' + self.name
@@ -26,26 +121,24 @@ class Register :
         return str(self.value)
 
 class IRegister(Register) :
-    def __init__(self, name) :
-        super().__init__()
-        self.value = 0
-        self.name = name
+    def __init__(self, name, values, index) :
+        super().__init__(name, values, index)
         self.type = int
 
 class FRegister(Register) :
-    def __init__(self, name) :
-        super().__init__()
-        self.value = 0.0
-        self.name = name
+    def __init__(self, name, values, index) :
+        super().__init__(name, values, index)
         self.type = float
 
 
 if __name__ == '__main__' :
-    print(numRegisters)
-    print(registerFile)
+    registerFile = RegisterFile(64, 64)
 
     registerFile['t3'].write(4)
     print(registerFile['x28']) #should print 4
 
     registerFile['f3'].write(5.0)
-    print(registerFile['ft3']) #should print 5.0
\ No newline at end of file
+    print(registerFile['ft3']) #should print 5.0
+
+    registerFile['zero'].write(5)
+    print(registerFile['x0']) #should print 0
@@ -0,0 +1,67 @@
+import tracefile
+import program
+import machine
+import driver
+import multiprocessing
+import argparse
+import sys
+
+#time a trace recorded with driver.py --trace under a timing model, without simulating the program again
+#returns the total time and the model's statistics lines
+def replayTrace(path, timingModel) :
+    reader = tracefile.TraceReader(path)
+    try :
+        p = program.Program()
+        p.buildCode(reader.source.splitlines())
+        m = machine.Machine(numIntRegisters = 256, numFloatRegisters = 256, timingModel = timingModel)
+        m.prog = p
+        tracefile.replayInto(reader, p, m.timingModel)
+    finally :
+        reader.close()
+    return m.timingModel.getTotalTime(), m.timingModel.getStats(m)
+
+#label for a replay: the timing model and the timing options of args that differ from defaults
+def describe(args, defaults) :
+    changed = ["{}={}".format(name, value) for name, value in sorted(vars(args).items())
+               if name in vars(defaults) and name != 'timing' and value != vars(defaults)[name]]
+    return ' '.join(["timing=" + args.timing] + changed)
+
+if __name__ == '__main__' :
+
+    parser = argparse.ArgumentParser("Replay a recorded trace under one or more timing models",add_help=True,
+                                     epilog="To replay several configurations, separate their timing options with '+', e.g. "
+                                            "trace.bin -t cache --l1 1024,2,32 + -t cache --l1 2048,2,32 + -t pipeline")
+    parser.add_argument("trace", help="trace file written by driver.py --trace")
+    parser.add_argument("-m", dest="stats", action="store_true", default=False,
+                        help="show timing model statistics")
+    parser.add_argument("-j", dest="jobs", type=int, default=None,
+                        help="number of replays to run at once (default: one per CPU)")
+    driver.addTimingOptions(parser)
+
+    #the first configuration comes with the other options; each after a '+' is the timing options alone
+    groups = [[]]
+    for arg in sys.argv[1:] :
+        if arg == '+' :
+            groups.append([])
+        else :
+            groups[-1].append(arg)
+    args = parser.parse_args(groups[0])
+    timingParser = argparse.ArgumentParser(parser.prog, add_help=False)
+    driver.addTimingOptions(timingParser)
+    defaults = timingParser.parse_args([])
+    configs = [args] + [timingParser.parse_args(group) for group in groups[1:]]
+    configs = [(describe(config, defaults), driver.buildTimingModel(config)) for config in configs]
+
+    if len(configs) == 1 or args.jobs == 1 :
+        results = [replayTrace(args.trace, timingModel) for _, timingModel in configs]
+    else :
+        with multiprocessing.Pool(args.jobs) as pool :
+            results = pool.starmap(replayTrace, [(args.trace, timingModel) for _, timingModel in configs])
+
+    for (description, _), (totalTime, stats) in zip(configs, results) :
+        if len(configs) > 1 :
+            print("== " + description + " ==")
+        print("Execution time: " + str(totalTime) + " cycles")
+        if args.stats :
+            for line in stats :
+                print(line)
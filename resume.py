@@ -0,0 +1,35 @@
+import checkpoint
+import machine
+import engines
+import driver
+import argparse
+
+#continue a run from a checkpoint saved with driver.py --checkpoint
+
+if __name__ == '__main__' :
+
+    parser = argparse.ArgumentParser("Resume a run from a checkpoint",add_help=True)
+    parser.add_argument("checkpoint", help="checkpoint file written by driver.py --checkpoint")
+    parser.add_argument("-m", dest="memuse", action="store_true", default=False,
+                        help="show memory usage")
+    parser.add_argument("-e", dest="engine", choices=sorted(engines.engineMap), default="interpreter",
+                        help="execution engine to simulate with (default: interpreter)")
+    parser.add_argument("--input", dest="input", metavar="FILE",
+                        help="read the rest of the program's input from FILE, from its first line, instead of the lines stdin has left")
+    parser.add_argument("--retime", dest="retime", action="store_true", default=False,
+                        help="time the rest of the run with the timing options given here, starting from 0 cycles, instead of the checkpoint's model")
+    driver.addTimingOptions(parser)
+
+    args = parser.parse_args()
+
+    cp = checkpoint.load(args.checkpoint)
+    stdin = open(args.input, 'r') if args.input else None
+    m = machine.Machine(numIntRegisters = cp.numIntRegisters, numFloatRegisters = cp.numFloatRegisters, stdin = stdin)
+    m.restore(cp)
+    if args.input :
+        m.input.next = 0
+    if args.retime :
+        m.timingModel = driver.buildTimingModel(args)()
+
+    m.resume(args.engine)
+    m.printStats(args.memuse)
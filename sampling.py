@@ -0,0 +1,246 @@
+import copy
+import math
+import engines
+import instructions
+import timingmodel
+
+#sampled simulation: most of a run is simulated functionally, under defaultTimingModel, which the
+#compiled engines do not call at all; only chosen parts are simulated under the detailed timing model,
+#and the cycles for the whole program are extrapolated from them
+#
+#the detailed parts are either
+#  periodic samples: every period instructions, warmup instructions that only bring the detailed model's
+#    caches and predictors up to date, then sample instructions that are measured
+#  regions of interest: from each ROI.BEGIN instruction (or begin label) to the next ROI.END (or end
+#    label); every pass through a region is a sample
+#the detailed model keeps its state between samples. Each sample gives a CPI, and the estimate is the
+#ratio of measured cycles to measured instructions times the instructions in the whole run, with a 95%
+#confidence interval from the spread of the samples
+
+BEGIN = 'begin'
+END = 'end'
+
+#two-sided 95% critical values of Student's t by degrees of freedom; 1.96 beyond the table
+_t95 = {1 : 12.71, 2 : 4.30, 3 : 3.18, 4 : 2.78, 5 : 2.57, 6 : 2.45, 7 : 2.36, 8 : 2.31, 9 : 2.26, 10 : 2.23,
+        12 : 2.18, 15 : 2.13, 20 : 2.09, 25 : 2.06, 30 : 2.04}
+
+def _critical(df) :
+    if df > 30 :
+        return 1.96
+    return _t95[max(k for k in _t95 if k <= df)]
+
+#stands in for an instruction where detailed timing starts or stops: runs it, then ends the engine's run
+#(by returning -1, as HALT does) so the sampled run can switch timing models, and records where to go on
+class Trigger(instructions.Instruction) :
+    endsBlock = True
+
+    def __init__(self, inst, action, run) :
+        super().__init__(inst.opcode)
+        self.inst = inst
+        self.action = action
+        self.sampledRun = run
+
+    def exec(self, machine) :
+        self.inst.exec(machine)
+        self.sampledRun.hit = (self.action, machine.pc)
+        machine.pc = -1
+
+    def compile(self, machine, pc) :
+        inner = self.inst.compile(machine, pc)
+        sampledRun = self.sampledRun
+        action = self.action
+
+        def run() :
+            sampledRun.hit = (action, inner())
+            return -1
+        run.timed = getattr(inner, 'timed', False)
+        return run
+
+    def cost(self, timingModel) :
+        return self.inst.cost(timingModel)
+
+    def verify(self) :
+        self.inst.verify()
+
+    def sources(self) :
+        return self.inst.sources()
+
+    def destinations(self) :
+        return self.inst.destinations()
+
+    def __str__(self) :
+        return str(self.inst)
+
+#the outcome of a sampled run
+class Estimate :
+    def __init__(self, instructions, samples, warmupInstructions) :
+        self.instructions = instructions #executed in the whole run
+        self.samples = samples #(instructions, cycles) measured in detail
+        self.warmupInstructions = warmupInstructions
+
+    @property
+    def measuredInstructions(self) :
+        return sum(n for n, c in self.samples)
+
+    @property
+    def measuredCycles(self) :
+        return sum(c for n, c in self.samples)
+
+    @property
+    def cpi(self) :
+        measured = self.measuredInstructions
+        return self.measuredCycles / measured if measured else 0.0
+
+    @property
+    def cycles(self) :
+        return self.cpi * self.instructions
+
+    #half the width of the 95% confidence interval of cycles, or None with fewer than two samples
+    @property
+    def errorBound(self) :
+        k = len(self.samples)
+        if k < 2 :
+            return None
+        cpi = self.cpi
+        meanInstructions = self.measuredInstructions / k
+        #standard error of a ratio estimator
+        variance = sum((c - cpi * n) ** 2 for n, c in self.samples) / (k - 1)
+        stderr = math.sqrt(variance / k) / meanInstructions
+        return _critical(k - 1) * stderr * self.instructions
+
+    def getStats(self) :
+        lines = ["Instructions: {} executed, {} measured in detail ({:.2f}%), {} warming up".format(
+                    self.instructions, self.measuredInstructions, 100.0 * self.measuredInstructions / self.instructions if self.instructions else 0.0,
+                    self.warmupInstructions)]
+        lines.append("Samples: {}, {} cycles measured, CPI {:.4f}".format(len(self.samples), self.measuredCycles, self.cpi))
+        bound = self.errorBound
+        if not self.samples :
+            lines.append("No samples were measured in detail, so there is no estimate")
+        elif bound is None :
+            lines.append("Estimated execution time: {:.0f} cycles (too few samples for an error bound)".format(self.cycles))
+        else :
+            lines.append("Estimated execution time: {:.0f} +/- {:.0f} cycles (95% confidence, {:.2f}%)".format(
+                    self.cycles, bound, 100.0 * bound / self.cycles if self.cycles else 0.0))
+        return lines
+
+#runs programs on machine with detailed timing under machine.timingModel for the chosen parts only
+#give period (with warmup and sample, warmup + sample <= period) for periodic sampling; otherwise the
+#ROI markers and the labels in begins and ends decide what is timed in detail
+class SampledRun :
+    def __init__(self, machine, engine = 'translator', period = 0, warmup = 0, sample = 0, begins = (), ends = ()) :
+        assert (not period) or (warmup + sample <= period and sample > 0), "Need 0 < sample and warmup + sample <= period"
+        self.machine = machine
+        self.engine = engine
+        self.period = period
+        self.warmup = warmup
+        self.sample = sample
+        self.begins = list(begins)
+        self.ends = list(ends)
+        self.hit = None
+
+    #the program with its ROI markers and begin/end labels replaced by Triggers
+    def __instrument(self, p) :
+        q = copy.copy(p)
+        q.code = dict(p.code)
+        for addr, inst in p.code.items() :
+            if inst.opcode == 'ROI.BEGIN' :
+                q.code[addr] = Trigger(inst, BEGIN, self)
+            elif inst.opcode == 'ROI.END' :
+                q.code[addr] = Trigger(inst, END, self)
+        for labels, action in ((self.begins, BEGIN), (self.ends, END)) :
+            for label in labels :
+                addr = p.labels[label]
+                q.code[addr] = Trigger(p.code[addr], action, self)
+        return q
+
+    #run from machine.pc under mode ('functional' or 'detailed') until HALT, a trigger, or count
+    #instructions (None for no limit); returns (instructions executed, whether the program reached HALT)
+    def __advance(self, mode, count) :
+        machine = self.machine
+        machine.timingModel = self.models[mode]
+        engine = self.engines.get(mode)
+        if engine is None :
+            engine = self.engines[mode] = engines.engineMap[self.engine](machine)
+        self.hit = None
+        #a limit is always set, so the engine counts what it runs
+        machine.instructionLimit = count if count is not None else float('inf')
+        try :
+            engine.run()
+            executed = engine.executed
+        except engines.InstructionLimitExceeded :
+            executed = engine.executed
+            if executed == 0 :
+                #the translator stops before a block that would go over; run the instructions singly instead
+                exact = self.exact.get(mode)
+                if exact is None :
+                    exact = self.exact[mode] = engines.ClosureEngine(machine)
+                try :
+                    exact.run()
+                except engines.InstructionLimitExceeded :
+                    pass
+                executed = exact.executed
+            return executed, False
+        finally :
+            machine.instructionLimit = None
+        if self.hit is not None :
+            machine.pc = self.hit[1]
+            return executed, machine.pc == -1
+        return executed, True
+
+    def run(self, p, checked = False) :
+        machine = self.machine
+        detailed = machine.timingModel
+        self.models = {'functional' : timingmodel.defaultTimingModel(), 'detailed' : detailed}
+        self.engines = {}
+        self.exact = {}
+        machine.start(self.__instrument(p) if not self.period else p, checked)
+        try :
+            if self.period :
+                estimate = self.__periodic(detailed)
+            else :
+                estimate = self.__regions(detailed)
+        finally :
+            machine.timingModel = detailed
+            machine.output.flush()
+        return estimate
+
+    def __periodic(self, detailed) :
+        total = 0
+        warmed = 0
+        samples = []
+        phases = (('functional', self.period - self.warmup - self.sample), ('detailed', self.warmup), ('detailed', self.sample))
+        while True :
+            for n, (mode, count) in enumerate(phases) :
+                if count == 0 :
+                    continue
+                before = detailed.getTotalTime()
+                executed, halted = self.__advance(mode, count)
+                total += executed
+                if n == 1 :
+                    warmed += executed
+                elif n == 2 and executed :
+                    samples.append((executed, detailed.getTotalTime() - before))
+                if halted :
+                    return Estimate(total, samples, warmed)
+
+    def __regions(self, detailed) :
+        total = 0
+        samples = []
+        mode = 'functional'
+        inRegion = 0
+        start = 0
+        while True :
+            executed, halted = self.__advance(mode, None)
+            total += executed
+            if mode == 'detailed' :
+                inRegion += executed
+            action = self.hit[0] if self.hit is not None else None
+            if mode == 'functional' and action == BEGIN :
+                mode = 'detailed'
+                inRegion = 0
+                start = detailed.getTotalTime()
+            elif mode == 'detailed' and (action == END or halted) :
+                samples.append((inRegion, detailed.getTotalTime() - start))
+                mode = 'functional'
+            if halted :
+                return Estimate(total, samples, 0)
@@ -1,4 +1,12 @@
+import cache
+import branchpredictor
+
 class defaultTimingModel :
+    #a static model charges each instruction a fixed number of cycles that only depends on the instruction,
+    #so engines can bake the costs in at decode time (see latency). Models whose charges depend on anything
+    #else -- addresses, history, other instructions -- must set dynamic so every exec/cacheExec call is made
+    dynamic = False
+
     def __init__(self) :
         self.elapsedTime = 0
         pass
@@ -6,12 +14,25 @@ class defaultTimingModel :
     def exec(self, inst) :
         pass
 
+    #cycles exec/cacheExec charge for inst in a static model
+    def latency(self, inst) :
+        return 0
+
     def cacheExec(self, inst, address) :
         pass
 
+    #called after a branch or jump at pc transfers control to nextPc; only dynamic models see these
+    #in compiled code
+    def branchExec(self, inst, pc, nextPc) :
+        pass
+
     def getTotalTime(self) :
         return self.elapsedTime
 
+    #extra lines to print along with the memory usage statistics of machine
+    def getStats(self, machine) :
+        return []
+
 class basicTimingModel(defaultTimingModel) :
     def __init__(self) :
         self.timingMap = {}
@@ -19,14 +40,14 @@ class basicTimingModel(defaultTimingModel) :
         self.elapsedTime = 0
 
     def exec(self, inst) :
-        try :
-            self.elapsedTime += self.timingMap[inst.opcode]
-        except KeyError :
-            self.elapsedTime += 1
+        self.elapsedTime += self.timingMap.get(inst.opcode, 1)
 
     def cacheExec(self, inst, address) :
         self.exec(inst)
 
+    def latency(self, inst) :
+        return self.timingMap.get(inst.opcode, 1)
+
     def __initTimingMap(self) :
         self.timingMap['SUB'] = 2
         self.timingMap['MUL'] = 3
@@ -51,6 +72,156 @@ class basicTimingModel(defaultTimingModel) :
         self.timingMap['IMOVF.S'] = 4
         self.timingMap['HALT'] = 0
 
+#basic timing, except that loads and stores go through a cache hierarchy: each access costs the hit latency
+#of every level it reaches, plus memoryLatency if it misses in all of them
+#l1 and l2 are keyword arguments for cache.Cache; pass l2 = None for a single-level hierarchy
+class cacheTimingModel(basicTimingModel) :
+    dynamic = True
+
+    def __init__(self, l1 = None, l2 = None, memoryLatency = 100) :
+        super().__init__()
+        if l1 is None :
+            l1 = {'name' : 'L1', 'size' : 32 * 1024, 'associativity' : 4, 'lineSize' : 64, 'policy' : cache.LRU, 'hitLatency' : 1}
+        if l2 is None :
+            l2 = {'name' : 'L2', 'size' : 256 * 1024, 'associativity' : 8, 'lineSize' : 64, 'policy' : cache.LRU, 'hitLatency' : 10}
+        self.levels = [cache.Cache(**l1)]
+        if l2 :
+            self.levels.append(cache.Cache(**l2))
+        self.memoryLatency = memoryLatency
+        self.memoryAccesses = 0
+
+    def cacheExec(self, inst, address) :
+        for level in self.levels :
+            self.elapsedTime += level.hitLatency
+            if level.access(address) :
+                return
+        self.memoryAccesses += 1
+        self.elapsedTime += self.memoryLatency
+
+    def getStats(self, machine) :
+        return [level.getStats() for level in self.levels] + ["Main memory: {} accesses".format(self.memoryAccesses)]
+
+#basic timing plus a branch unit (see branchpredictor.BranchUnit): every mispredicted branch, return or
+#indirect jump costs the unit's penalty on top of the basic latencies
+class branchTimingModel(basicTimingModel) :
+    dynamic = True
+
+    def __init__(self, branchUnit = None) :
+        super().__init__()
+        self.branchUnit = branchUnit if branchUnit is not None else branchpredictor.BranchUnit()
+
+    def branchExec(self, inst, pc, nextPc) :
+        self.elapsedTime += self.branchUnit.resolve(inst, pc, nextPc)
+
+    def getStats(self, machine) :
+        return self.branchUnit.getStats(machine.prog.symbols)
+
+#in-order pipeline with a register scoreboard: up to issueWidth instructions issue per cycle, in program
+#order, and an instruction cannot issue until every register it reads is ready. A result is ready
+#latency cycles after its producer issues (the basic model's latency), plus writebackDelay more cycles
+#when forwarding is off, since the consumer then has to wait for the register file write
+#total time is the cycle the last result is ready
+#conditional branches do not charge the timing model, so they are issued from branchExec instead, waiting
+#on the registers they compare like any other instruction; other instructions that do not charge it (I/O)
+#issue for free. With a branch unit, a misprediction also holds up issue for the unit's penalty
+class pipelineTimingModel(basicTimingModel) :
+    dynamic = True
+
+    def __init__(self, issueWidth = 1, forwarding = True, writebackDelay = 2, branchUnit = None) :
+        super().__init__()
+        self.branchUnit = branchUnit
+        assert issueWidth >= 1, "Issue width must be at least 1"
+        self.issueWidth = issueWidth
+        self.forwarding = forwarding
+        self.writebackDelay = writebackDelay
+        #cycle the next instruction may issue in, and how many have issued in it so far
+        self.cycle = 0
+        self.issued = 0
+        #ready cycle of each register, indexed by 2 * index for ints and 2 * index + 1 for floats
+        self.ready = []
+        #instruction -> (source slots, destination slots, cycles until the result can be used)
+        self.decoded = {}
+        self.stalls = 0
+        self.instructions = 0
+
+    def __decode(self, inst) :
+        latency = self.latency(inst)
+        if not self.forwarding :
+            latency += self.writebackDelay
+        srcs = tuple(2 * index + (regtype is float) for _, (regtype, index) in inst.sources())
+        #x0 writes go to the sink and never make anything wait
+        dsts = tuple(2 * index + (regtype is float) for _, (regtype, index) in inst.destinations() if index >= 0)
+        top = max(srcs + dsts, default = -1)
+        if top >= len(self.ready) :
+            self.ready.extend([0] * (top + 1 - len(self.ready)))
+        entry = self.decoded[inst] = (srcs, dsts, latency)
+        return entry
+
+    def exec(self, inst) :
+        entry = self.decoded.get(inst)
+        if entry is None :
+            entry = self.__decode(inst)
+        srcs, dsts, latency = entry
+        ready = self.ready
+        cycle = self.cycle
+
+        #earliest slot in program order, then wait for the operands
+        if self.issued == self.issueWidth :
+            cycle += 1
+            self.issued = 0
+        start = cycle
+        for s in srcs :
+            if ready[s] > start :
+                start = ready[s]
+        if start > cycle :
+            self.stalls += start - cycle
+            cycle = start
+            self.issued = 0
+        self.issued += 1
+        self.cycle = cycle
+        self.instructions += 1
+
+        done = cycle + latency
+        for d in dsts :
+            ready[d] = done
+        if done > self.elapsedTime :
+            self.elapsedTime = done
+
+    def cacheExec(self, inst, address) :
+        self.exec(inst)
+
+    def branchExec(self, inst, pc, nextPc) :
+        #jumps and calls have already issued through exec
+        if not inst.timed :
+            self.exec(inst)
+        if self.branchUnit is None :
+            return
+        penalty = self.branchUnit.resolve(inst, pc, nextPc)
+        if penalty :
+            #nothing issues for penalty cycles while the right path is fetched
+            self.cycle += penalty
+            self.issued = 0
+            self.stalls += penalty
+
+    #the decode cache is keyed by the program's instructions, so a copy or pickle of the model (for a
+    #checkpoint, say) starts it empty instead of carrying copies of them that the live program never hits
+    def __getstate__(self) :
+        state = dict(self.__dict__)
+        state['decoded'] = {}
+        return state
 
+    def getStats(self, machine) :
+        ipc = (self.instructions / self.elapsedTime) if self.elapsedTime else 0.0
+        lines = ["Pipeline: {} instructions issued, {} stall cycles; {:.2f} IPC".format(self.instructions, self.stalls, ipc)]
+        if self.branchUnit is not None :
+            lines += self.branchUnit.getStats(machine.prog.symbols)
+        return lines
 
-        
\ No newline at end of file
+#timing models selectable by name (see driver.py -t)
+timingModelMap = {
+    'none' : defaultTimingModel,
+    'basic' : basicTimingModel,
+    'cache' : cacheTimingModel,
+    'branch' : branchTimingModel,
+    'pipeline' : pipelineTimingModel,
+}
@@ -0,0 +1,155 @@
+from array import array
+import struct
+import sys
+import timingmodel
+
+#execution traces: the stream of calls a run makes into its timing model, saved so the same run can be
+#timed again under other models without simulating it (see replay.py)
+#
+#file format: MAGIC, one byte for the byte order of the arrays ('<' or '>'), the length of the program
+#source as a 4-byte little-endian int, and the source itself (utf-8), so a trace can be replayed on
+#its own. Then chunks, each a 4-byte little-endian event count n followed by three arrays of n entries:
+#  slots  (uint32) pc of the instruction, with bit 0 set if the call came from the instruction it
+#                  delegates to (the JAL inside J and JR, the JALR inside RET)
+#  kinds  (uint8)  EXEC, CACHE or BRANCH: which timing model method was called
+#  values (int64)  the address for CACHE, the pc control went to for BRANCH, 0 for EXEC
+#whether a branch was taken is nextPc != pc + 4
+
+MAGIC = b'RVTRACE1'
+
+EXEC = 0
+CACHE = 1
+BRANCH = 2
+
+#the instruction a composite instruction (J, JR, RET) hands its work to, or None
+def delegate(inst) :
+    return getattr(inst, '_jal', None) or getattr(inst, '_jalr', None)
+
+#wraps the machine's timing model for one run: every call is passed on to the wrapped model and
+#recorded. It is dynamic so that the engines make every call, even when the wrapped model is not
+class TraceRecorder(timingmodel.defaultTimingModel) :
+    dynamic = True
+
+    def __init__(self, model, prog, path, chunkSize = 1 << 16) :
+        self.model = model
+        self.chunkSize = chunkSize
+        #instruction object -> slot; delegates get their own entry since they make the calls themselves
+        self.slots = {}
+        for pc, inst in prog.code.items() :
+            self.slots[inst] = pc
+            inner = delegate(inst)
+            if inner is not None :
+                self.slots[inner] = pc | 1
+        self.__reset()
+
+        self.file = open(path, 'wb')
+        source = prog.source.encode('utf-8')
+        self.file.write(MAGIC + (b'<' if sys.byteorder == 'little' else b'>') + struct.pack('<I', len(source)) + source)
+
+    def __reset(self) :
+        self.pcs = array('I')
+        self.kinds = bytearray()
+        self.values = array('q')
+
+    def __flush(self) :
+        if len(self.kinds) :
+            self.file.write(struct.pack('<I', len(self.kinds)))
+            self.file.write(self.pcs.tobytes())
+            self.file.write(self.kinds)
+            self.file.write(self.values.tobytes())
+            self.__reset()
+
+    def __record(self, slot, kind, value) :
+        self.pcs.append(slot)
+        self.kinds.append(kind)
+        self.values.append(value)
+        if len(self.kinds) >= self.chunkSize :
+            self.__flush()
+
+    def exec(self, inst) :
+        self.__record(self.slots[inst], EXEC, 0)
+        self.model.exec(inst)
+
+    def cacheExec(self, inst, address) :
+        self.__record(self.slots[inst], CACHE, address)
+        self.model.cacheExec(inst, address)
+
+    def branchExec(self, inst, pc, nextPc) :
+        self.__record(self.slots[inst], BRANCH, nextPc)
+        self.model.branchExec(inst, pc, nextPc)
+
+    def latency(self, inst) :
+        return self.model.latency(inst)
+
+    #engines add to elapsedTime directly, so it has to be the wrapped model's
+    @property
+    def elapsedTime(self) :
+        return self.model.elapsedTime
+
+    @elapsedTime.setter
+    def elapsedTime(self, value) :
+        self.model.elapsedTime = value
+
+    def getTotalTime(self) :
+        return self.model.getTotalTime()
+
+    def getStats(self, machine) :
+        return self.model.getStats(machine)
+
+    def close(self) :
+        self.__flush()
+        self.file.close()
+
+#reads a trace file written by TraceRecorder
+class TraceReader :
+    def __init__(self, path) :
+        self.file = open(path, 'rb')
+        magic = self.file.read(len(MAGIC))
+        if magic != MAGIC :
+            raise RuntimeError(path + " is not a trace file")
+        self.swap = self.file.read(1) != (b'<' if sys.byteorder == 'little' else b'>')
+        length, = struct.unpack('<I', self.file.read(4))
+        #program source the trace was recorded from
+        self.source = self.file.read(length).decode('utf-8')
+
+    #yields (slots, kinds, values) arrays, one chunk at a time
+    def chunks(self) :
+        while True :
+            header = self.file.read(4)
+            if not header :
+                return
+            n, = struct.unpack('<I', header)
+            pcs = array('I')
+            pcs.frombytes(self.file.read(4 * n))
+            kinds = self.file.read(n)
+            values = array('q')
+            values.frombytes(self.file.read(8 * n))
+            if self.swap :
+                pcs.byteswap()
+                values.byteswap()
+            yield pcs, kinds, values
+
+    def close(self) :
+        self.file.close()
+
+#feed every event read by reader to model, using the instructions of prog (built from the trace's
+#source) in place of the ones that made the calls
+def replayInto(reader, prog, model) :
+    insts = {}
+    for pc, inst in prog.code.items() :
+        insts[pc] = inst
+        inner = delegate(inst)
+        if inner is not None :
+            insts[pc | 1] = inner
+
+    execute = model.exec
+    cacheExec = model.cacheExec
+    branchExec = model.branchExec
+    for pcs, kinds, values in reader.chunks() :
+        for slot, kind, value in zip(pcs, kinds, values) :
+            if kind == EXEC :
+                execute(insts[slot])
+            elif kind == CACHE :
+                cacheExec(insts[slot], value)
+            else :
+                branchExec(insts[slot], slot & ~1, value)
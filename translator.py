@@ -0,0 +1,189 @@
+#basic-block translator: straight-line runs of instructions are turned into Python source, compiled once
+#and cached, so a whole block runs as a single call instead of one dispatch per instruction
+#
+#a block starts at whatever pc execution reaches and extends until an instruction that ends a block
+#(branches, jumps, calls, returns, HALT) or until the next label. Each instruction appends its own code
+#through Instruction.translate; the block function returns the pc to continue at
+
+import engines
+from engines import ClosureEngine
+
+class Block :
+    def __init__(self, machine, start) :
+        self.machine = machine
+        self.start = start
+        self.lines = []
+        self.namespace = {
+            'R' : machine.intRegisters,
+            'F' : machine.floatRegisters,
+            'M' : machine.memory,
+            'T' : machine.timingModel,
+            'timing' : machine.timingModel.exec,
+            'cache' : machine.timingModel.cacheExec,
+            'branch' : machine.timingModel.branchExec,
+        }
+        self._temps = 0
+        #static cycle cost of the whole block, charged once each time the block runs
+        self.cycles = 0
+
+    #make obj visible to the generated code and return the name it is bound to
+    def bind(self, obj) :
+        name = '_b' + str(len(self.namespace))
+        self.namespace[name] = obj
+        return name
+
+    #a fresh local variable name for generated code
+    def temp(self) :
+        self._temps += 1
+        return '_t' + str(self._temps)
+
+    #source text for a constant: ints are written inline, anything else is bound
+    def const(self, value) :
+        if type(value) == int :
+            return repr(value)
+        return self.bind(value)
+
+    #source text for a decoded register operand
+    def reg(self, reg) :
+        regtype, index = reg
+        return ('R' if regtype == int else 'F') + '[' + str(index) + ']'
+
+    def emit(self, line) :
+        self.lines.append(line)
+
+    #charge the timing model for an instruction whose exec calls timingModel.exec
+    #static costs are folded into the block total; dynamic models are called in place
+    def charge(self, inst) :
+        if (self.machine.timingModel.dynamic) :
+            self.emit('timing(' + self.bind(inst) + ')')
+        else :
+            self.chargeStatic(inst)
+
+    #same, for memory instructions whose exec calls timingModel.cacheExec with the address in addr
+    def chargeCache(self, inst, addr) :
+        if (self.machine.timingModel.dynamic) :
+            self.emit('cache(' + self.bind(inst) + ', ' + addr + ')')
+        else :
+            self.chargeStatic(inst)
+
+    #report a control transfer from pc to the pc in the expression nextPc; dynamic models only
+    def chargeBranch(self, inst, pc, nextPc, indent = '') :
+        if (self.machine.timingModel.dynamic) :
+            self.emit(indent + 'branch(' + self.bind(inst) + ', ' + str(pc) + ', ' + nextPc + ')')
+
+    def chargeStatic(self, inst) :
+        if not self.machine.timingModel.dynamic :
+            self.cycles += inst.cost(self.machine.timingModel)
+
+    def source(self) :
+        #everything is passed in as default arguments so the block body only touches locals
+        params = ', '.join(name + '=' + name for name in self.namespace)
+        lines = self.lines
+        if (self.cycles) :
+            lines = ['T.elapsedTime += ' + str(self.cycles)] + lines
+        body = ['    ' + line for line in lines]
+        return '\n'.join(['def _block(' + params + ') :'] + body) + '\n'
+
+    def build(self) :
+        code = compile(self.source(), '<block ' + hex(self.start) + '>', 'exec')
+        namespace = dict(self.namespace)
+        exec(code, namespace)
+        return namespace['_block']
+
+class TranslatorEngine :
+    def __init__(self, machine) :
+        self.machine = machine
+        self.base = machine.memory.text[0]
+        self.size = len(machine.prog.code)
+        #blocks are translated the first time execution reaches their starting pc
+        self.blocks = [None] * self.size
+        #number of instructions in each translated block, for instruction limits
+        self.lengths = [0] * self.size
+        self.leaders = set(machine.prog.labels.values())
+
+    def translate(self, start) :
+        code = self.machine.prog.code
+        block = Block(self.machine, start)
+        pc = start
+        length = 0
+        while True :
+            inst = code[pc]
+            inst.translate(block, pc)
+            length += 1
+            if inst.endsBlock :
+                break
+            pc += 4
+            if (pc in self.leaders) or (pc not in code) :
+                block.emit('return ' + str(pc))
+                break
+        self.lengths[(start - self.base) >> 2] = length
+        return block.build()
+
+    def run(self) :
+        machine = self.machine
+        #tracing needs per-instruction dispatch
+        if (machine.tracer is not None) :
+            return self.__runClosures()
+
+        profile = machine.profile
+        #a block's dynamic cycles cannot be split between its instructions, so profiling under a dynamic
+        #model needs per-instruction dispatch too; under a static model, or for counts alone, counting block
+        #runs is enough
+        if (profile is not None and profile.timed and machine.timingModel.dynamic) :
+            return self.__runClosures()
+        entries = [0] * self.size if profile is not None else None
+
+        blocks = self.blocks
+        base = self.base
+        pc = machine.pc
+        limit = machine.instructionLimit
+        executed = 0
+        try :
+            if (limit is not None) :
+                #the limit is checked a block at a time: a run stops before the block that would take it over
+                lengths = self.lengths
+                while (pc != -1) :
+                    index = (pc - base) >> 2
+                    block = blocks[index]
+                    if (block is None) :
+                        block = blocks[index] = self.translate(pc)
+                    if (executed + lengths[index] > limit) :
+                        raise engines.InstructionLimitExceeded(limit)
+                    executed += lengths[index]
+                    if (entries is not None) :
+                        entries[index] += 1
+                    pc = block()
+            elif (entries is not None) :
+                while (pc != -1) :
+                    index = (pc - base) >> 2
+                    block = blocks[index]
+                    if (block is None) :
+                        block = blocks[index] = self.translate(pc)
+                    entries[index] += 1
+                    pc = block()
+            while (pc != -1) :
+                index = (pc - base) >> 2
+                block = blocks[index]
+                if (block is None) :
+                    block = blocks[index] = self.translate(pc)
+                pc = block()
+        except IndexError :
+            #running off the end of .text fails the same way the interpreter's pc lookup does
+            if ((pc - base) >> 2) < self.size :
+                raise
+            raise KeyError(pc) from None
+        finally :
+            machine.pc = pc
+            self.executed = executed
+            if (entries is not None) :
+                profile.addBlocks(entries, self.lengths)
+
+    #run with per-instruction dispatch instead
+    def __runClosures(self) :
+        engine = ClosureEngine(self.machine)
+        try :
+            engine.run()
+        finally :
+            self.executed = engine.executed
+
+engines.engineMap['translator'] = TranslatorEngine
@@ -4,4 +4,12 @@ def parseint(intstr) :
     elif (intstr.startswith('0')) :
         return int(intstr, 8)
     else :
-        return int(intstr)
\ No newline at end of file
+        return int(intstr)
+
+#" <label+offset>" naming pc by the closest label at or before it, for reports; symbols maps address -> label
+def location(pc, symbols) :
+    labelled = [addr for addr in symbols if addr <= pc]
+    if not labelled :
+        return ""
+    addr = max(labelled)
+    return " <" + symbols[addr] + ("+" + hex(pc - addr) if pc != addr else "") + ">"